@@ -1,17 +1,89 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
 import yaml
 from datetime import datetime, timedelta, timezone
-import pytz
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
+from copy import deepcopy
 import sys
 import os
 import functools
+import base64
+import contextlib
+import hashlib
+import hmac
+import json
+import math
+import random
+import re
+import signal
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from operator import itemgetter
+try:
+    # Decodificador JSON opcional e bem mais rápido; sem ele é usado o json da biblioteca padrão
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import resource
+except ImportError:
+    # Indisponível no Windows; o pico de memória apenas não é mostrado
+    resource = None
 
 # Constants
 IS_DOCKER = os.getenv("DOCKER", "false").lower() == "true"
 overlay_path = "/app/config/kometa/tssk/"  if IS_DOCKER else "kometa/"
 collection_path = "/app/config/kometa/tssk/"  if IS_DOCKER else "kometa/"
 VERSION = "3.3.1"
+TMDB_MAX_RETRIES = 5
+# Retornado por get_tmdb_status quando o TMDB falhou temporariamente e não há status no cache
+TMDB_LOOKUP_FAILED = object()
+# Respostas do TMDB repetidas por tmdb_get_json e tratadas como falha temporária
+TMDB_RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Novas tentativas em 5xx e erros de conexão (menos que no 429: numa queda do TMDB cada seriado esperaria demais)
+TMDB_MAX_ERROR_RETRIES = 2
+# TSSK_TMDB_API_URL permite apontar para outro servidor (ex: o servidor falso dos benchmarks)
+TMDB_API_URL = os.getenv("TSSK_TMDB_API_URL", "http://api.themoviedb.org/3").rstrip("/")
+GITHUB_RELEASES_URL = "https://api.github.com/repos/jpaulovaz/TV-show-status-for-Kometa/releases/latest"
+# Última release consultada no GitHub, reaproveitada por UPDATE_CHECK_TTL_HOURS horas. A consulta
+# roda em segundo plano e o fim da execução espera por ela no máximo UPDATE_CHECK_WAIT_SECONDS
+UPDATE_CHECK_FILE = "config/tssk_update_check.json"
+UPDATE_CHECK_TTL_HOURS = 24
+UPDATE_CHECK_WAIT_SECONDS = 2
+
+# Timeouts (segundos) por tipo de requisição
+HTTP_TIMEOUTS = {
+    "health": 10,
+    "series": 20,
+    "episode": 10,
+    "calendar": 20,
+    "tmdb": 10,
+    "github": 10,
+}
+CACHE_FILE = "config/tssk_cache.db"
+# Novas tentativas nas requisições ao Sonarr: espera exponencial a partir de SONARR_RETRY_BASE_SECONDS,
+# limitada a SONARR_RETRY_MAX_SECONDS, para erros de conexão, timeouts e estes status
+SONARR_RETRY_STATUSES = {429, 500, 502, 503, 504}
+SONARR_RETRY_BASE_SECONDS = 1
+SONARR_RETRY_MAX_SECONDS = 30
+# A busca de episódios é gravada no SQLite a cada SONARR_CHECKPOINT_INTERVAL seriados; uma execução
+# interrompida é retomada se for reiniciada em até SONARR_CHECKPOINT_MAX_AGE_HOURS horas
+SONARR_CHECKPOINT_INTERVAL = 50
+SONARR_CHECKPOINT_MAX_AGE_HOURS = 24
+# Resumo dos arquivos alterados na última execução
+CHANGES_REPORT_FILE = "config/tssk_changes.json"
+# Tempos por fase e métricas HTTP da última execução (JSON e textfile do Prometheus)
+METRICS_JSON_FILE = "config/tssk_metrics.json"
+METRICS_PROMETHEUS_FILE = "config/tssk_metrics.prom"
+# Relatórios do --profile (TSSK_PROFILE=true)
+PROFILE_DIR = "config/logs"
+PROFILE_TOP_N = 25
+# Limites (segundos) do histograma de latência das requisições HTTP
+HTTP_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
 
 if sys.version_info >= (3, 7):
     import io
@@ -30,6 +102,8 @@ BOLD = '\033[1m'
  
 #Exibe as informações das variaveis DOCKER, se docker.
 if IS_DOCKER:
+    # pytz só é usado em Docker, para o fuso de TZ
+    import pytz
     os.makedirs("/app/config/kometa/tssk", exist_ok=True)
     PUID = int(os.getenv("PUID", "1000"))
     PGID = int(os.getenv("PGID", "1000"))
@@ -38,29 +112,146 @@ if IS_DOCKER:
     print(f"{AZUL}{'*' * 40}\nDOCKER: {VERMELHO}{IS_DOCKER}")
     print(f"{AZUL}PUID: {VERMELHO}{PUID}\n{AZUL}PGID: {VERMELHO}{PGID}{AZUL}\n{'*' * 40}\n{RESET}")
 
-def check_for_updates():
+# Sessões HTTP keep-alive compartilhadas, uma por host (esquema + servidor)
+_http_sessions = {}
+_http_sessions_lock = threading.Lock()
+_http_pool_size = 10
+
+def configure_http_pool(pool_size):
+    """Ajusta o tamanho do pool de conexões por host à concorrência configurada."""
+    global _http_pool_size
+    with _http_sessions_lock:
+        _http_pool_size = max(1, int(pool_size))
+        for session in _http_sessions.values():
+            _mount_adapter(session)
+
+def _mount_adapter(session):
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=_http_pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+def get_http_session(url):
+    """
+    Retorna a Session reutilizável do host de `url`, criando-a no primeiro uso.
+    A sessão só guarda cabeçalhos genéricos (gzip, User-Agent); credenciais como o
+    X-Api-Key vão por requisição, pois instâncias atrás do mesmo host compartilham a sessão.
+    """
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.netloc)
+    with _http_sessions_lock:
+        session = _http_sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            _mount_adapter(session)
+            session.headers.update({"Accept-Encoding": "gzip, deflate", "User-Agent": f"TSSK/{VERSION}"})
+            _http_sessions[key] = session
+    return session
+
+def http_get(url, endpoint, headers=None, **kwargs):
+    """
+    GET pela sessão do host com o timeout do tipo de requisição (endpoint). Os headers
+    (ex: X-Api-Key) valem só para esta requisição. Cada requisição entra nas métricas da
+    execução (contagem, latência, bytes e erros por endpoint).
+    """
+    session = get_http_session(url)
+    start = time.perf_counter()
+    try:
+        response = session.get(url, headers=headers, timeout=HTTP_TIMEOUTS.get(endpoint, 10), **kwargs)
+    except requests.exceptions.RequestException:
+        _run_metrics.record_http(endpoint, "error", time.perf_counter() - start, 0)
+        raise
+    _run_metrics.record_http(endpoint, response.status_code, time.perf_counter() - start, len(response.content))
+    return response
+
+def json_loads(data):
+    """json.loads com o orjson quando ele está instalado."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def decode_json(response):
+    """
+    Decodifica a resposta JSON direto dos bytes com o orjson, sem montar antes o texto
+    completo como response.json(). Sem o orjson, ou se ele recusar o conteúdo, usa
+    response.json(), que mantém o mesmo erro (RequestException) de antes.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(response.content)
+        except orjson.JSONDecodeError:
+            pass
+    return response.json()
+
+def get_latest_release(cache_file=UPDATE_CHECK_FILE):
+    """
+    Última release do TSSK no GitHub (tag_name, html_url e body). A resposta fica em
+    cache_file e é reaproveitada por UPDATE_CHECK_TTL_HOURS horas.
+    """
+    try:
+        with open(cache_file, encoding="utf-8") as f:
+            cached = json.load(f)
+        if time.time() - cached["checked_at"] < UPDATE_CHECK_TTL_HOURS * 3600:
+            return cached["release"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    response = http_get(GITHUB_RELEASES_URL, "github")
+    response.raise_for_status()
+    latest_release = response.json()
+    release = {key: latest_release.get(key) for key in ("tag_name", "html_url", "body")}
+    try:
+        directory = os.path.dirname(cache_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(cache_file, "w", encoding="utf-8") as f:
+            json.dump({"checked_at": time.time(), "release": release}, f, ensure_ascii=False)
+        set_permissions(cache_file)
+    except OSError:
+        pass
+    return release
+
+def start_update_check():
+    """
+    Inicia a verificação de atualizações em segundo plano, para que a execução não espere pelo
+    GitHub. Retorna o que finish_update_check precisa para mostrar o resultado.
+    """
+    result = {}
+
+    def check():
+        try:
+            result["release"] = get_latest_release()
+        except Exception as e:
+            result["error"] = e
+
+    # Thread daemon: uma consulta lenta nunca impede o processo de terminar
+    thread = threading.Thread(target=check, name="tssk-update-check", daemon=True)
+    thread.start()
+    return thread, result
+
+def finish_update_check(update_check, timeout=UPDATE_CHECK_WAIT_SECONDS):
+    """Mostra o resultado da verificação, esperando por ela no máximo timeout segundos."""
+    thread, result = update_check
+    thread.join(timeout)
     print(f"{VERDE}Verificando atualizações para TSSK {VERSION}...")
-    
+    if thread.is_alive():
+        print(f"{LARANJA}A verificação de atualizações não terminou a tempo; será feita novamente na próxima execução.{RESET}\n")
+        return
     try:
-        response = requests.get(
-            "https://api.github.com/repos/jpaulovaz/TV-show-status-for-Kometa/releases/latest",
-            timeout=10
-        )
-        response.raise_for_status()
-        
-        latest_release = response.json()
-        latest_version = latest_release.get("tag_name", "").lstrip("v")
-        
+        if "error" in result:
+            raise result["error"]
+        latest_release = result["release"]
+        latest_version = (latest_release.get("tag_name") or "").lstrip("v")
+
         def parse_version(version_str):
             return tuple(map(int, version_str.split('.')))
-        
+
         current_version_tuple = parse_version(VERSION)
         latest_version_tuple = parse_version(latest_version)
-        
+
         if latest_version and latest_version_tuple > current_version_tuple:
             print(f"{LARANJA}Uma versão mais recente do TSSK está disponível: {latest_version}{RESET}")
-            print(f"{LARANJA}Download: {latest_release.get('html_url', '')}{RESET}")
-            print(f"{LARANJA}Notas da Release: {latest_release.get('body', 'Nenhuma notas de lançamento disponíveis')}{RESET}\n")
+            print(f"{LARANJA}Download: {latest_release.get('html_url') or ''}{RESET}")
+            print(f"{LARANJA}Notas da Release: {latest_release.get('body') or 'Nenhuma notas de lançamento disponíveis'}{RESET}\n")
         else:
             print(f"{VERDE}Você está executando a versão mais recente do Tssk.{RESET}\n")
     except Exception as e:
@@ -68,11 +259,507 @@ def check_for_updates():
 
 def set_permissions(path):
     """Define a propriedade do arquivo se estiver rodando em Docker."""
-    if IS_DOCKER:
+    if IS_DOCKER and os.path.exists(path):
         try:
             os.chown(path, PUID, PGID)
         except OSError as e:
             print(f"{LARANJA}Não foi possível alterar o proprietário de {path}: {e}{RESET}")
+# Arquivos de saída gravados (alterados) e mantidos (conteúdo idêntico) na execução atual
+_output_changes = {"changed": [], "unchanged": []}
+_output_changes_lock = threading.Lock()
+
+def get_peak_memory_mb():
+    """Pico de memória residente (RSS) do processo em MB, ou None se não for possível medir."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é informado em KB no Linux e em bytes no macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def write_output_file(path, content):
+    """
+    Grava um arquivo de saída apenas se o conteúdo mudou: compara o hash do novo conteúdo com
+    o do arquivo existente e, se for diferente, grava em um arquivo temporário na mesma pasta e
+    o renomeia atomicamente sobre o original (o Kometa nunca lê um arquivo pela metade e o mtime
+    só muda quando há alteração). Retorna True se o arquivo foi gravado.
+    """
+    data = content.encode("utf-8")
+    try:
+        with open(path, "rb") as existing:
+            unchanged = hashlib.sha256(existing.read()).digest() == hashlib.sha256(data).digest()
+    except FileNotFoundError:
+        unchanged = False
+    if unchanged:
+        with _output_changes_lock:
+            _output_changes["unchanged"].append(path)
+        return False
+
+    directory, file_name = os.path.split(path)
+    temp_path = os.path.join(directory, f".{file_name}.{os.getpid()}.tmp")
+    # 0o666 respeita o umask, como um open() comum
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    with _output_changes_lock:
+        _output_changes["changed"].append(path)
+    return True
+
+def reset_output_changes():
+    with _output_changes_lock:
+        _output_changes["changed"].clear()
+        _output_changes["unchanged"].clear()
+
+def report_output_changes(report_file=CHANGES_REPORT_FILE):
+    """
+    Mostra quantos arquivos mudaram na execução e grava o resumo em report_file (JSON), para
+    que processos seguintes (ex: disparar o Kometa) possam ser pulados quando nada mudou.
+    """
+    with _output_changes_lock:
+        changed = sorted(set(_output_changes["changed"]))
+        unchanged = sorted(set(_output_changes["unchanged"]) - set(changed))
+    if changed:
+        print(f"{VERDE}Arquivos YAML alterados: {len(changed)} ({len(unchanged)} sem alterações).{RESET}")
+    else:
+        print(f"{AZUL}Nenhum arquivo YAML foi alterado ({len(unchanged)} sem alterações).{RESET}")
+    report = {
+        "changed": len(changed),
+        "unchanged": len(unchanged),
+        "changed_files": changed,
+        "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    directory = os.path.dirname(report_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    write_output_file(report_file, json.dumps(report, ensure_ascii=False, indent=2) + "\n")
+    set_permissions(report_file)
+    return len(changed)
+
+class RunMetrics:
+    """
+    Métricas da execução atual: tempo de cada fase (somado quando a fase se repete) e, por
+    endpoint HTTP, requisições por status, erros, bytes recebidos e histograma de latência.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.phases = {}
+            self.http = {}
+            self.stale_series = []
+
+    def add_phase(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def record_http(self, endpoint, status, seconds, size):
+        with self._lock:
+            stats = self.http.get(endpoint)
+            if stats is None:
+                stats = self.http[endpoint] = {
+                    "requests": 0, "errors": 0, "retries": 0, "bytes": 0, "seconds": 0.0,
+                    "statuses": defaultdict(int), "buckets": [0] * len(HTTP_LATENCY_BUCKETS),
+                }
+            stats["requests"] += 1
+            stats["statuses"][str(status)] += 1
+            if status == "error" or status >= 400:
+                stats["errors"] += 1
+            stats["bytes"] += size
+            stats["seconds"] += seconds
+            # Buckets cumulativos, como no formato do Prometheus
+            for i, bound in enumerate(HTTP_LATENCY_BUCKETS):
+                if seconds <= bound:
+                    stats["buckets"][i] += 1
+
+    def record_retry(self, endpoint):
+        with self._lock:
+            if endpoint in self.http:
+                self.http[endpoint]["retries"] += 1
+
+    def add_stale_series(self, titles):
+        """Seriados cuja busca de episódios falhou e que seguiram com a última lista conhecida."""
+        with self._lock:
+            self.stale_series.extend(titles)
+
+    def to_dict(self, success, peak_memory_mb=None):
+        with self._lock:
+            return {
+                "success": success,
+                "started_at": datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(timespec="seconds"),
+                "duration_seconds": round(time.time() - self.started_at, 3),
+                "peak_memory_mb": round(peak_memory_mb, 1) if peak_memory_mb is not None else None,
+                "phases": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+                "stale_series": list(self.stale_series),
+                "http": {
+                    endpoint: {
+                        "requests": stats["requests"],
+                        "errors": stats["errors"],
+                        "retries": stats["retries"],
+                        "bytes": stats["bytes"],
+                        "seconds": round(stats["seconds"], 4),
+                        "statuses": dict(stats["statuses"]),
+                        "latency_buckets": dict(zip((str(bound) for bound in HTTP_LATENCY_BUCKETS), stats["buckets"])),
+                    }
+                    for endpoint, stats in self.http.items()
+                },
+            }
+
+    def to_prometheus(self, success, peak_memory_mb=None):
+        """Formato de texto do Prometheus, para o textfile collector do node_exporter."""
+        data = self.to_dict(success, peak_memory_mb)
+        lines = [
+            "# HELP tssk_last_run_success 1 se a última execução terminou sem erro.",
+            "# TYPE tssk_last_run_success gauge",
+            f"tssk_last_run_success {int(success)}",
+            "# HELP tssk_last_run_timestamp_seconds Início da última execução (epoch).",
+            "# TYPE tssk_last_run_timestamp_seconds gauge",
+            f"tssk_last_run_timestamp_seconds {self.started_at:.0f}",
+            "# HELP tssk_last_run_duration_seconds Duração total da última execução.",
+            "# TYPE tssk_last_run_duration_seconds gauge",
+            f"tssk_last_run_duration_seconds {data['duration_seconds']}",
+            "# HELP tssk_phase_duration_seconds Duração de cada fase da última execução.",
+            "# TYPE tssk_phase_duration_seconds gauge",
+        ]
+        lines += [f'tssk_phase_duration_seconds{{phase="{name}"}} {seconds}' for name, seconds in data["phases"].items()]
+        lines += [
+            "# HELP tssk_stale_series Seriados com episódios desatualizados (falha na busca) na última execução.",
+            "# TYPE tssk_stale_series gauge",
+            f"tssk_stale_series {len(data['stale_series'])}",
+        ]
+        if peak_memory_mb is not None:
+            lines += [
+                "# HELP tssk_peak_memory_bytes Pico de memória residente do processo.",
+                "# TYPE tssk_peak_memory_bytes gauge",
+                f"tssk_peak_memory_bytes {int(peak_memory_mb * 1024 * 1024)}",
+            ]
+        lines += [
+            "# HELP tssk_http_requests Requisições HTTP da última execução, por endpoint e status.",
+            "# TYPE tssk_http_requests gauge",
+        ]
+        for endpoint, stats in data["http"].items():
+            lines += [f'tssk_http_requests{{endpoint="{endpoint}",status="{status}"}} {count}'
+                      for status, count in sorted(stats["statuses"].items())]
+        lines += [
+            "# HELP tssk_http_errors Requisições HTTP com erro (status >= 400 ou falha de conexão) na última execução.",
+            "# TYPE tssk_http_errors gauge",
+        ]
+        lines += [f'tssk_http_errors{{endpoint="{endpoint}"}} {stats["errors"]}' for endpoint, stats in data["http"].items()]
+        lines += [
+            "# HELP tssk_http_retries Novas tentativas após falhas temporárias na última execução.",
+            "# TYPE tssk_http_retries gauge",
+        ]
+        lines += [f'tssk_http_retries{{endpoint="{endpoint}"}} {stats["retries"]}' for endpoint, stats in data["http"].items()]
+        lines += [
+            "# HELP tssk_http_response_bytes Bytes recebidos na última execução.",
+            "# TYPE tssk_http_response_bytes gauge",
+        ]
+        lines += [f'tssk_http_response_bytes{{endpoint="{endpoint}"}} {stats["bytes"]}' for endpoint, stats in data["http"].items()]
+        lines += [
+            "# HELP tssk_http_request_duration_seconds Latência das requisições HTTP da última execução.",
+            "# TYPE tssk_http_request_duration_seconds histogram",
+        ]
+        for endpoint, stats in data["http"].items():
+            lines += [f'tssk_http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}'
+                      for bound, count in stats["latency_buckets"].items()]
+            lines += [
+                f'tssk_http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {stats["requests"]}',
+                f'tssk_http_request_duration_seconds_sum{{endpoint="{endpoint}"}} {stats["seconds"]}',
+                f'tssk_http_request_duration_seconds_count{{endpoint="{endpoint}"}} {stats["requests"]}',
+            ]
+        return "\n".join(lines) + "\n"
+
+_run_metrics = RunMetrics()
+
+@contextlib.contextmanager
+def measure_phase(name):
+    """Soma o tempo do bloco à fase name nas métricas da execução (e o perfila com --profile)."""
+    start = time.perf_counter()
+    try:
+        with profile_stage(name):
+            yield
+    finally:
+        _run_metrics.add_phase(name, time.perf_counter() - start)
+
+class StageProfiler:
+    """
+    Perfil por etapa para o --profile: cada etapa roda sob o cProfile e o tracemalloc.
+    Etapas repetidas (ex: gravação dos YAML de cada categoria) são somadas. Apenas a thread
+    que iniciou o perfil é medida pelo cProfile; o trabalho das threads de busca aparece
+    como espera na etapa que as criou.
+    """
+
+    def __init__(self, output_dir=PROFILE_DIR, top_n=PROFILE_TOP_N):
+        # Importados só aqui para não pesar nas execuções sem --profile
+        import cProfile
+        import tracemalloc
+        self._cProfile = cProfile
+        self._tracemalloc = tracemalloc
+        self.output_dir = output_dir
+        self.top_n = top_n
+        self.thread_id = threading.get_ident()
+        self.profiles = {}
+        self.memory = {}
+        self.active = None
+        tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        # Etapas aninhadas ou de outras threads entram na etapa em andamento
+        if self.active is not None or threading.get_ident() != self.thread_id:
+            yield
+            return
+        tracemalloc = self._tracemalloc
+        self.active = name
+        profile = self.profiles.setdefault(name, self._cProfile.Profile())
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            peak = tracemalloc.get_traced_memory()[1]
+            growth = tracemalloc.take_snapshot().compare_to(before, "lineno")
+            memory = self.memory.setdefault(name, {"peak": 0, "sites": defaultdict(lambda: [0, 0])})
+            memory["peak"] = max(memory["peak"], peak)
+            for stat in growth:
+                site = memory["sites"][str(stat.traceback)]
+                site[0] += stat.size_diff
+                site[1] += stat.count_diff
+            self.active = None
+
+    def write_reports(self):
+        """
+        Grava em output_dir um .pstats por etapa (para pstats/snakeviz) e um resumo .txt com
+        as funções mais custosas e os locais que mais alocaram memória em cada etapa.
+        """
+        import pstats
+        self._tracemalloc.stop()
+        os.makedirs(self.output_dir, exist_ok=True)
+        prefix = os.path.join(self.output_dir, f"tssk_profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        summary = io.StringIO()
+        for name, profile in self.profiles.items():
+            stats_file = f"{prefix}_{name}.pstats"
+            profile.dump_stats(stats_file)
+            set_permissions(stats_file)
+            memory = self.memory.get(name, {"peak": 0, "sites": {}})
+            summary.write(f"{'=' * 100}\nEtapa: {name}  (tempo: {_run_metrics.phases.get(name, 0):.2f} s, "
+                          f"pico de memória rastreada: {memory['peak'] / 2**20:.1f} MB)\n{'=' * 100}\n")
+            summary.write(f"\nFunções mais custosas (tempo próprio), {os.path.basename(stats_file)}:\n")
+            pstats.Stats(profile, stream=summary).sort_stats("tottime").print_stats(self.top_n)
+            summary.write("Locais que mais alocaram memória (mantida ao final da etapa):\n")
+            sites = sorted(memory["sites"].items(), key=lambda item: item[1][0], reverse=True)[:self.top_n]
+            for site, (size_diff, count_diff) in sites:
+                summary.write(f"  {size_diff / 1024:+12.1f} KiB  {count_diff:+9d} blocos  {site}\n")
+            summary.write("\n")
+        summary_file = f"{prefix}.txt"
+        with open(summary_file, "w", encoding="utf-8") as f:
+            f.write(summary.getvalue())
+        set_permissions(summary_file)
+        print(f"{AZUL}Relatórios de perfil gravados em {self.output_dir} ({os.path.basename(summary_file)} e um .pstats por etapa).{RESET}")
+
+# Perfil da execução atual; None (padrão) mantém profile_stage sem custo
+_stage_profiler = None
+
+def profile_stage(name):
+    if _stage_profiler is None:
+        return contextlib.nullcontext()
+    return _stage_profiler.stage(name)
+
+def is_profiling_requested(profile=None):
+    """--profile na linha de comando ou TSSK_PROFILE=true (Docker)."""
+    if profile is not None:
+        return profile
+    return os.getenv("TSSK_PROFILE", "false").lower() == "true"
+
+def _lap(totals, name, start):
+    """Soma a totals[name] o tempo desde start e devolve o instante atual."""
+    now = time.perf_counter()
+    totals[name] += now - start
+    return now
+
+def print_phase_timings():
+    if not _run_metrics.phases:
+        return
+    print(f"{AZUL}Tempo por fase:{RESET}")
+    for name, seconds in _run_metrics.phases.items():
+        print(f"  - {name}: {seconds:.2f} s")
+
+def write_run_metrics(config, success):
+    """
+    Grava as métricas da execução em JSON e no formato de texto do Prometheus. Os caminhos
+    vêm de metrics_json_file e metrics_prometheus_file; um caminho vazio desativa o arquivo.
+    """
+    peak_memory = get_peak_memory_mb()
+    outputs = (
+        (config.get("metrics_json_file", METRICS_JSON_FILE),
+         lambda: json.dumps(_run_metrics.to_dict(success, peak_memory), ensure_ascii=False, indent=2) + "\n"),
+        (config.get("metrics_prometheus_file", METRICS_PROMETHEUS_FILE),
+         lambda: _run_metrics.to_prometheus(success, peak_memory)),
+    )
+    for path, serialize in outputs:
+        if not path:
+            continue
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Gravação atômica: o textfile collector nunca lê um arquivo pela metade
+            write_output_file(path, serialize())
+            set_permissions(path)
+        except OSError as e:
+            print(f"{LARANJA}Não foi possível gravar as métricas em {path}: {e}{RESET}")
+
+class OutputDumper(yaml.SafeDumper):
+    """Dumper de todos os YAML gravados: não gera âncoras/aliases (&id001) ao juntar documentos de várias categorias."""
+    def ignore_aliases(self, data):
+        return True
+
+# O mesmo dumper com o emissor da libyaml (CSafeDumper), bem mais rápido, quando o PyYAML foi instalado com ela
+if getattr(yaml, "__with_libyaml__", False):
+    class FastOutputDumper(yaml.CSafeDumper):
+        ignore_aliases = OutputDumper.ignore_aliases
+else:
+    FastOutputDumper = None
+
+class QuotedString(str):
+    """Texto gravado sempre entre aspas duplas (ex: sort_title das coleções)."""
+
+# Representers registrados uma única vez, apenas nos dumpers do TSSK
+for _dumper in filter(None, (OutputDumper, FastOutputDumper)):
+    _dumper.add_representer(
+        OrderedDict, lambda dumper, data: dumper.represent_mapping('tag:yaml.org,2002:map', data.items()))
+    _dumper.add_representer(
+        QuotedString, lambda dumper, data: dumper.represent_scalar('tag:yaml.org,2002:str', str(data), style='"'))
+
+# Limites dentro dos quais a libyaml gera exatamente o mesmo texto que o emissor em Python.
+# Fora deles (acentos, emojis, chaves longas, aspas duplas que precisam ser quebradas), as
+# duas quebram linhas ou escolhem o estilo das chaves de forma diferente.
+LIBYAML_MAX_KEY_LENGTH = 60
+LIBYAML_MAX_QUOTED_LENGTH = 40
+
+def _libyaml_compatible(data):
+    if isinstance(data, str):
+        return (data.isascii() and data.isprintable()
+                and (len(data) <= LIBYAML_MAX_QUOTED_LENGTH or not isinstance(data, QuotedString)))
+    if isinstance(data, dict):
+        return all(
+            (not isinstance(key, str) or 0 < len(key) <= LIBYAML_MAX_KEY_LENGTH)
+            and _libyaml_compatible(key) and _libyaml_compatible(value)
+            for key, value in data.items()
+        )
+    if isinstance(data, (list, tuple)):
+        return all(_libyaml_compatible(item) for item in data)
+    return True
+
+YAML_LINE_WIDTH = 80  # Largura de linha padrão do emissor do PyYAML e da libyaml
+TVDB_ID_LIST = re.compile(r"\d+(?:, \d+)+")
+TVDB_SHOW_MARKER = "TSSK_TVDB_SHOW_{}"
+
+def fold_plain_scalar(text, column, indent):
+    """
+    Quebra as linhas de um texto simples (sem aspas) como o emissor do YAML: depois de cada
+    palavra, se a linha já passou de YAML_LINE_WIDTH colunas, o espaço seguinte vira uma quebra
+    de linha com indent espaços. column é a coluna em que o texto começa.
+    """
+    words = text.split(" ")
+    pieces = [words[0]]
+    column += len(words[0])
+    line_break = "\n" + " " * indent
+    for word in words[1:]:
+        if column > YAML_LINE_WIDTH:
+            pieces.append(line_break)
+            column = indent
+        else:
+            pieces.append(" ")
+            column += 1
+        pieces.append(word)
+        column += len(word)
+    return "".join(pieces)
+
+def dump_yaml(document):
+    """
+    Serializa um documento de overlays ou de coleções ({"overlays"|"collections": {nome: {...}}})
+    com o mesmo texto do yaml.dump em Python. Quando a libyaml gera exatamente esse texto
+    (_libyaml_compatible), ela serializa tudo. Senão, as listas de tvdb_show, o grosso do arquivo
+    (dezenas de milhares de IDs nos arquivos únicos), são trocadas por marcadores curtos no
+    yaml.dump e escritas depois diretamente, com as mesmas quebras de linha do emissor.
+    """
+    if FastOutputDumper and _libyaml_compatible(document):
+        return yaml.dump(document, Dumper=FastOutputDumper, sort_keys=False, allow_unicode=True)
+
+    tvdb_lists = []
+
+    def with_marker(entry):
+        value = entry.get("tvdb_show") if isinstance(entry, dict) else None
+        if not isinstance(value, str) or not TVDB_ID_LIST.fullmatch(value):
+            return entry
+        tvdb_lists.append(value)
+        return {**entry, "tvdb_show": TVDB_SHOW_MARKER.format(len(tvdb_lists) - 1)}
+
+    skeleton = {
+        root: {name: with_marker(entry) for name, entry in section.items()} if isinstance(section, dict) else section
+        for root, section in document.items()
+    }
+    content = yaml.dump(skeleton, Dumper=OutputDumper, sort_keys=False, allow_unicode=True)
+    if not tvdb_lists:
+        return content
+
+    pieces = []
+    position = 0
+    for number, value in enumerate(tvdb_lists):
+        marker = f" {TVDB_SHOW_MARKER.format(number)}\n"
+        index = content.index(marker, position)
+        line_start = content.rfind("\n", 0, index) + 1
+        key_indent = index - line_start - len(content[line_start:index].lstrip(" "))
+        pieces.append(content[position:index + 1])
+        # O valor começa depois de "tvdb_show: "; as linhas seguintes ficam 2 espaços além da chave
+        pieces.append(fold_plain_scalar(value, index + 1 - line_start, key_indent + 2))
+        position = index + len(marker) - 1
+    pieces.append(content[position:])
+    return "".join(pieces)
+
+# Documento de cada arquivo por categoria (nome do arquivo -> dados), usado para montar os arquivos únicos em memória
+_category_documents = {"overlays": {}, "collections": {}}
+# Os arquivos por categoria deixam de ser gravados quando os arquivos únicos os substituem
+_write_category_files = {"overlays": True, "collections": True}
+
+def configure_category_files(config):
+    """
+    Os arquivos por categoria são opcionais: com generate_all_in_one_* e delete_*_after_all_in_one
+    ativos, apenas o arquivo único é gravado.
+    """
+    for kind, generate_key, delete_key in (
+        ("overlays", "generate_all_in_one_overlays", "delete_overlay_after_all_in_one"),
+        ("collections", "generate_all_in_one_collections", "delete_collections_after_all_in_one"),
+    ):
+        all_in_one_only = (str(config.get(generate_key, "false")).lower() == "true"
+                           and str(config.get(delete_key, "false")).lower() == "true")
+        _write_category_files[kind] = not all_in_one_only
+
+def save_category_output(kind, output_file, document, serialize):
+    """
+    Guarda o documento da categoria para os arquivos únicos e, se os arquivos por categoria
+    estiverem habilitados, grava o resultado de serialize(). Retorna True se o arquivo mudou.
+    """
+    _category_documents[kind][os.path.basename(output_file)] = document
+    if not _write_category_files[kind]:
+        return False
+    return write_output_file(output_file, serialize())
+
 def load_config(file_path='config/config.yml'):
     try:
         with open(file_path, 'r', encoding='utf-8') as file:
@@ -96,14 +783,371 @@ def convert_utc_to_local(utc_date_str, utc_offset):
     local_date = utc_date + timedelta(hours=utc_offset)
     return local_date
 
-def process_sonarr_url(base_url, api_key):
-    base_url = base_url.rstrip('/')
-    
+def get_reference_now():
+    """
+    Retorna o "agora" (UTC) usado por toda a execução. A variável de ambiente TSSK_NOW
+    (data ISO, ex. 2025-01-31T12:00:00Z) fixa esse instante para execuções reproduzíveis.
+    """
+    fixed_now = os.environ.get("TSSK_NOW")
+    if fixed_now:
+        now = datetime.fromisoformat(fixed_now.replace('Z', ''))
+        if now.tzinfo is None:
+            now = now.replace(tzinfo=timezone.utc)
+        return now.astimezone(timezone.utc)
+    return datetime.now(timezone.utc)
+
+def normalize_air_dates(all_series_with_episodes, utc_offset=0):
+    """
+    Converte uma única vez o airDateUtc de cada episódio para a hora local e guarda o
+    resultado no próprio episódio (air_date_local), para que as categorias não precisem
+    analisar as mesmas datas novamente. Datas repetidas são analisadas apenas uma vez.
+    """
+    parsed_dates = {}
+    for series in all_series_with_episodes:
+        for ep in series.episodes:
+            air_date_str = ep.air_date_utc
+            if not air_date_str:
+                ep.air_date_local = None
+                continue
+            air_date = parsed_dates.get(air_date_str)
+            if air_date is None:
+                air_date = parsed_dates[air_date_str] = convert_utc_to_local(air_date_str, utc_offset)
+            ep.air_date_local = air_date
+
+def get_episode_air_date(ep, utc_offset=0):
+    """Data de exibição local do episódio, normalizada por normalize_air_dates quando disponível."""
+    if ep.air_date_local is not _NOT_NORMALIZED:
+        return ep.air_date_local
+    return convert_utc_to_local(ep.air_date_utc, utc_offset)
+
+# Indica que normalize_air_dates ainda não converteu a data do episódio
+_NOT_NORMALIZED = object()
+
+class Episode:
+    """
+    Registro compacto de um episódio com apenas os campos usados pelas categorias.
+    O Sonarr devolve dezenas de campos por episódio (títulos, sinopses, imagens...); guardar só
+    estes, em __slots__, reduz bastante a memória usada em bibliotecas grandes.
+    """
+    __slots__ = ("season_number", "episode_number", "air_date_utc", "has_file", "monitored", "air_date_local")
+
+    def __init__(self, season_number=0, episode_number=0, air_date_utc=None, has_file=False, monitored=True):
+        self.season_number = season_number
+        self.episode_number = episode_number
+        self.air_date_utc = air_date_utc
+        self.has_file = has_file
+        self.monitored = monitored
+        self.air_date_local = _NOT_NORMALIZED
+
+    @classmethod
+    def from_sonarr(cls, data):
+        """Cria o registro a partir de um episódio da API do Sonarr (ou do cache)."""
+        return cls(
+            data.get('seasonNumber', 0),
+            data.get('episodeNumber', 0),
+            data.get('airDateUtc'),
+            data.get('hasFile', False),
+            data.get('monitored', True),
+        )
+
+    def to_sonarr(self):
+        """Converte de volta para os campos do Sonarr; é o formato guardado no cache."""
+        return {
+            "seasonNumber": self.season_number,
+            "episodeNumber": self.episode_number,
+            "airDateUtc": self.air_date_utc,
+            "hasFile": self.has_file,
+            "monitored": self.monitored,
+        }
+
+class Series:
+    """
+    Registro compacto de um seriado do Sonarr com os seus episódios (lista de Episode).
+    stale indica que a busca dos episódios falhou e que eles vêm da última lista conhecida.
+    """
+    __slots__ = ("id", "title", "tvdb_id", "status", "monitored", "season_monitored", "episodes", "stale")
+
+    def __init__(self, id, title, tvdb_id=None, status=None, monitored=True, season_monitored=None, episodes=None,
+                 stale=False):
+        self.id = id
+        self.title = title
+        self.tvdb_id = tvdb_id
+        self.status = status
+        self.monitored = monitored
+        self.season_monitored = season_monitored or {}
+        self.episodes = episodes if episodes is not None else []
+        self.stale = stale
+
+    @classmethod
+    def from_sonarr(cls, data, episodes=None):
+        """
+        Cria o registro a partir de um seriado da API do Sonarr. Os episódios podem vir em
+        episodes ou na chave 'episodes' do próprio seriado, como registros ou dicionários.
+        """
+        season_monitored = {}
+        for season_info in data.get("seasons", []):
+            # Vale a primeira ocorrência de cada temporada, como na busca original
+            season_monitored.setdefault(season_info.get("seasonNumber"), season_info.get("monitored", True))
+        if episodes is None:
+            episodes = data.get('episodes', [])
+        episodes = [ep if isinstance(ep, Episode) else Episode.from_sonarr(ep) for ep in episodes]
+        return cls(data.get('id'), data.get('title'), data.get('tvdbId'), data.get('status'),
+                   data.get('monitored', True), season_monitored, episodes, data.get('stale', False))
+
+    def is_season_monitored(self, season_num):
+        return self.season_monitored.get(season_num, True)
+
+def as_series_records(all_series):
+    """Aceita seriados como registros Series ou dicionários do Sonarr (com a chave 'episodes')."""
+    return [series if isinstance(series, Series) else Series.from_sonarr(series) for series in all_series]
+
+class TSSKCache:
+    """
+    Cache persistente em SQLite (config/tssk_cache.db) mantido entre as execuções.
+    Guarda a lista de episódios de cada seriado junto com a impressão digital do seriado,
+    para que apenas os seriados alterados sejam buscados novamente no Sonarr, o mapeamento
+    TVDB -> TMDB e o status de cada seriado no TMDB. A tabela fetch_checkpoint guarda os
+    episódios já buscados por uma execução ainda não concluída, para que ela seja retomada.
+    Com keep_in_memory=True (modo daemon), os episódios também ficam em memória entre as
+    execuções, evitando ler e decodificar novamente o SQLite.
+    """
+
+    def __init__(self, file_path=CACHE_FILE, keep_in_memory=False):
+        self.file_path = file_path
+        self.keep_in_memory = keep_in_memory
+        self._memory_episodes = {}
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Acessado também pelas threads de busca, por isso o lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(file_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS episodes ("
+            "source TEXT NOT NULL, series_id INTEGER NOT NULL, fingerprint TEXT NOT NULL, "
+            "episodes TEXT NOT NULL, fetched_at REAL NOT NULL, PRIMARY KEY (source, series_id))"
+        )
+        # tmdb_id NULL indica que o TMDB não encontrou o seriado (cache negativo)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tmdb_ids (tvdb_id INTEGER PRIMARY KEY, tmdb_id INTEGER, checked_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tmdb_status (tmdb_id INTEGER PRIMARY KEY, status TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sonarr_urls (base_url TEXT PRIMARY KEY, api_url TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fetch_checkpoint ("
+            "source TEXT NOT NULL, series_id INTEGER NOT NULL, fingerprint TEXT NOT NULL, "
+            "episodes TEXT NOT NULL, fetched_at REAL NOT NULL, PRIMARY KEY (source, series_id))"
+        )
+        self._conn.commit()
+        self.stats = defaultdict(int)
+        set_permissions(file_path)
+
+    def get_episodes(self, source, series_id, fingerprint):
+        """Retorna os episódios em cache se a impressão digital não mudou, senão None."""
+        with self._lock:
+            cached = self._memory_episodes.get((source, series_id))
+            if cached is not None and cached[0] == fingerprint:
+                return cached[1]
+            row = self._conn.execute(
+                "SELECT fingerprint, episodes FROM episodes WHERE source = ? AND series_id = ?",
+                (source, series_id),
+            ).fetchone()
+        if not row or row[0] != fingerprint:
+            return None
+        episodes = [Episode.from_sonarr(ep) for ep in json_loads(row[1])]
+        if self.keep_in_memory:
+            with self._lock:
+                self._memory_episodes[(source, series_id)] = (fingerprint, episodes)
+        return episodes
+
+    def put_episodes(self, source, series_id, fingerprint, episodes):
+        """Guarda os episódios (registros Episode) do seriado com a sua impressão digital."""
+        compact = [ep.to_sonarr() for ep in episodes]
+        with self._lock:
+            if self.keep_in_memory:
+                self._memory_episodes[(source, series_id)] = (fingerprint, episodes)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO episodes (source, series_id, fingerprint, episodes, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (source, series_id, fingerprint, json.dumps(compact, separators=(",", ":")), datetime.now(timezone.utc).timestamp()),
+            )
+
+    def get_last_episodes(self, source, series_id):
+        """
+        Últimos episódios conhecidos do seriado, mesmo que a impressão digital tenha mudado:
+        da memória, do cache de episódios ou, sem eles, do checkpoint de uma busca anterior.
+        """
+        with self._lock:
+            cached = self._memory_episodes.get((source, series_id))
+            if cached is not None:
+                return cached[1]
+            row = self._conn.execute(
+                "SELECT episodes FROM episodes WHERE source = ? AND series_id = ?", (source, series_id)
+            ).fetchone() or self._conn.execute(
+                "SELECT episodes FROM fetch_checkpoint WHERE source = ? AND series_id = ?", (source, series_id)
+            ).fetchone()
+        return [Episode.from_sonarr(ep) for ep in json_loads(row[0])] if row else None
+
+    def get_checkpoint(self, source, series_id, fingerprint, max_age):
+        """Episódios guardados por uma busca interrompida há menos de max_age segundos, senão None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, episodes, fetched_at FROM fetch_checkpoint WHERE source = ? AND series_id = ?",
+                (source, series_id),
+            ).fetchone()
+        if not row or row[0] != fingerprint or datetime.now(timezone.utc).timestamp() - row[2] > max_age:
+            return None
+        return [Episode.from_sonarr(ep) for ep in json_loads(row[1])]
+
+    def put_checkpoint(self, source, series_id, fingerprint, episodes):
+        compact = [ep.to_sonarr() for ep in episodes]
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fetch_checkpoint (source, series_id, fingerprint, episodes, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (source, series_id, fingerprint, json.dumps(compact, separators=(",", ":")), datetime.now(timezone.utc).timestamp()),
+            )
+
+    def clear_checkpoint(self, source):
+        """Descarta o ponto de retomada depois que a busca de episódios termina."""
+        with self._lock:
+            self._conn.execute("DELETE FROM fetch_checkpoint WHERE source = ?", (source,))
+
+    def prune_episodes(self, source, series_ids):
+        """Remove do cache os seriados que não existem mais no Sonarr."""
+        keep = set(series_ids)
+        with self._lock:
+            cached_ids = [row[0] for row in self._conn.execute("SELECT series_id FROM episodes WHERE source = ?", (source,))]
+            stale = [(source, series_id) for series_id in cached_ids if series_id not in keep]
+            for key in [key for key in self._memory_episodes if key[0] == source and key[1] not in keep]:
+                del self._memory_episodes[key]
+            self._conn.executemany("DELETE FROM episodes WHERE source = ? AND series_id = ?", stale)
+        return len(stale)
+
+    def get_tmdb_id(self, tvdb_id, max_negative_age):
+        """
+        Retorna (encontrado, tmdb_id). O mapeamento é permanente; um "não encontrado"
+        só é reaproveitado por max_negative_age segundos.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT tmdb_id, checked_at FROM tmdb_ids WHERE tvdb_id = ?", (tvdb_id,)).fetchone()
+            if not row:
+                return False, None
+            tmdb_id, checked_at = row
+            if tmdb_id is None and datetime.now(timezone.utc).timestamp() - checked_at > max_negative_age:
+                return False, None
+            self.stats["tmdb_id_hits"] += 1
+        return True, tmdb_id
+
+    def put_tmdb_id(self, tvdb_id, tmdb_id):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tmdb_ids (tvdb_id, tmdb_id, checked_at) VALUES (?, ?, ?)",
+                (tvdb_id, tmdb_id, datetime.now(timezone.utc).timestamp()),
+            )
+
+    def get_tmdb_status(self, tmdb_id, max_age):
+        """Retorna o status em cache se ele tiver menos de max_age segundos, senão None."""
+        with self._lock:
+            row = self._conn.execute("SELECT status, fetched_at FROM tmdb_status WHERE tmdb_id = ?", (tmdb_id,)).fetchone()
+            if not row or datetime.now(timezone.utc).timestamp() - row[1] > max_age:
+                return None
+            self.stats["tmdb_status_hits"] += 1
+        return row[0]
+
+    def put_tmdb_status(self, tmdb_id, status):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tmdb_status (tmdb_id, status, fetched_at) VALUES (?, ?, ?)",
+                (tmdb_id, status, datetime.now(timezone.utc).timestamp()),
+            )
+
+    def get_sonarr_api_url(self, base_url):
+        with self._lock:
+            row = self._conn.execute("SELECT api_url FROM sonarr_urls WHERE base_url = ?", (base_url,)).fetchone()
+        return row[0] if row else None
+
+    def put_sonarr_api_url(self, base_url, api_url):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO sonarr_urls (base_url, api_url) VALUES (?, ?)", (base_url, api_url))
+            self._conn.commit()
+
+    def forget_sonarr_api_url(self, api_url):
+        """Descarta um caminho de API que parou de responder, para ser descoberto novamente."""
+        with self._lock:
+            self._conn.execute("DELETE FROM sonarr_urls WHERE api_url = ?", (api_url,))
+            self._conn.commit()
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+def series_fingerprint(series):
+    """
+    Impressão digital de um seriado a partir dos dados de /series. Muda quando o Sonarr
+    atualiza o seriado, quando arquivos são adicionados/removidos ou quando a exibição avança.
+    """
+    payload = {
+        "statistics": series.get("statistics"),
+        "lastInfoSync": series.get("lastInfoSync"),
+        "added": series.get("added"),
+        "previousAiring": series.get("previousAiring"),
+        "nextAiring": series.get("nextAiring"),
+        "monitored": series.get("monitored"),
+        "seasons": [
+            (season.get("seasonNumber"), season.get("monitored"), season.get("statistics"))
+            for season in series.get("seasons", [])
+        ],
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+# Campos de /series usados pelo TSSK (registro Series e impressão digital); o resto é descartado
+SERIES_FIELDS = ("id", "title", "tvdbId", "status", "monitored", "statistics", "lastInfoSync",
+                 "added", "previousAiring", "nextAiring")
+SEASON_FIELDS = ("seasonNumber", "monitored", "statistics")
+
+def project_series(series):
+    """Reduz um seriado do Sonarr aos campos usados, liberando imagens, sinopses, etc."""
+    projected = {key: series[key] for key in SERIES_FIELDS if key in series}
+    projected["seasons"] = [
+        {key: season[key] for key in SEASON_FIELDS if key in season}
+        for season in series.get("seasons", [])
+    ]
+    return projected
+
+# Caminhos de API já descobertos nesta execução (ou processo, no modo contínuo)
+_discovered_sonarr_urls = {}
+
+def sonarr_base_url(url):
+    """Esquema e servidor da URL do Sonarr, sem caminho: a chave dos caminhos de API descobertos."""
+    base_url = url.rstrip('/')
     if base_url.startswith('http'):
         protocol_end = base_url.find('://') + 3
         next_slash = base_url.find('/', protocol_end)
         if next_slash != -1:
             base_url = base_url[:next_slash]
+    return base_url
+
+def current_sonarr_url(url, api_url):
+    """Caminho de API em uso para a URL configurada (pode ter sido descoberto novamente durante a execução)."""
+    return _discovered_sonarr_urls.get(sonarr_base_url(url), api_url)
+
+def process_sonarr_url(base_url, api_key, cache=None):
+    base_url = sonarr_base_url(base_url)
+
+    # Reaproveita o caminho descoberto anteriormente, sem repetir as sondagens de /health
+    known_url = _discovered_sonarr_urls.get(base_url) or (cache.get_sonarr_api_url(base_url) if cache else None)
+    if known_url:
+        _discovered_sonarr_urls[base_url] = known_url
+        print(f"Usando a URL do Sonarr descoberta anteriormente: {known_url}")
+        return known_url
     
     api_paths = [
         '/api/v3',
@@ -113,10 +1157,12 @@ def process_sonarr_url(base_url, api_key):
     for path in api_paths:
         test_url = f"{base_url}{path}"
         try:
-            headers = {"X-Api-Key": api_key}
-            response = requests.get(f"{test_url}/health", headers=headers, timeout=10)
+            response = http_get(f"{test_url}/health", "health", {"X-Api-Key": api_key})
             if response.status_code == 200:
                 print(f"Conectado com sucesso a Sonarr em: {test_url}")
+                _discovered_sonarr_urls[base_url] = test_url
+                if cache:
+                    cache.put_sonarr_api_url(base_url, test_url)
                 return test_url
         except requests.exceptions.RequestException as e:
             print(f"{LARANJA}URL de teste {test_url} - Falha: {str(e)}{RESET}")
@@ -125,715 +1171,1052 @@ def process_sonarr_url(base_url, api_key):
     raise ConnectionError(f"{VERMELHO}Incapaz de estabelecer conexão com Sonarr. Tentei os seguintes URLs:\n" + 
                         "\n".join([f"- {base_url}{path}" for path in api_paths]) + 
                         f"\nVerifique sua chave de URL e API e verifique se SONARR está ssendo executado.{RESET}")
-def get_tmdb_status(tvdb_id, tmdb_api_key):
-    """Retrieve the status of a show from TMDB using its TVDB id"""
+
+def get_sonarr_instances(config):
+    """
+    Lista as instâncias do Sonarr do config.yml: sonarr_url/sonarr_api_key (se preenchidos)
+    seguidos de cada item de sonarr_instances. A ordem define a precedência ao juntar os seriados.
+    """
+    instances = []
+    if config.get('sonarr_url'):
+        instances.append({"name": "Sonarr", "url": config['sonarr_url'], "api_key": config.get('sonarr_api_key')})
+    for number, instance in enumerate(config.get('sonarr_instances') or [], start=2):
+        if not isinstance(instance, dict) or not instance.get('sonarr_url') or not instance.get('sonarr_api_key'):
+            raise ValueError(f"Cada item de sonarr_instances precisa de sonarr_url e sonarr_api_key (item {number - 1}).")
+        instances.append({"name": instance.get('name') or f"Sonarr {number}", "url": instance['sonarr_url'],
+                          "api_key": instance['sonarr_api_key']})
+    if not instances:
+        raise ValueError("Nenhuma instância do Sonarr configurada: preencha sonarr_url e sonarr_api_key.")
+    return instances
+
+def forget_sonarr_url(api_url, cache=None):
+    """
+    Esquece um caminho de API que falhou, para que ele seja descoberto novamente. Retorna a
+    URL base a que ele pertencia (None se o caminho não tinha sido descoberto).
+    """
+    forgotten = None
+    for base_url, known_url in list(_discovered_sonarr_urls.items()):
+        if known_url == api_url:
+            del _discovered_sonarr_urls[base_url]
+            forgotten = base_url
+    if cache:
+        cache.forget_sonarr_api_url(api_url)
+    return forgotten
+class RateLimiter:
+    """
+    Limitador token bucket compartilhado entre threads: libera até `rate` requisições por
+    segundo, com rajadas de até `capacity`. pause() bloqueia todas as threads, usado quando
+    o servidor responde 429 com Retry-After.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = max(float(rate), 0.1)
+        self.capacity = float(capacity or max(1.0, self.rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._blocked_until:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                    self._last = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    wait = self._blocked_until - now
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self._lock:
+            now = time.monotonic()
+            self._blocked_until = max(self._blocked_until, now + seconds)
+            # Recomeça sem rajada acumulada depois da pausa
+            self._tokens = 0.0
+            self._last = self._blocked_until
+
+def parse_retry_after(value, default):
+    """Converte o cabeçalho Retry-After (segundos ou data HTTP) em segundos."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return default
+
+def tmdb_get_json(url, rate_limiter=None, max_retries=TMDB_MAX_RETRIES):
+    """
+    GET no TMDB respeitando o limitador de taxa. Respostas 429 são repetidas após o tempo
+    indicado em Retry-After (ou espera exponencial), em vez de serem tratadas como erro;
+    respostas 5xx, erros de conexão e timeouts são repetidos com espera exponencial.
+    """
+    error_retries = 0
+    for attempt in range(max_retries + 1):
+        last_attempt = attempt == max_retries or error_retries >= TMDB_MAX_ERROR_RETRIES
+        if rate_limiter:
+            rate_limiter.acquire()
+        try:
+            resp = http_get(url, "tmdb")
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if last_attempt:
+                raise
+            time.sleep(retry_delay(error_retries))
+            error_retries += 1
+            continue
+        if resp.status_code == 429 and attempt < max_retries:
+            retry_after = parse_retry_after(resp.headers.get("Retry-After"), 2 ** attempt)
+            if rate_limiter:
+                rate_limiter.pause(retry_after)
+            else:
+                time.sleep(retry_after)
+            continue
+        if resp.status_code in TMDB_RETRY_STATUSES and not last_attempt:
+            time.sleep(retry_delay(error_retries))
+            error_retries += 1
+            continue
+        resp.raise_for_status()
+        return resp.json()
+
+def is_transient_tmdb_error(error):
+    """Falhas que podem passar sozinhas (429 e 5xx esgotados, conexão, timeout), ao contrário de chave ou URL errada."""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    response = getattr(error, "response", None)
+    return isinstance(error, requests.exceptions.HTTPError) and response is not None \
+        and response.status_code in TMDB_RETRY_STATUSES
+
+def get_tmdb_status(tvdb_id, tmdb_api_key, cache=None, cache_ttl_days=7, rate_limiter=None):
+    """Retrieve the status of a show from TMDB using its TVDB id.
+    With a cache, the TVDB -> TMDB id mapping is kept permanently and the status
+    is reused for cache_ttl_days days. If TMDB keeps failing, an expired cached
+    status is used instead of guessing; without one, TMDB_LOOKUP_FAILED is returned for
+    transient failures and None (the Sonarr "ended" status stands) for the others,
+    such as a wrong API key."""
     if not tmdb_api_key or not tvdb_id:
         return None
 
+    max_age = timedelta(days=cache_ttl_days).total_seconds()
+    tmdb_id = None
     try:
-        # First call to find the TMDB id from the TVDB id
-        find_url = (
-            f"http://api.themoviedb.org/3/find/{tvdb_id}?api_key="
-            f"{tmdb_api_key}&external_source=tvdb_id"
-        )
-        resp = requests.get(find_url, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-        tv_results = data.get("tv_results") or []
-        if not tv_results:
-            return None
-        tmdb_id = tv_results[0].get("id")
+        found, tmdb_id = cache.get_tmdb_id(tvdb_id, max_age) if cache else (False, None)
+        if not found:
+            # First call to find the TMDB id from the TVDB id
+            find_url = (
+                f"{TMDB_API_URL}/find/{tvdb_id}?api_key="
+                f"{tmdb_api_key}&external_source=tvdb_id"
+            )
+            data = tmdb_get_json(find_url, rate_limiter)
+            tv_results = data.get("tv_results") or []
+            tmdb_id = tv_results[0].get("id") if tv_results else None
+            if cache:
+                cache.put_tmdb_id(tvdb_id, tmdb_id or None)
         if not tmdb_id:
             return None
 
-        details_url = f"http://api.themoviedb.org/3/tv/{tmdb_id}?api_key={tmdb_api_key}"
-        resp = requests.get(details_url, timeout=10)
-        resp.raise_for_status()
-        info = resp.json()
-        return info.get("status")
-    except Exception as e:
-        print(f"{LARANJA}Erro ao verificar o statudo TMDB para {tvdb_id}: {e}{RESET}")
-        return None
+        status = cache.get_tmdb_status(tmdb_id, max_age) if cache else None
+        if status is not None:
+            return status
 
-def get_sonarr_series(sonarr_url, api_key):
+        details_url = f"{TMDB_API_URL}/tv/{tmdb_id}?api_key={tmdb_api_key}"
+        info = tmdb_get_json(details_url, rate_limiter)
+        status = info.get("status")
+        if cache and status:
+            cache.put_tmdb_status(tmdb_id, status)
+        return status
+    except Exception as e:
+        print(f"\n{LARANJA}Erro ao verificar o statudo TMDB para {tvdb_id}: {e}{RESET}")
+        stale_status = cache.get_tmdb_status(tmdb_id, float("inf")) if cache and tmdb_id else None
+        if stale_status:
+            print(f"{LARANJA}Usando o último status conhecido do TMDB para {tvdb_id}: {stale_status}{RESET}")
+            return stale_status
+        return TMDB_LOOKUP_FAILED if is_transient_tmdb_error(e) else None
+
+_sonarr_max_retries = 3
+
+def configure_sonarr_retries(max_retries):
+    """Ajusta quantas novas tentativas cada requisição ao Sonarr faz em falhas temporárias."""
+    global _sonarr_max_retries
+    _sonarr_max_retries = max(0, int(max_retries))
+
+def retry_delay(attempt):
+    """Espera exponencial com jitter: metade fixa e metade aleatória, para as threads não repetirem juntas."""
+    delay = min(SONARR_RETRY_MAX_SECONDS, SONARR_RETRY_BASE_SECONDS * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def sonarr_get(url, endpoint, api_key, **kwargs):
+    """
+    GET no Sonarr com até _sonarr_max_retries novas tentativas em falhas temporárias (erro de
+    conexão, timeout, 429 e 5xx); 429 respeita o Retry-After. Depois da última tentativa a
+    resposta (ou a exceção) volta para quem chamou.
+    """
+    for attempt in range(_sonarr_max_retries + 1):
+        last_attempt = attempt == _sonarr_max_retries
+        try:
+            response = http_get(url, endpoint, {"X-Api-Key": api_key}, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if last_attempt:
+                raise
+            delay, reason = retry_delay(attempt), e
+        else:
+            if response.status_code not in SONARR_RETRY_STATUSES or last_attempt:
+                return response
+            delay = retry_delay(attempt)
+            if response.status_code == 429:
+                delay = parse_retry_after(response.headers.get("Retry-After"), delay)
+            reason = f"HTTP {response.status_code}"
+        _run_metrics.record_retry(endpoint)
+        print(f"\n{LARANJA}Falha temporária no Sonarr ({reason}); nova tentativa {attempt + 1} de {_sonarr_max_retries} em {delay:.1f} s.{RESET}")
+        time.sleep(delay)
+
+def fetch_sonarr_series(sonarr_url, api_key):
+    response = sonarr_get(f"{sonarr_url}/series", "series", api_key)
+    response.raise_for_status()
+    return [project_series(series) for series in decode_json(response)]
+
+def get_sonarr_series(sonarr_url, api_key, cache=None):
+    """
+    Busca a lista de seriados e retorna (caminho da API, seriados). Se o caminho descoberto
+    anteriormente falhar (ex: o Sonarr passou a usar um URL base), ele é descoberto novamente
+    com as sondagens de /health e a busca é repetida uma vez nesta mesma execução.
+    """
     try:
-        url = f"{sonarr_url}/series"
-        headers = {"X-Api-Key": api_key}
-        response = requests.get(url, headers=headers, timeout=20)
-        response.raise_for_status()
-        return response.json()
+        return sonarr_url, fetch_sonarr_series(sonarr_url, api_key)
     except requests.exceptions.RequestException as e:
         print(f"{VERMELHO}Erro ao se conectar com o SONARR: {str(e)}{RESET}")
-        sys.exit(1)
+        base_url = forget_sonarr_url(sonarr_url, cache)
+    if base_url:
+        print(f"{LARANJA}Descobrindo novamente o caminho da API do Sonarr em {base_url}...{RESET}")
+        new_url = None
+        try:
+            new_url = process_sonarr_url(base_url, api_key, cache)
+            return new_url, fetch_sonarr_series(new_url, api_key)
+        except (ConnectionError, requests.exceptions.RequestException) as e:
+            print(f"{VERMELHO}Erro ao se conectar com o SONARR: {str(e)}{RESET}")
+            if new_url:
+                forget_sonarr_url(new_url, cache)
+    sys.exit(1)
+
+def get_sonarr_series_by_id(sonarr_url, api_key, series_id):
+    """
+    Busca um único seriado; retorna None se ele não existe mais no Sonarr. Se a busca falhar
+    depois das novas tentativas, a exceção (RequestException) fica para quem chamou decidir.
+    """
+    response = sonarr_get(f"{sonarr_url}/series/{series_id}", "series", api_key)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return project_series(decode_json(response))
 
 def get_sonarr_episodes(sonarr_url, api_key, series_id):
-    try:
-        url = f"{sonarr_url}/episode?seriesId={series_id}"
-        headers = {"X-Api-Key": api_key}
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"{VERMELHO}Erro a busca de episódios de Sonarr: {str(e)}{RESET}")
-        sys.exit(1)
-
-def get_all_data_from_sonarr(sonarr_url, api_key):
     """
-    Busca todos os seriados e, em seguida, busca os episódios para cada um,
-    anexando-os ao objeto do seriado. Mostra o progresso.
+    Busca os episódios de um seriado, já reduzidos a registros Episode. Se a busca falhar
+    depois das novas tentativas, a exceção (RequestException) fica para quem chamou decidir.
     """
-    print(f"\n{AZUL}--- Buscando dados do Sonarr ---{RESET}")
-    print(f"{AZUL}Buscando a lista de todos os seriados...{RESET}")
-    all_series = get_sonarr_series(sonarr_url, api_key)
-    total_series = len(all_series)
-    print(f"{AZUL}Buscando episódios para {total_series} seriados (isso pode levar um tempo)...{RESET}")
+    url = f"{sonarr_url}/episode"
+    response = sonarr_get(url, "episode", api_key, params={"seriesId": series_id})
+    response.raise_for_status()
+    return [Episode.from_sonarr(ep) for ep in decode_json(response)]
 
-    for i, series in enumerate(all_series):
-        # Mostra o progresso
-        print(f"{VERDE}  -> Buscando episódios: {i + 1} de {total_series} - {series['title']}{RESET}".ljust(80), end='\r')
+def get_sonarr_calendar(sonarr_url, api_key, start_date, end_date, max_days_per_request=31):
+    """
+    Busca no calendário do Sonarr todos os episódios (monitorados ou não) que vão ao ar entre
+    start_date e end_date. Janelas longas são divididas em poucas requisições de até
+    max_days_per_request dias.
+    """
+    episodes = []
+    chunk_start = start_date
+    while chunk_start < end_date:
+        chunk_end = min(chunk_start + timedelta(days=max_days_per_request), end_date)
         try:
-            episodes = get_sonarr_episodes(sonarr_url, api_key, series['id'])
-            series['episodes'] = episodes
-        except Exception as e:
-            print(f"\n{LARANJA}Falha ao buscar episódios para {series['title']} (ID: {series['id']}): {e}{RESET}")
-            series['episodes'] = []  # Garante que a chave 'episodes' exista
-
-    # Limpa a linha de progresso
-    print(" " * 80, end='\r')
-    print(f"{VERDE}Busca de dados do Sonarr concluída.{RESET}")
-    return all_series
-
-def find_new_season_shows(all_series_with_episodes, future_days_new_season, utc_offset=0, skip_unmonitored=False):
-    cutoff_date = datetime.now(timezone.utc) + timedelta(days=future_days_new_season)
-    now_local = datetime.now(timezone.utc) + timedelta(hours=utc_offset)
-    matched_shows = []
-    skipped_shows = []
-    
-    for series in all_series_with_episodes:
-        episodes = series.get('episodes', [])
-        
-        future_episodes = []
-        for ep in episodes:
-            # Pular especiais (temporada 0)
-            season_number = ep.get('seasonNumber', 0)
-            if season_number == 0:
-                continue
-                
-            air_date_str = ep.get('airDateUtc')
-            if not air_date_str:
-                continue
-            
-            air_date = convert_utc_to_local(air_date_str, utc_offset)
-            
-            # Saltar episódios que já foram baixados -eles devem ser tratados como se tivessem sido exibidos
-            if ep.get('hasFile', False):
-                continue
-                
-            if air_date > now_local:
-                future_episodes.append((ep, air_date))
-        
-        future_episodes.sort(key=lambda x: x[1])
-        
-        if not future_episodes:
-            continue
-        
-        next_future, air_date_next = future_episodes[0]
-        
-        # Verifique se esta é uma nova temporada iniciando (episódio 1 de qualquer temporada)
-        # E verifique se não é um show completamente novo (temporada 1)
-        if (
-            next_future['seasonNumber'] > 1
-            and next_future['episodeNumber'] == 1
-            and not next_future['hasFile']
-            and air_date_next <= cutoff_date
-        ):
-            tvdb_id = series.get('tvdbId')
-            air_date_str_dd_mm_yyyy = air_date_next.date().strftime("%d/%m/%Y")
+            url = f"{sonarr_url}/calendar"
+            params = {
+                "start": chunk_start.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "end": chunk_end.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "unmonitored": "true",
+            }
+            response = sonarr_get(url, "calendar", api_key, params=params)
+            response.raise_for_status()
+            episodes.extend(decode_json(response))
+        except requests.exceptions.RequestException as e:
+            print(f"{VERMELHO}Erro ao buscar o calendário do Sonarr: {str(e)}{RESET}")
+            sys.exit(1)
+        chunk_start = chunk_end
+    return episodes
 
-            show_dict = {
-                'title': series['title'],
-                'seasonNumber': next_future['seasonNumber'],
-                'airDate': air_date_str_dd_mm_yyyy,
-                'tvdbId': tvdb_id
+def get_calendar_window(config, utc_offset=0, now=None):
+    """
+    Calcula a janela (início, fim) em UTC que cobre todas as categorias baseadas em datas,
+    a partir dos maiores valores de recent_days_* e future_days_* configurados.
+    Uma margem de um dia mais o deslocamento de fuso evita perder episódios nas bordas.
+    """
+    future_days = config.get('future_days', 14)
+    max_future_days = max(
+        int(config.get('future_days_new_season', future_days)),
+        int(config.get('future_days_upcoming_episode', future_days)),
+        int(config.get('future_days_upcoming_finale', future_days)),
+    )
+    max_recent_days = max(
+        int(config.get('recent_days_season_finale', 14)),
+        int(config.get('recent_days_final_episode', 14)),
+        int(config.get('recent_days_new_season_started', 7)),
+    )
+    margin = timedelta(days=1, hours=abs(utc_offset))
+    now = now or get_reference_now()
+    return now - timedelta(days=max_recent_days) - margin, now + timedelta(days=max_future_days) + margin
+
+def series_needs_episodes(series, plan_window):
+    """
+    Planejamento da busca (plan_episode_fetch): decide, apenas com os campos de /series, se os
+    episódios do seriado ainda podem colocá-lo em alguma categoria dentro de plan_window
+    (início, fim), a janela das categorias baseadas em datas. Só vale com skip_unmonitored,
+    porque nextAiring, previousAiring e as estatísticas do Sonarr consideram apenas episódios
+    monitorados. Na dúvida, o seriado é buscado.
+    """
+    statistics = series.get("statistics")
+    if not statistics:
+        return True
+    start_date, end_date = plan_window
+    # Um episódio agendado pode entrar nas categorias futuras ou, se já baixado, nos finais
+    next_airing = series.get("nextAiring")
+    if next_airing and (convert_utc_to_local(next_airing, 0) <= end_date or statistics.get("episodeFileCount")):
+        return True
+    # As categorias recentes exigem um episódio monitorado exibido dentro da janela
+    previous_airing = series.get("previousAiring")
+    if previous_airing and series.get("monitored", True) and convert_utc_to_local(previous_airing, 0) >= start_date:
+        return True
+    if series.get("status") == "ended":
+        # Finalizados só entram em "ended" sem episódios futuros, monitorados ou não: em cada
+        # temporada todos os episódios precisam já ter sido exibidos (monitorados) ou baixados
+        for season in series.get("seasons", []):
+            season_statistics = season.get("statistics")
+            if season.get("seasonNumber", 0) > 0 and (
+                    not season_statistics
+                    or season_statistics.get("episodeCount") != season_statistics.get("totalEpisodeCount")):
+                return True
+    return False
+
+def iter_sonarr_series(sonarr_url, api_key, max_concurrent_requests=5, calendar_window=None, cache=None, full_refresh=False, name=None,
+                       plan_window=None, checkpoint=None, failure_budget_percent=0):
+    """
+    Busca todos os seriados e, em seguida, busca os episódios de cada um em paralelo
+    (até max_concurrent_requests requisições simultâneas). É um gerador: cada seriado sai como
+    um par (posição no /series, registro Series) assim que os seus episódios estão prontos
+    (do cache, da busca ou vazios quando não precisam ser buscados), fora da ordem do Sonarr.
+    Se calendar_window (início, fim) for informado, consulta antes o calendário do Sonarr e
+    busca os episódios apenas dos seriados que têm algum episódio dentro da janela, mais os
+    finalizados com um próximo episódio (nextAiring) além dela.
+    Com um cache, apenas os seriados cuja impressão digital mudou são buscados novamente,
+    a menos que full_refresh seja True. Com plan_window, os seriados que não podem entrar em
+    nenhuma categoria (series_needs_episodes) não têm os episódios buscados.
+    checkpoint (o TSSKCache, mesmo sem o cache de episódios) guarda o progresso da busca, para
+    que uma execução interrompida seja retomada. Até failure_budget_percent % dos seriados
+    podem falhar: eles seguem com os últimos episódios conhecidos (cache ou checkpoint), marcados
+    como stale, ou ficam fora da classificação se nenhum episódio for conhecido; acima disso a
+    execução é encerrada.
+    As respostas são reduzidas a registros Episode assim que chegam.
+    Mostra o progresso (com o nome da instância em name, quando há mais de uma).
+    """
+    label = f" ({name})" if name else ""
+    print(f"\n{AZUL}--- Buscando dados do Sonarr{label} ---{RESET}")
+    print(f"{AZUL}Buscando a lista de todos os seriados...{RESET}")
+    with measure_phase("sonarr_series_fetch"):
+        sonarr_url, all_series = get_sonarr_series(sonarr_url, api_key, cache)
+    positions = {series['id']: position for position, series in enumerate(all_series)}
+
+    def ready(series, episodes):
+        # Os episódios vão apenas para o registro; o dicionário do /series não os guarda
+        return positions[series['id']], Series.from_sonarr(series, episodes)
+
+    series_to_fetch = all_series
+    if calendar_window:
+        start_date, end_date = calendar_window
+        print(f"{AZUL}Consultando o calendário do Sonarr de {start_date.strftime('%d/%m/%Y')} até {end_date.strftime('%d/%m/%Y')}...{RESET}")
+        with measure_phase("sonarr_calendar_fetch"):
+            calendar_episodes = get_sonarr_calendar(sonarr_url, api_key, start_date, end_date)
+        calendar_series_ids = {ep.get('seriesId') for ep in calendar_episodes}
+        series_to_fetch = []
+        for series in all_series:
+            # Um finalizado com episódio futuro além da janela, sem os episódios, pareceria
+            # não ter episódios futuros e entraria em "ended"
+            if series['id'] in calendar_series_ids or (series.get('status') == 'ended' and series.get('nextAiring')):
+                series_to_fetch.append(series)
+            else:
+                # Fora da janela nenhuma categoria baseada em data pode ser atendida
+                yield ready(series, [])
+        print(f"{AZUL}Modo calendário: {len(series_to_fetch)} de {len(all_series)} seriados têm episódios dentro da janela "
+              f"ou são finalizados com episódios futuros.{RESET}")
+
+    # Fase de episódios: consulta ao cache mais as buscas no Sonarr
+    with measure_phase("sonarr_episode_fetch"):
+        fingerprints = {}
+        if cache:
+            cache_hits = 0
+            pending = []
+            for series in series_to_fetch:
+                fingerprints[series['id']] = series_fingerprint(series)
+                cached_episodes = None if full_refresh else cache.get_episodes(sonarr_url, series['id'], fingerprints[series['id']])
+                if cached_episodes is not None:
+                    cache_hits += 1
+                    yield ready(series, cached_episodes)
+                else:
+                    pending.append(series)
+            series_to_fetch = pending
+            if full_refresh:
+                print(f"{LARANJA}Atualização completa solicitada (--full-refresh): o cache de episódios será ignorado.{RESET}")
+            print(f"{AZUL}Cache de episódios{label}: {cache_hits} acertos, {len(series_to_fetch)} falhas.{RESET}")
+
+        if plan_window:
+            planned = []
+            for series in series_to_fetch:
+                if series_needs_episodes(series, plan_window):
+                    planned.append(series)
+                else:
+                    yield ready(series, [])
+            print(f"{AZUL}Planejamento da busca: {len(series_to_fetch) - len(planned)} seriados sem chance de entrar em "
+                  f"alguma categoria não terão os episódios buscados.{RESET}")
+            series_to_fetch = planned
+
+        # Com o cache de episódios (sem --full-refresh), o próprio cache gravado durante a busca
+        # já retoma uma execução interrompida; nos outros casos é usada a tabela de checkpoint
+        use_checkpoint = checkpoint is not None and (cache is None or full_refresh)
+        if use_checkpoint:
+            max_age = SONARR_CHECKPOINT_MAX_AGE_HOURS * 3600
+            pending = []
+            for series in series_to_fetch:
+                fingerprint = fingerprints.setdefault(series['id'], series_fingerprint(series))
+                saved_episodes = checkpoint.get_checkpoint(sonarr_url, series['id'], fingerprint, max_age)
+                if saved_episodes is not None:
+                    yield ready(series, saved_episodes)
+                else:
+                    pending.append(series)
+            if len(pending) < len(series_to_fetch):
+                print(f"{AZUL}Retomando a busca interrompida{label}: {len(series_to_fetch) - len(pending)} seriados já tinham sido buscados.{RESET}")
+            series_to_fetch = pending
+        store = cache or (checkpoint if use_checkpoint else None)
+
+        total_series = len(series_to_fetch)
+        max_workers = max(1, int(max_concurrent_requests))
+        # Arredonda para cima: com qualquer porcentagem acima de 0, bibliotecas pequenas toleram ao menos uma falha
+        failure_budget = math.ceil(len(all_series) * float(failure_budget_percent) / 100)
+        failed = []
+        print(f"{AZUL}Buscando episódios para {total_series} seriados com até {max_workers} requisições simultâneas (isso pode levar um tempo)...{RESET}")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Cada future é associado ao seu seriado, para que o resultado seja anexado ao objeto certo
+            futures = {
+                executor.submit(get_sonarr_episodes, sonarr_url, api_key, series['id']): series
+                for series in series_to_fetch
             }
-            
-            if skip_unmonitored:
-                episode_monitored = next_future.get("monitored", True)
-                
-                season_monitored = True
-                for season_info in series.get("seasons", []):
-                    if season_info.get("seasonNumber") == next_future['seasonNumber']:
-                        season_monitored = season_info.get("monitored", True)
-                        break
-                
-                if not episode_monitored or not season_monitored:
-                    skipped_shows.append(show_dict)
+            try:
+                for i, future in enumerate(as_completed(futures)):
+                    # Retira o future do dicionário para que o resultado não fique retido até o fim das buscas
+                    series = futures.pop(future)
+                    # Mostra o progresso
+                    print(f"{VERDE}  -> Buscando episódios{label}: {i + 1} de {total_series} - {series['title']}{RESET}".ljust(80), end='\r')
+                    try:
+                        episodes = future.result()
+                    except Exception as e:
+                        print(f"\n{LARANJA}Falha ao buscar episódios para {series['title']} (ID: {series['id']}): {e}{RESET}")
+                        failed.append(series)
+                        if len(failed) > failure_budget:
+                            print(f"{VERMELHO}Erro a busca de episódios de Sonarr: {len(failed)} seriados falharam, acima do limite de "
+                                  f"{failure_budget} (sonarr_failure_budget_percent). A próxima execução retoma a busca.{RESET}")
+                            # O que ainda está na fila é cancelado abaixo; o progresso já gravado fica para a próxima execução
+                            if store:
+                                store.commit()
+                            sys.exit(1)
+                        continue
+                    if cache:
+                        cache.put_episodes(sonarr_url, series['id'], fingerprints[series['id']], episodes)
+                    if use_checkpoint:
+                        checkpoint.put_checkpoint(sonarr_url, series['id'], fingerprints[series['id']], episodes)
+                    if store and (i + 1) % SONARR_CHECKPOINT_INTERVAL == 0:
+                        store.commit()
+                    yield ready(series, episodes)
+            finally:
+                # Se a busca for interrompida (ou o consumidor do gerador parar antes do fim),
+                # cancela as buscas que ainda estão na fila em vez de esperar por elas
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        # Limpa a linha de progresso
+        print(" " * 80, end='\r')
+        if failed:
+            # Seriados que falharam não somem das categorias: seguem com a última lista conhecida.
+            # Sem nenhuma lista conhecida, ficam fora da classificação em vez de serem classificados
+            # sem episódios (o que os tiraria das categorias por data ou os poria em "ended")
+            known = cache or checkpoint
+            titles, skipped = [], []
+            for series in failed:
+                last_episodes = known.get_last_episodes(sonarr_url, series['id']) if known else None
+                if last_episodes is None:
+                    skipped.append(series['title'])
                     continue
-            
-            matched_shows.append(show_dict)
-        # Se for um show completamente novo (1ª temporada), adicione -o aos programas ignorados para relatórios
-        elif (
-            next_future['seasonNumber'] == 1
-            and next_future['episodeNumber'] == 1
-            and not next_future['hasFile']
-            and air_date_next <= cutoff_date
-        ):
-            tvdb_id = series.get('tvdbId')
-            air_date_str_dd_mm_yyyy = air_date_next.date().strftime("%d/%m/%Y")
+                series['stale'] = True
+                titles.append(series['title'])
+                yield ready(series, last_episodes)
+            _run_metrics.add_stale_series(titles + skipped)
+            if titles:
+                print(f"{LARANJA}{len(titles)} seriados{label} seguem com os últimos episódios conhecidos (busca falhou): "
+                      f"{', '.join(titles)}{RESET}")
+            if skipped:
+                print(f"{LARANJA}{len(skipped)} seriados{label} ficaram fora desta execução (busca falhou e nenhum episódio "
+                      f"é conhecido): {', '.join(skipped)}{RESET}")
+        if use_checkpoint:
+            checkpoint.clear_checkpoint(sonarr_url)
+        if cache:
+            cache.prune_episodes(sonarr_url, [series['id'] for series in all_series])
+        if store:
+            store.commit()
+    print(f"{VERDE}Busca de dados do Sonarr{label} concluída.{RESET}")
+
+def get_all_data_from_sonarr(sonarr_url, api_key, max_concurrent_requests=5, calendar_window=None, cache=None, full_refresh=False, name=None,
+                             plan_window=None, checkpoint=None, failure_budget_percent=0):
+    """Busca todos os seriados com os episódios (ver iter_sonarr_series), como registros Series na ordem do Sonarr."""
+    records = sorted(iter_sonarr_series(sonarr_url, api_key, max_concurrent_requests, calendar_window, cache, full_refresh,
+                                        name, plan_window, checkpoint, failure_budget_percent), key=itemgetter(0))
+    return [series for _, series in records]
+
+def get_all_data_from_sonarr_instances(instances, max_concurrent_requests=5, calendar_window=None, cache=None, full_refresh=False,
+                                       plan_window=None, checkpoint=None, failure_budget_percent=0):
+    """
+    Busca os seriados de todas as instâncias (lista de get_sonarr_instances, já com o api_url
+    validado) ao mesmo tempo, cada uma com até max_concurrent_requests requisições simultâneas,
+    e junta as bibliotecas pelo tvdbId. O cache de episódios já é separado por instância.
+    plan_window só é usado com uma instância: ao juntar, os episódios de uma instância podem
+    completar os de outra (hasFile/monitored), e o planejamento olha cada instância sozinha.
+    """
+    if len(instances) == 1:
+        instance = instances[0]
+        return get_all_data_from_sonarr(instance["api_url"], instance["api_key"], max_concurrent_requests,
+                                        calendar_window, cache, full_refresh, plan_window=plan_window,
+                                        checkpoint=checkpoint, failure_budget_percent=failure_budget_percent)
+    if plan_window:
+        print(f"{LARANJA}plan_episode_fetch é ignorado com mais de uma instância do Sonarr.{RESET}")
+
+    with ThreadPoolExecutor(max_workers=len(instances)) as executor:
+        futures = [
+            executor.submit(get_all_data_from_sonarr, instance["api_url"], instance["api_key"], max_concurrent_requests,
+                            calendar_window, cache, full_refresh, instance["name"],
+                            checkpoint=checkpoint, failure_budget_percent=failure_budget_percent)
+            for instance in instances
+        ]
+        # Se uma instância falhar (get_sonarr_* encerram com sys.exit), o erro chega aqui como nas buscas de uma só
+        libraries = [future.result() for future in futures]
 
-            show_dict = {
-                'title': series['title'],
-                'seasonNumber': next_future['seasonNumber'],
-                'airDate': air_date_str_dd_mm_yyyy,
-                'tvdbId': tvdb_id,
-                'reason': "New show (Season 1)"  # Adicione motivo para pular
-            }
-            
-            skipped_shows.append(show_dict)
-    
-    return matched_shows, skipped_shows
+    with measure_phase("sonarr_merge"):
+        merged, duplicates = merge_sonarr_libraries(libraries)
+    sizes = ", ".join(f"{instance['name']}: {len(library)}" for instance, library in zip(instances, libraries))
+    print(f"{VERDE}{len(merged)} seriados de {len(instances)} instâncias do Sonarr ({sizes}); "
+          f"{duplicates} presentes em mais de uma instância foram juntados pelo tvdbId.{RESET}")
+    return merged
 
-def find_upcoming_regular_episodes(all_series_with_episodes, future_days_upcoming_episode, utc_offset=0, skip_unmonitored=False):
-    """Find shows with upcoming non-premiere, non-finale episodes within the specified days"""
-    cutoff_date = datetime.now(timezone.utc) + timedelta(days=future_days_upcoming_episode)
-    now_local = datetime.now(timezone.utc) + timedelta(hours=utc_offset)
-    matched_shows = []
-    skipped_shows = []
-    
-    for series in all_series_with_episodes:
-        episodes = series.get('episodes', [])
-        
-        # Episódios de grupo por temporada
-        seasons = defaultdict(list)
-        for ep in episodes:
-            if ep.get('seasonNumber') > 0:  # Skip Specials
-                seasons[ep.get('seasonNumber')].append(ep)
-        
-        # Para cada temporada, encontre o número do episódio máximo para identificar finais
-        season_finales = {}
-        for season_num, season_eps in seasons.items():
-            if season_eps:
-                max_ep = max(ep.get('episodeNumber', 0) for ep in season_eps)
-                season_finales[season_num] = max_ep
-        
-        future_episodes = []
-        for ep in episodes:
-            # Skip specials (season 0)
-            season_number = ep.get('seasonNumber', 0)
-            if season_number == 0:
-                continue
-                
-            air_date_str = ep.get('airDateUtc')
-            if not air_date_str:
-                continue
-            
-            air_date = convert_utc_to_local(air_date_str, utc_offset)
-            
-            # Saltar episódios que já foram baixados -eles devem ser tratados como se tivessem sido exibidos
-            if ep.get('hasFile', False):
+def merge_sonarr_libraries(libraries):
+    """
+    Junta as bibliotecas (listas de Series, na ordem de precedência das instâncias) pelo tvdbId.
+    Em um seriado presente em mais de uma instância:
+      - id, título e status vêm da primeira instância que tem o seriado;
+      - o seriado, cada temporada e cada episódio são monitorados se forem em alguma instância;
+      - um episódio está baixado (hasFile) se estiver em alguma instância;
+      - os episódios são a união por (temporada, episódio), e a data de exibição vem da primeira
+        instância que a informa.
+    Seriados sem tvdbId não podem ser comparados e entram como estão.
+    Retorna (seriados, quantos seriados repetidos foram juntados).
+    """
+    merged = []
+    positions = {}
+    duplicates = 0
+    for library in libraries:
+        for series in library:
+            if not series.tvdb_id:
+                merged.append(series)
                 continue
-                
-            if air_date > now_local and air_date <= cutoff_date:
-                future_episodes.append((ep, air_date))
-        
-        future_episodes.sort(key=lambda x: x[1])
-        
-        if not future_episodes:
+            position = positions.get(series.tvdb_id)
+            if position is None:
+                positions[series.tvdb_id] = len(merged)
+                merged.append(series)
+            else:
+                merged[position] = _merge_series(merged[position], series)
+                duplicates += 1
+    return merged, duplicates
+
+def _merge_series(first, other):
+    """Junta other em first (ver merge_sonarr_libraries) sem alterar os registros, que podem estar no cache."""
+    season_monitored = dict(first.season_monitored)
+    for season_number, monitored in other.season_monitored.items():
+        season_monitored[season_number] = season_monitored.get(season_number, False) or monitored
+
+    episodes = list(first.episodes)
+    episode_positions = {(ep.season_number, ep.episode_number): i for i, ep in enumerate(episodes)}
+    for ep in other.episodes:
+        key = (ep.season_number, ep.episode_number)
+        position = episode_positions.get(key)
+        if position is None:
+            episode_positions[key] = len(episodes)
+            episodes.append(ep)
             continue
-        
-        next_future, air_date = future_episodes[0]
-        season_num = next_future.get('seasonNumber')
-        episode_num = next_future.get('episodeNumber')
-        
-        # Pular temporada estreia (episódio 1 de qualquer temporada)
-        if episode_num == 1:
+        current = episodes[position]
+        if ((ep.has_file and not current.has_file) or (ep.monitored and not current.monitored)
+                or (ep.air_date_utc and not current.air_date_utc)):
+            episodes[position] = Episode(current.season_number, current.episode_number,
+                                         current.air_date_utc or ep.air_date_utc,
+                                         current.has_file or ep.has_file, current.monitored or ep.monitored)
+
+    return Series(first.id, first.title, first.tvdb_id, first.status, first.monitored or other.monitored,
+                  season_monitored, episodes, first.stale or other.stale)
+
+def index_series_episodes(series, utc_offset, now_local):
+    """
+    Percorre os episódios de um seriado uma única vez e monta o índice usado por todas as
+    categorias: quantidade de episódios e maior número de episódio de cada temporada,
+    episódios baixados por temporada e os próximos episódios ainda não baixados.
+    Especiais (temporada 0) são ignorados.
+    """
+    season_sizes = {}
+    season_max_episode = {}
+    downloaded_episodes = defaultdict(list)
+    future_episodes = []
+    has_future_regular_episodes = False
+
+    for ep in series.episodes:
+        season_number = ep.season_number
+        if season_number == 0:
             continue
-            
-        # Pular as finais da temporada
-        is_episode_finale = season_num in season_finales and episode_num == season_finales[season_num]
-        if is_episode_finale:
+
+        if season_number > 0:
+            episode_number = ep.episode_number
+            if season_number in season_sizes:
+                season_sizes[season_number] += 1
+                if episode_number > season_max_episode[season_number]:
+                    season_max_episode[season_number] = episode_number
+            else:
+                season_sizes[season_number] = 1
+                season_max_episode[season_number] = episode_number
+            if ep.has_file:
+                downloaded_episodes[season_number].append(ep)
+
+        air_date = get_episode_air_date(ep, utc_offset)
+        if air_date is None:
             continue
-        
-        tvdb_id = series.get('tvdbId')
+        if air_date > now_local:
+            has_future_regular_episodes = True
+            # Episódios já baixados são tratados como se já tivessem sido exibidos
+            if not ep.has_file:
+                future_episodes.append((ep, air_date))
+
+    future_episodes.sort(key=lambda x: x[1])
+    return {
+        'season_sizes': season_sizes,
+        'season_max_episode': season_max_episode,
+        'downloaded_episodes': downloaded_episodes,
+        'future_episodes': future_episodes,
+        'has_future_regular_episodes': has_future_regular_episodes,
+    }
+
+def _classify_new_season(series, index, cutoff_date, skip_unmonitored):
+    """Nova temporada (episódio 1, temporada > 1) como próximo episódio dentro da janela. Retorna (correspondência, ignorado)."""
+    if not index['future_episodes']:
+        return None, None
+    next_future, air_date_next = index['future_episodes'][0]
+    if next_future.episode_number != 1 or air_date_next > cutoff_date:
+        return None, None
+
+    show_dict = {
+        'title': series.title,
+        'seasonNumber': next_future.season_number,
+        'airDate': air_date_next.date().strftime("%d/%m/%Y"),
+        'tvdbId': series.tvdb_id
+    }
+    if next_future.season_number > 1:
+        if skip_unmonitored and (not next_future.monitored
+                                 or not series.is_season_monitored(next_future.season_number)):
+            return None, show_dict
+        return show_dict, None
+    if next_future.season_number == 1:
+        # Um show completamente novo (1ª temporada) entra apenas no relatório de ignorados
+        show_dict['reason'] = "New show (Season 1)"
+        return None, show_dict
+    return None, None
+
+def _classify_upcoming(series, index, cutoff_date, skip_unmonitored, finale):
+    """
+    Próximo episódio dentro da janela: com finale=False, episódios regulares (nem estreia nem
+    final de temporada); com finale=True, apenas finais de temporada. Retorna (correspondência, ignorado).
+    """
+    if not index['future_episodes']:
+        return None, None
+    next_future, air_date = index['future_episodes'][0]
+    if air_date > cutoff_date:
+        return None, None
+    season_num = next_future.season_number
+    episode_num = next_future.episode_number
+    season_max_episode = index['season_max_episode']
+
+    if finale:
+        # Apenas finais de temporada, e o número do episódio deve ser maior que 1
+        if not (season_num in season_max_episode and season_max_episode[season_num] > 1
+                and episode_num == season_max_episode[season_num] and episode_num > 1):
+            return None, None
+    elif episode_num == 1 or (season_num in season_max_episode and episode_num == season_max_episode[season_num]):
+        # Pula estreias e finais de temporada
+        return None, None
+
+    show_dict = {
+        'title': series.title,
+        'seasonNumber': season_num,
+        'episodeNumber': episode_num,
+        'airDate': air_date.date().strftime("%d/%m/%Y"),
+        'tvdbId': series.tvdb_id
+    }
+    if skip_unmonitored and (not next_future.monitored or not series.is_season_monitored(season_num)):
+        return None, show_dict
+    return show_dict, None
+
+def _recent_show_dict(series, season_num, episode, utc_offset, now_local, cutoff_date):
+    """
+    Monta o registro de um final baixado se ele foi ao ar dentro do período recente ou se tem
+    data futura mas já foi baixado (nesse caso com a data de hoje). Senão retorna None.
+    """
+    air_date = get_episode_air_date(episode, utc_offset)
+    if air_date is None:
+        return None
+    if air_date > now_local and episode.has_file:
+        air_date_str_dd_mm_yyyy = now_local.date().strftime("%d/%m/%Y")
+    elif cutoff_date <= air_date <= now_local:
         air_date_str_dd_mm_yyyy = air_date.date().strftime("%d/%m/%Y")
+    else:
+        return None
+    return {
+        'title': series.title,
+        'seasonNumber': season_num,
+        'episodeNumber': episode.episode_number,
+        'airDate': air_date_str_dd_mm_yyyy,
+        'tvdbId': series.tvdb_id
+    }
 
-        show_dict = {
-            'title': series['title'],
-            'seasonNumber': season_num,
-            'episodeNumber': episode_num,
-            'airDate': air_date_str_dd_mm_yyyy,
-            'tvdbId': tvdb_id
-        }
-        
-        if skip_unmonitored:
-            episode_monitored = next_future.get("monitored", True)
-            
-            season_monitored = True
-            for season_info in series.get("seasons", []):
-                if season_info.get("seasonNumber") == season_num:
-                    season_monitored = season_info.get("monitored", True)
-                    break
-            
-            if not episode_monitored or not season_monitored:
-                skipped_shows.append(show_dict)
-                continue
-        
-        matched_shows.append(show_dict)
-    
-    return matched_shows, skipped_shows
+def _classify_season_finales(series, index, utc_offset, now_local, cutoff_date, skip_unmonitored):
+    """Finais de temporada baixados de seriados em andamento. Pode retornar um registro por temporada."""
+    if series.status not in ['continuing', 'upcoming']:
+        return []
+    if skip_unmonitored and not series.monitored:
+        return []
 
-def find_upcoming_finales(all_series_with_episodes, future_days_upcoming_finale, utc_offset=0, skip_unmonitored=False):
-    """Encontrar shows com as próximas Fim de temporada nos dias especificados"""
-    cutoff_date = datetime.now(timezone.utc) + timedelta(days=future_days_upcoming_finale)
     matched_shows = []
-    skipped_shows = []
-    
-    for series in all_series_with_episodes:
-        episodes = series.get('episodes', [])
-        
-        # Agrupar Episódios por Temporada
-        seasons = defaultdict(list)
-        for ep in episodes:
-            if ep.get('seasonNumber') > 0:  # Skip specials
-                seasons[ep.get('seasonNumber')].append(ep)
-        
-        # Para cada temporada, encontre o número do episódio máximo para identificar finais
-        season_finales = {}
-        for season_num, season_eps in seasons.items():
-            if season_eps:
-                max_ep = max(ep.get('episodeNumber', 0) for ep in season_eps)
-                # Apenas considere um final se não for o episódio 1
-                if max_ep > 1:
-                    season_finales[season_num] = max_ep
-        
-        future_episodes = []
-        for ep in episodes:
-            # Skip specials (season 0)
-            season_number = ep.get('seasonNumber', 0)
-            if season_number == 0:
-                continue
-                
-            air_date_str = ep.get('airDateUtc')
-            if not air_date_str:
-                continue
-            
-            air_date = convert_utc_to_local(air_date_str, utc_offset)
-            
-            now_local = datetime.now(timezone.utc) + timedelta(hours=utc_offset)
-            
-            # Skip episódios que já foram baixados -eles serão tratados por Recent_Season_finales
-            if ep.get('hasFile', False):
-                continue
-                
-            if air_date > now_local and air_date <= cutoff_date:
-                future_episodes.append((ep, air_date))
-        
-        future_episodes.sort(key=lambda x: x[1])
-        
-        if not future_episodes:
+    downloaded_episodes = index['downloaded_episodes']
+    for season_num, season_size in index['season_sizes'].items():
+        # Considere apenas um final se houver vários episódios na temporada
+        if season_size <= 1 or season_num not in downloaded_episodes:
             continue
-        
-        next_future, air_date = future_episodes[0]
-        season_num = next_future.get('seasonNumber')
-        episode_num = next_future.get('episodeNumber')
-        
-        # Incluem apenas as finais da temporada e garantir que o número do episódio seja maior que 1
-        is_episode_finale = season_num in season_finales and episode_num == season_finales[season_num] and episode_num > 1
-        if not is_episode_finale:
+        max_episode_num = index['season_max_episode'][season_num]
+        finale_episode = next((ep for ep in downloaded_episodes[season_num] if ep.episode_number == max_episode_num), None)
+        if not finale_episode:
             continue
-        
-        tvdb_id = series.get('tvdbId')
-        air_date_str_dd_mm_yyyy = air_date.date().strftime("%d/%m/%Y")
+        if skip_unmonitored and (not series.is_season_monitored(season_num) or not finale_episode.monitored):
+            continue
+        show_dict = _recent_show_dict(series, season_num, finale_episode, utc_offset, now_local, cutoff_date)
+        if show_dict:
+            show_dict['episodeNumber'] = max_episode_num
+            matched_shows.append(show_dict)
+    return matched_shows
 
-        show_dict = {
-            'title': series['title'],
-            'seasonNumber': season_num,
-            'episodeNumber': episode_num,
-            'airDate': air_date_str_dd_mm_yyyy,
-            'tvdbId': tvdb_id
-        }
-        
-        if skip_unmonitored:
-            episode_monitored = next_future.get("monitored", True)
-            
-            season_monitored = True
-            for season_info in series.get("seasons", []):
-                if season_info.get("seasonNumber") == season_num:
-                    season_monitored = season_info.get("monitored", True)
-                    break
-            
-            if not episode_monitored or not season_monitored:
-                skipped_shows.append(show_dict)
-                continue
-        
-        matched_shows.append(show_dict)
-    
-    return matched_shows, skipped_shows
+def _classify_final_episode(series, index, utc_offset, now_local, cutoff_date, skip_unmonitored):
+    """Episódio final baixado de um seriado finalizado sem episódios futuros pendentes."""
+    if series.status != 'ended':
+        return None
+    if skip_unmonitored and not series.monitored:
+        return None
+    downloaded_episodes = index['downloaded_episodes']
+    if not downloaded_episodes:
+        return None
 
-def find_ended_shows(all_series_with_episodes, tmdb_api_key=None):
-    """Find shows that have ended and have no upcoming regular episodes (ignoring specials).
-    Returns a tuple of (ended_shows, cancelled_shows)."""
-    ended_shows = []
-    cancelled_shows = []
+    # Último episódio baixado da temporada mais alta com downloads
+    max_season = max(downloaded_episodes.keys())
+    max_episode_num = max(ep.episode_number for ep in downloaded_episodes[max_season])
+    final_episode = next((ep for ep in downloaded_episodes[max_season] if ep.episode_number == max_episode_num), None)
+    if not final_episode:
+        return None
+    if skip_unmonitored and (not series.is_season_monitored(max_season) or not final_episode.monitored):
+        return None
+    # Pula se ainda existem episódios futuros que não foram baixados
+    if index['future_episodes']:
+        return None
+    show_dict = _recent_show_dict(series, max_season, final_episode, utc_offset, now_local, cutoff_date)
+    if show_dict:
+        show_dict['episodeNumber'] = max_episode_num
+    return show_dict
+
+def _classify_new_season_started(series, index, utc_offset, now_local, cutoff_date, skip_unmonitored):
+    """Primeiro episódio baixado de uma nova temporada (não a primeira) que foi ao ar recentemente."""
+    if skip_unmonitored and not series.monitored:
+        return None
+    # Pule se houver apenas uma temporada (novo show)
+    downloaded_episodes = index['downloaded_episodes']
+    if len(index['season_sizes']) <= 1 or not downloaded_episodes:
+        return None
+    max_season_with_downloads = max(downloaded_episodes.keys())
+    if max_season_with_downloads <= 1:
+        return None
+    # Confirma que há temporadas anteriores com downloads (para confirmar que não é um novo show)
+    if not any(season < max_season_with_downloads for season in downloaded_episodes.keys()):
+        return None
 
-    # Primeiro, filtre as séries que precisam ser verificadas no TMDB
-    series_to_check = []
-    for series in all_series_with_episodes:
-        if series.get("status") == "ended":
-            episodes = series.get('episodes', [])
+    first_episode = min(downloaded_episodes[max_season_with_downloads], key=lambda ep: ep.episode_number)
+    if skip_unmonitored and (not series.is_season_monitored(max_season_with_downloads) or not first_episode.monitored):
+        return None
 
-            has_future_regular_episodes = False
-            for ep in episodes:
-                air_date_str = ep.get("airDateUtc")
-                season_number = ep.get("seasonNumber", 0)
+    # Usa a data do ar como proxy da data do download
+    air_date = get_episode_air_date(first_episode, utc_offset)
+    if air_date is None:
+        return None
+    if not cutoff_date <= air_date <= now_local:
+        return None
+    return {
+        'title': series.title,
+        'seasonNumber': max_season_with_downloads,
+        'episodeNumber': first_episode.episode_number,
+        'airDate': air_date.date().strftime("%d/%m/%Y"),
+        'tvdbId': series.tvdb_id
+    }
 
-                if season_number == 0:
-                    continue
+class LibraryClassifier:
+    """
+    Motor de classificação em passada única: cada seriado entra uma vez com add(), que monta o
+    seu índice por temporada e avalia todas as categorias pedidas a partir dele. Só os registros
+    de resultado (pequenos) são guardados, então a lista de episódios do seriado pode ser
+    liberada logo depois (pipeline de classify_while_fetching).
 
-                if air_date_str:
-                    air_date = datetime.fromisoformat(
-                        air_date_str.replace("Z", "")
-                    ).replace(tzinfo=timezone.utc)
-                    if air_date > datetime.now(timezone.utc):
-                        has_future_regular_episodes = True
-                        break
+    category_days informa as categorias a avaliar e os dias de cada uma:
+      season_finale, final_episode, new_season_started (dias passados),
+      new_season, upcoming_episode, upcoming_finale (dias futuros) e
+      ended (sem dias, candidatos a finalizados/cancelados a serem verificados no TMDB).
 
-            if not has_future_regular_episodes:
-                series_to_check.append(series)
+    now é o instante de referência (UTC) da execução; por padrão, get_reference_now().
+    """
 
-    # Agora, processe a lista filtrada com indicação de progresso
-    total_to_check = len(series_to_check)
-    if total_to_check > 0:
-        print(f"\n{AZUL}Verificando status no TMDB para {total_to_check} seriados finalizados/cancelados...{RESET}")
+    def __init__(self, category_days, utc_offset=0, skip_unmonitored=False, now=None):
+        now_utc = now or get_reference_now()
+        self.category_days = category_days
+        self.utc_offset = utc_offset
+        self.skip_unmonitored = skip_unmonitored
+        self.now_local = now_utc + timedelta(hours=utc_offset)
+        # Janelas futuras contam a partir de agora (UTC); janelas passadas a partir da hora local
+        self.future_cutoffs = {
+            category: now_utc + timedelta(days=category_days[category])
+            for category in ("new_season", "upcoming_episode", "upcoming_finale") if category in category_days
+        }
+        self.recent_cutoffs = {
+            category: self.now_local - timedelta(days=category_days[category])
+            for category in ("season_finale", "final_episode", "new_season_started") if category in category_days
+        }
+        # (posição do seriado, registro) de cada categoria
+        self._rows = defaultdict(list)
+        self._count = 0
+        # Tempo de cada categoria (e do índice), somado entre os seriados, para as métricas
+        self._category_seconds = defaultdict(float)
+
+    def add(self, series, position=None):
+        """Classifica um registro Series; position define a ordem dele nos resultados (padrão: a de chegada)."""
+        if position is None:
+            position = self._count
+        self._count += 1
+        utc_offset, now_local, skip_unmonitored = self.utc_offset, self.now_local, self.skip_unmonitored
+        recent_cutoffs, rows, category_seconds = self.recent_cutoffs, self._rows, self._category_seconds
+
+        checkpoint = time.perf_counter()
+        index = index_series_episodes(series, utc_offset, now_local)
+        checkpoint = _lap(category_seconds, "index", checkpoint)
+
+        if "season_finale" in recent_cutoffs:
+            rows["season_finale"].extend((position, show_dict) for show_dict in _classify_season_finales(
+                series, index, utc_offset, now_local, recent_cutoffs["season_finale"], skip_unmonitored))
+            checkpoint = _lap(category_seconds, "season_finale", checkpoint)
+        if "final_episode" in recent_cutoffs:
+            show_dict = _classify_final_episode(
+                series, index, utc_offset, now_local, recent_cutoffs["final_episode"], skip_unmonitored)
+            if show_dict:
+                rows["final_episode"].append((position, show_dict))
+            checkpoint = _lap(category_seconds, "final_episode", checkpoint)
+        if "new_season_started" in recent_cutoffs:
+            show_dict = _classify_new_season_started(
+                series, index, utc_offset, now_local, recent_cutoffs["new_season_started"], skip_unmonitored)
+            if show_dict:
+                rows["new_season_started"].append((position, show_dict))
+            checkpoint = _lap(category_seconds, "new_season_started", checkpoint)
+
+        for category, cutoff_date in self.future_cutoffs.items():
+            if category == "new_season":
+                matched, skipped = _classify_new_season(series, index, cutoff_date, skip_unmonitored)
+            else:
+                matched, skipped = _classify_upcoming(
+                    series, index, cutoff_date, skip_unmonitored, finale=(category == "upcoming_finale"))
+            if matched:
+                rows[category].append((position, matched))
+            if skipped:
+                rows[f"{category}_skipped"].append((position, skipped))
+            checkpoint = _lap(category_seconds, category, checkpoint)
+
+        if "ended" in self.category_days and series.status == "ended" and not index['has_future_regular_episodes']:
+            rows["ended"].append((position, series))
+
+    def results(self):
+        """
+        Dicionário com a lista de registros de cada categoria, ordenada pela posição dos seriados,
+        mais as listas "<categoria>_skipped" das categorias futuras. Soma os tempos às métricas.
+        """
+        results = {category: [] for category in self.category_days}
+        for category in self.future_cutoffs:
+            results[f"{category}_skipped"] = []
+        for category, rows in self._rows.items():
+            # Ordenação estável: os registros de um mesmo seriado mantêm a ordem em que foram gerados
+            rows.sort(key=itemgetter(0))
+            results[category] = [row for _, row in rows]
+        for category, seconds in self._category_seconds.items():
+            _run_metrics.add_phase(f"classify_{category}", seconds)
+        self._category_seconds.clear()
+        return results
+
+def classify_library(all_series_with_episodes, category_days, utc_offset=0, skip_unmonitored=False, now=None):
+    """
+    Classifica de uma vez todos os seriados já buscados (ver LibraryClassifier).
 
-    for i, series in enumerate(series_to_check):
-        tvdb_id = series.get("tvdbId")
-        show_dict = {"title": series["title"], "tvdbId": tvdb_id}
+    Retorna um dicionário com a lista de registros de cada categoria, na ordem dos seriados,
+    mais as listas "<categoria>_skipped" das categorias futuras. As regras de prioridade e
+    exclusão entre categorias continuam sendo aplicadas por main().
 
-        # Adiciona a impressão de progresso, limpando a linha anterior
-        print(f"{VERDE}  -> Verificando {i + 1} de {total_to_check}: {series['title']}{RESET}".ljust(80), end='\r')
+    Os seriados podem ser registros Series ou dicionários do Sonarr com a chave 'episodes'.
+    """
+    classifier = LibraryClassifier(category_days, utc_offset, skip_unmonitored, now)
+    for series in as_series_records(all_series_with_episodes):
+        classifier.add(series)
+    return classifier.results()
+
+def get_category_days(config):
+    """Dias de cada categoria do Sonarr (category_days de LibraryClassifier) a partir do config."""
+    future_days = config.get('future_days', 14)
+    return {
+        "season_finale": config.get('recent_days_season_finale', 14),
+        "final_episode": config.get('recent_days_final_episode', 14),
+        "new_season": int(config.get('future_days_new_season', future_days)),
+        "new_season_started": config.get('recent_days_new_season_started', 7),
+        "upcoming_episode": int(config.get('future_days_upcoming_episode', future_days)),
+        "upcoming_finale": int(config.get('future_days_upcoming_finale', future_days)),
+        "ended": None,
+    }
 
-        tmdb_status = get_tmdb_status(tvdb_id, tmdb_api_key)
-        if tmdb_status and "cancel" in tmdb_status.lower():
-            cancelled_shows.append(show_dict)
-        else:
-            ended_shows.append(show_dict)
-    
-    # Limpa a linha de progresso ao final
-    if total_to_check > 0:
-        # Pula para a próxima linha para não sobrescrever a última linha de progresso
-        print()
-    return ended_shows, cancelled_shows
+def classify_while_fetching(series_stream, category_days, utc_offset=0, skip_unmonitored=False, now=None, keep_episodes=False):
+    """
+    Pipeline busca -> classificação: cada par (posição, Series) de series_stream (iter_sonarr_series)
+    tem as datas normalizadas e é classificado assim que os seus episódios chegam, enquanto as
+    outras buscas continuam. Sem keep_episodes, a lista de episódios é liberada logo em seguida,
+    e a memória não cresce com o tamanho da biblioteca.
+    Retorna (seriados na ordem do Sonarr, resultado no formato de classify_library).
+    """
+    classifier = LibraryClassifier(category_days, utc_offset, skip_unmonitored, now)
+    records = []
+    for position, series in series_stream:
+        normalize_air_dates([series], utc_offset)
+        classifier.add(series, position)
+        if not keep_episodes:
+            series.episodes = []
+        records.append((position, series))
+    records.sort(key=itemgetter(0))
+    return [series for _, series in records], classifier.results()
 
-def find_returning_shows(all_series_with_episodes, excluded_tvdb_ids):
-    """Encontrar programas com status "continuado" que não estão em outras categorias"""
-    matched_shows = []
-    
-    for series in all_series_with_episodes:
-        # Verifique se o show tem status "continuado"
-        if series.get('status') == 'continuing':
-            tvdb_id = series.get('tvdbId')
-            
-            # Pule se este show já estiver em outra categoria
-            if tvdb_id in excluded_tvdb_ids:
-                continue
-                
-            show_dict = {
-                'title': series['title'],
-                'tvdbId': tvdb_id
-            }
-            
-            matched_shows.append(show_dict)
-    
-    return matched_shows
+def find_new_season_shows(all_series_with_episodes, future_days_new_season, utc_offset=0, skip_unmonitored=False):
+    results = classify_library(all_series_with_episodes, {"new_season": future_days_new_season}, utc_offset, skip_unmonitored)
+    return results["new_season"], results["new_season_skipped"]
 
-def find_recent_season_finales(all_series_with_episodes, recent_days_season_finale, utc_offset=0, skip_unmonitored=False):
-    """Encontre shows com status 'continuando' que tinham um ar final da temporada dentro dos dias especificados ou um final futuro que já foi baixado"""
-    now_local = datetime.now(timezone.utc) + timedelta(hours=utc_offset)
-    cutoff_date = now_local - timedelta(days=recent_days_season_finale)
-    matched_shows = []
-    
-    for series in all_series_with_episodes:
-        # Inclua apenas shows contínuos
-        if series.get('status') not in ['continuing', 'upcoming']:
-            continue
-        # Pule os programas não monitorados se solicitados
-        if skip_unmonitored and not series.get('monitored', True):
-            continue
-        episodes = series.get('episodes', [])
-        
-        # Episódios de grupo por temporada e encontre episódios baixados
-        seasons = defaultdict(list)
-        downloaded_episodes = defaultdict(list)
-        
-        for ep in episodes:
-            season_number = ep.get('seasonNumber', 0)
-            if season_number > 0:  # Skip specials
-                seasons[season_number].append(ep)
-                if ep.get('hasFile', False):
-                    downloaded_episodes[season_number].append(ep)
-        
-        # Para cada temporada, encontre o número do episódio máximo para identificar finais
-        season_finales = {}
-        for season_num, season_eps in seasons.items():
-            # Considere apenas um final se houver vários episódios na temporada
-            if len(season_eps) > 1:
-                max_ep = max(ep.get('episodeNumber', 0) for ep in season_eps)
-                season_finales[season_num] = max_ep
-        
-        # Procure as finais da temporada exibida recentemente
-        for season_num, max_episode_num in season_finales.items():
-            # Pule se nenhum episódio baixado para esta temporada
-            if season_num not in downloaded_episodes:
-                continue
-                
-            # Encontre o episódio final
-            finale_episode = None
-            for ep in downloaded_episodes[season_num]:
-                if ep.get('episodeNumber') == max_episode_num:
-                    finale_episode = ep
-                    break
-            
-            if not finale_episode:
-                continue
-                
-            # Pule se a temporada não for monitorada e Skip_unmonitored é verdadeiro
-            if skip_unmonitored:
-                season_monitored = True
-                for season_info in series.get("seasons", []):
-                    if season_info.get("seasonNumber") == season_num:
-                        season_monitored = season_info.get("monitored", True)
-                        break
-                
-                if not season_monitored:
-                    continue
-                
-                # Verifique também se o episódio em si é monitorado
-                if not finale_episode.get("monitored", True):
-                    continue
-            
-            air_date_str = finale_episode.get('airDateUtc')
-            if not air_date_str:
-                continue
-                
-            air_date = convert_utc_to_local(air_date_str, utc_offset)
-            
-            # Inclua se:
-            # 1. Foi ao ar dentro do período recente, ou
-            # 2. Tem uma data futura do ar, mas já foi baixada
-            if (air_date <= now_local and air_date >= cutoff_date) or (air_date > now_local and finale_episode.get('hasFile', False)):
-                tvdb_id = series.get('tvdbId')
-                
-                # Se for um episódio futuro que já foi baixado, use a data de hoje em vez
-                if air_date > now_local and finale_episode.get('hasFile', False):
-                    air_date_str_dd_mm_yyyy = now_local.date().strftime("%d/%m/%Y")
-                else:
-                    air_date_str_dd_mm_yyyy = air_date.date().strftime("%d/%m/%Y")
-                
-                show_dict = {
-                    'title': series['title'],
-                    'seasonNumber': season_num,
-                    'episodeNumber': max_episode_num,
-                    'airDate': air_date_str_dd_mm_yyyy,
-                    'tvdbId': tvdb_id
-                }
-                
-                matched_shows.append(show_dict)
-    
-    return matched_shows
+def find_upcoming_regular_episodes(all_series_with_episodes, future_days_upcoming_episode, utc_offset=0, skip_unmonitored=False):
+    """Find shows with upcoming non-premiere, non-finale episodes within the specified days"""
+    results = classify_library(all_series_with_episodes, {"upcoming_episode": future_days_upcoming_episode}, utc_offset, skip_unmonitored)
+    return results["upcoming_episode"], results["upcoming_episode_skipped"]
 
-def find_recent_final_episodes(all_series_with_episodes, recent_days_final_episode, utc_offset=0, skip_unmonitored=False):
-    """Encontre programas com status 'terminou' que tiveram seu episódio final nos dias especificados ou ter um futuro episódio final que já foi baixado"""
-    now_local = datetime.now(timezone.utc) + timedelta(hours=utc_offset)
-    cutoff_date = now_local - timedelta(days=recent_days_final_episode)
-    matched_shows = []
-    
-    for series in all_series_with_episodes:
-        # Inclua apenas shows finais
-        if series.get('status') != 'ended':
-            continue
-        # Pule os programas não monitorados se solicitados
-        if skip_unmonitored and not series.get('monitored', True):
-            continue
-        episodes = series.get('episodes', [])
-        
-        # Episódios de grupo por temporada e encontre episódios baixados
-        seasons = defaultdict(list)
-        downloaded_episodes = defaultdict(list)
-        
-        for ep in episodes:
-            season_number = ep.get('seasonNumber', 0)
-            if season_number > 0:  # Skip specials
-                seasons[season_number].append(ep)
-                if ep.get('hasFile', False):
-                    downloaded_episodes[season_number].append(ep)
-        
-        # Pule se nenhum episódio baixado
-        if not any(downloaded_episodes.values()):
-            continue
-            
-        # Encontre a temporada mais alta com episódios baixados
-        max_season = max(downloaded_episodes.keys()) if downloaded_episodes else 0
-        
-        # Pule se nenhuma temporada válida encontrada
-        if max_season == 0:
-            continue
-            
-        # Encontre o número mais alto de episódio na temporada mais alta
-        max_episode_num = max(ep.get('episodeNumber', 0) for ep in downloaded_episodes[max_season])
-        
-        # Encontre o episódio final
-        final_episode = None
-        for ep in downloaded_episodes[max_season]:
-            if ep.get('episodeNumber') == max_episode_num:
-                final_episode = ep
-                break
-        
-        if not final_episode:
-            continue
-            
-        # Pule se a temporada não for monitorada e Skip_unmonitored é True
-        if skip_unmonitored:
-            season_monitored = True
-            for season_info in series.get("seasons", []):
-                if season_info.get("seasonNumber") == max_season:
-                    season_monitored = season_info.get("monitored", True)
-                    break
-            
-            if not season_monitored:
-                continue
-            
-            # Verifique também se o episódio em si é monitorado
-            if not final_episode.get("monitored", True):
-                continue
-        
-        # Verifique se existem episódios futuros que não são baixados
-        has_future_undownloaded_episodes = False
-        for ep in episodes:
-            air_date_str = ep.get('airDateUtc')
-            season_number = ep.get('seasonNumber', 0)
-            has_file = ep.get('hasFile', False)
-            
-            if season_number == 0:  # Skip specials
-                continue
-                
-            if air_date_str:
-                air_date = convert_utc_to_local(air_date_str, utc_offset)
-                if air_date > now_local and not has_file:
-                    has_future_undownloaded_episodes = True
-                    break
-        
-        if has_future_undownloaded_episodes:
-            continue
-            
-        air_date_str = final_episode.get('airDateUtc')
-        if not air_date_str:
-            continue
-            
-        air_date = convert_utc_to_local(air_date_str, utc_offset)
-        
-        # Inclua se:
-        # 1. Foi ao ar dentro do período recente, ou
-        # 2. Tem uma data futura do ar, mas já foi baixada
-        if (air_date <= now_local and air_date >= cutoff_date) or (air_date > now_local and final_episode.get('hasFile', False)):
-            tvdb_id = series.get('tvdbId')
-            
-            # Se for um episódio futuro que já foi baixado, use a data de hoje em vez
-            if air_date > now_local and final_episode.get('hasFile', False):
-                air_date_str_dd_mm_yyyy = now_local.date().strftime("%d/%m/%Y")
-            else:
-                air_date_str_dd_mm_yyyy = air_date.date().strftime("%d/%m/%Y")
-            
-            show_dict = {
-                'title': series['title'],
-                'seasonNumber': max_season,
-                'episodeNumber': max_episode_num,
-                'airDate': air_date_str_dd_mm_yyyy,
-                'tvdbId': tvdb_id
-            }
-            
-            matched_shows.append(show_dict)
+def find_upcoming_finales(all_series_with_episodes, future_days_upcoming_finale, utc_offset=0, skip_unmonitored=False):
+    """Encontrar shows com as próximas Fim de temporada nos dias especificados"""
+    results = classify_library(all_series_with_episodes, {"upcoming_finale": future_days_upcoming_finale}, utc_offset, skip_unmonitored)
+    return results["upcoming_finale"], results["upcoming_finale_skipped"]
+
+def find_ended_shows(all_series_with_episodes, tmdb_api_key=None, cache=None, tmdb_cache_ttl_days=7,
+                     max_concurrent_requests=5, tmdb_requests_per_second=40):
+    """Find shows that have ended and have no upcoming regular episodes (ignoring specials).
+    Returns a tuple of (ended_shows, cancelled_shows)."""
+    series_to_check = classify_library(all_series_with_episodes, {"ended": None})["ended"]
+    return check_ended_shows_on_tmdb(series_to_check, tmdb_api_key, cache, tmdb_cache_ttl_days,
+                                     max_concurrent_requests, tmdb_requests_per_second)
+
+def check_ended_shows_on_tmdb(series_to_check, tmdb_api_key=None, cache=None, tmdb_cache_ttl_days=7,
+                              max_concurrent_requests=5, tmdb_requests_per_second=40):
+    """Split ended series without upcoming regular episodes into ended and cancelled using TMDB.
+    TMDB statuses are read from the cache while they are younger than tmdb_cache_ttl_days;
+    the remaining lookups run in a bounded pool limited to tmdb_requests_per_second.
+    Series whose lookup failed are left out of both lists and retried on the next run.
+    Returns a tuple of (ended_shows, cancelled_shows)."""
+    ended_shows = []
+    cancelled_shows = []
+
+    # Agora, processe a lista filtrada com indicação de progresso
+    total_to_check = len(series_to_check)
+    if total_to_check > 0:
+        print(f"\n{AZUL}Verificando status no TMDB para {total_to_check} seriados finalizados/cancelados...{RESET}")
+
+    rate_limiter = RateLimiter(tmdb_requests_per_second)
+    statuses = {}
+    with ThreadPoolExecutor(max_workers=max(1, int(max_concurrent_requests))) as executor:
+        futures = {
+            executor.submit(get_tmdb_status, series.tvdb_id, tmdb_api_key, cache, tmdb_cache_ttl_days, rate_limiter): i
+            for i, series in enumerate(series_to_check)
+        }
+        for done, future in enumerate(as_completed(futures)):
+            i = futures[future]
+            # Adiciona a impressão de progresso, limpando a linha anterior
+            print(f"{VERDE}  -> Verificando {done + 1} de {total_to_check}: {series_to_check[i].title}{RESET}".ljust(80), end='\r')
+            statuses[i] = future.result()
+
+    # Mantém a ordem original dos seriados nas listas
+    failed_lookups = []
+    for i, series in enumerate(series_to_check):
+        show_dict = {"title": series.title, "tvdbId": series.tvdb_id}
+        tmdb_status = statuses.get(i)
+        if tmdb_status is TMDB_LOOKUP_FAILED:
+            failed_lookups.append(series.title)
+        elif tmdb_status and "cancel" in tmdb_status.lower():
+            cancelled_shows.append(show_dict)
+        else:
+            ended_shows.append(show_dict)
     
-    return matched_shows
+    # Limpa a linha de progresso ao final
+    if total_to_check > 0:
+        # Pula para a próxima linha para não sobrescrever a última linha de progresso
+        print()
+        if failed_lookups:
+            print(f"{LARANJA}Status do TMDB indisponível para {len(failed_lookups)} seriados, que ficaram fora de ended e cancelled até a próxima execução: {', '.join(failed_lookups)}{RESET}")
+        if cache:
+            cache.commit()
+            print(f"{AZUL}Cache TMDB: {cache.stats['tmdb_id_hits']} IDs e {cache.stats['tmdb_status_hits']} status reaproveitados sem consultar o TMDB.{RESET}")
+    return ended_shows, cancelled_shows
 
-def find_new_season_started(all_series_with_episodes, recent_days_new_season_started, utc_offset=0, skip_unmonitored=False):
-    """Encontre programas onde uma nova temporada (não a primeira temporada) foi baixada dentro dos dias especificados"""
-    now_local = datetime.now(timezone.utc) + timedelta(hours=utc_offset)
-    cutoff_date = now_local - timedelta(days=recent_days_new_season_started)
+def find_returning_shows(all_series_with_episodes, excluded_tvdb_ids):
+    """Encontrar programas com status "continuado" que não estão em outras categorias"""
     matched_shows = []
     
-    for series in all_series_with_episodes:
-        # Pule os programas não monitorados se solicitados
-        if skip_unmonitored and not series.get('monitored', True):
-            continue
-        episodes = series.get('episodes', [])
-        
-        # Episódios de grupo por temporada e encontre episódios baixados
-        seasons = defaultdict(list)
-        downloaded_episodes = defaultdict(list)
-        
-        for ep in episodes:
-            season_number = ep.get('seasonNumber', 0)
-            if season_number > 0:  # Skip specials
-                seasons[season_number].append(ep)
-                if ep.get('hasFile', False):
-                    downloaded_episodes[season_number].append(ep)
-        
-        # Pule se houver apenas uma temporada (novo show)
-        if len(seasons) <= 1:
-            continue
-            
-        # Encontre o número mais alto da temporada com episódios baixados
-        if not downloaded_episodes:
-            continue
-            
-        max_season_with_downloads = max(downloaded_episodes.keys())
-        
-        # Skip if it's season 1 (new show)
-        if max_season_with_downloads <= 1:
-            continue
-            
-        # Verifique se há temporadas anteriores com downloads (para confirmar que não é um novo show)
-        has_previous_season_downloads = any(season < max_season_with_downloads for season in downloaded_episodes.keys())
-        if not has_previous_season_downloads:
-            continue
-        
-        # Encontre o primeiro episódio da temporada mais alta que foi baixada
-        season_episodes = downloaded_episodes[max_season_with_downloads]
-        first_episode = min(season_episodes, key=lambda ep: ep.get('episodeNumber', 999))
-        
-        # Pule se a temporada não for monitorada e Skip_unmonitored é verdadeiro
-        if skip_unmonitored:
-            season_monitored = True
-            for season_info in series.get("seasons", []):
-                if season_info.get("seasonNumber") == max_season_with_downloads:
-                    season_monitored = season_info.get("monitored", True)
-                    break
-            
-            if not season_monitored:
-                continue
+    for series in as_series_records(all_series_with_episodes):
+        # Verifique se o show tem status "continuado"
+        if series.status == 'continuing':
+            tvdb_id = series.tvdb_id
             
-            # Verifique também se o episódio em si é monitorado
-            if not first_episode.get("monitored", True):
+            # Pule se este show já estiver em outra categoria
+            if tvdb_id in excluded_tvdb_ids:
                 continue
-        
-        # Verifique quando este episódio foi baixado (use a data do ar como proxy)
-        air_date_str = first_episode.get('airDateUtc')
-        if not air_date_str:
-            continue
-            
-        air_date = convert_utc_to_local(air_date_str, utc_offset)
-        
-        # Inclua se ele foi ao ar dentro do período recente (assumindo que o download aconteceu na data do ar)
-        if air_date >= cutoff_date and air_date <= now_local:
-            tvdb_id = series.get('tvdbId')
-            air_date_str_dd_mm_yyyy = air_date.date().strftime("%d/%m/%Y")
-            
+                
             show_dict = {
-                'title': series['title'],
-                'seasonNumber': max_season_with_downloads,
-                'episodeNumber': first_episode.get('episodeNumber'),
-                'airDate': air_date_str_dd_mm_yyyy,
+                'title': series.title,
                 'tvdbId': tvdb_id
             }
             
@@ -841,81 +2224,71 @@ def find_new_season_started(all_series_with_episodes, recent_days_new_season_sta
     
     return matched_shows
 
+def find_recent_season_finales(all_series_with_episodes, recent_days_season_finale, utc_offset=0, skip_unmonitored=False):
+    """Encontre shows com status 'continuando' que tinham um ar final da temporada dentro dos dias especificados ou um final futuro que já foi baixado"""
+    return classify_library(all_series_with_episodes, {"season_finale": recent_days_season_finale}, utc_offset, skip_unmonitored)["season_finale"]
+
+def find_recent_final_episodes(all_series_with_episodes, recent_days_final_episode, utc_offset=0, skip_unmonitored=False):
+    """Encontre programas com status 'terminou' que tiveram seu episódio final nos dias especificados ou ter um futuro episódio final que já foi baixado"""
+    return classify_library(all_series_with_episodes, {"final_episode": recent_days_final_episode}, utc_offset, skip_unmonitored)["final_episode"]
+
+def find_new_season_started(all_series_with_episodes, recent_days_new_season_started, utc_offset=0, skip_unmonitored=False):
+    """Encontre programas onde uma nova temporada (não a primeira temporada) foi baixada dentro dos dias especificados"""
+    return classify_library(all_series_with_episodes, {"new_season_started": recent_days_new_season_started}, utc_offset, skip_unmonitored)["new_season_started"]
+
+# Nomes usados nas datas das overlays. Os dias da semana abreviados (ddd) são traduzidos;
+# os demais nomes são os que o strftime devolve no locale padrão do Python (C)
+WEEKDAY_ABBREVIATIONS = ("SEG", "TER", "QUA", "QUI", "SEX", "SAB", "DOM")
+WEEKDAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+MONTH_ABBREVIATIONS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+MONTH_NAMES = ("January", "February", "March", "April", "May", "June", "July", "August",
+               "September", "October", "November", "December")
+
+DATE_FORMAT_FIELDS = {
+    'mmmm': lambda d: MONTH_NAMES[d.month - 1],           # Nome do mês inteiro
+    'mmm': lambda d: MONTH_ABBREVIATIONS[d.month - 1],    # Nome do mês abreviado
+    'mm': lambda d: f"{d.month:02d}",                     # Mês de 2 dígitos
+    'm': lambda d: str(d.month),                          # Mês de 1 dígito
+    'dddd': lambda d: WEEKDAY_NAMES[d.weekday()],         # Dia da semana inteiro
+    'ddd': lambda d: WEEKDAY_ABBREVIATIONS[d.weekday()],  # Dia da semana abreviado
+    'dd': lambda d: f"{d.day:02d}",                       # Dia de 2 dígitos
+    'd': lambda d: str(d.day),                            # Dia de 1 dígito
+    'yyyy': lambda d: str(d.year),                        # Ano com 4 dígitos
+    'yyy': lambda d: str(d.year),                         # Ano com 3+ dígitos
+    'yy': lambda d: f"{d.year % 100:02d}",                # Ano com 2 dígitos
+    'y': lambda d: f"{d.year % 100:02d}",                 # Ano sem o século
+}
+# Os padrões mais longos primeiro, para que "mmm" não seja lido como "mm" + "m"
+DATE_FORMAT_PATTERN = re.compile("|".join(sorted(DATE_FORMAT_FIELDS, key=len, reverse=True)))
+
+@functools.lru_cache(maxsize=None)
+def compile_date_format(date_format):
+    """
+    Converte um date_format (ex: "ddd dd/mm") uma única vez em uma tupla de partes: textos
+    fixos e funções que recebem a data. O resultado é reaproveitado por format_date.
+    """
+    parts = []
+    position = 0
+    for match in DATE_FORMAT_PATTERN.finditer(date_format):
+        if match.start() > position:
+            parts.append(date_format[position:match.start()])
+        parts.append(DATE_FORMAT_FIELDS[match.group()])
+        position = match.end()
+    if position < len(date_format):
+        parts.append(date_format[position:])
+    return tuple(parts)
+
+@functools.lru_cache(maxsize=4096)
 def format_date(dd_mm_yyyy, date_format, capitalize=False):
+    """Formata uma data dd/mm/yyyy com o date_format das overlays (resultados em cache)."""
     dt_obj = datetime.strptime(dd_mm_yyyy, "%d/%m/%Y")
-    
-    format_mapping = {
-        'mmm': '%b',    # Nome do mês abreviado
-        'mmmm': '%B',   # Nome do mês inteiro
-        'mm': '%m',     # Mês de 2 dígitos
-        'm': '%-m',     # 1-digit month
-        'dddd': '%A',   # Full weekday name
-        'ddd': '%a',    # Abbreviated weekday name
-        'dd': '%d',     # 2-digit day
-        'd': str(dt_obj.day),  # 1-digit day - direct integer conversion
-        'yyyy': '%Y',   # 4-digit year
-        'yyy': '%Y',    # 3+ digit year
-        'yy': '%y',     # 2-digit year
-        'y': '%y'       # Year without century
-    }
-    
-    
-    # Sort format patterns by length (longest first) to avoid partial matches
-    patterns = sorted(format_mapping.keys(), key=len, reverse=True)
-    
-    # First, replace format patterns with temporary markers
-    temp_format = date_format
-    replacements = {}
-    for i, pattern in enumerate(patterns):
-        marker = f"@@{i}@@"
-        if pattern in temp_format:
-            replacements[marker] = format_mapping[pattern]
-            temp_format = temp_format.replace(pattern, marker)
-    
-    # Now replace the markers with strftime formats
-    strftime_format = temp_format
-    for marker, replacement in replacements.items():
-        strftime_format = strftime_format.replace(marker, replacement)
-    
-    try:
-        result = dt_obj.strftime(strftime_format)
-        # Tradução manual do dia da semana
-        dias_semana = {
-            'Mon': 'SEG',
-            'Tue': 'TER',
-            'Wed': 'QUA',
-            'Thu': 'QUI',
-            'Fri': 'SEX',
-            'Sat': 'SAB',
-            'Sun': 'DOM'
-        }
-        if '%a' in strftime_format:
-            for eng, pt in dias_semana.items():
-                result = result.replace(eng, pt)
-        if capitalize:
-            result = result.upper()
-        return result
-    except ValueError as e:
-        print(f"{VERMELHO}Erro: formato de data inválida '{date_format}'. Usando formato padrão.{RESET}")
-        return dd_mm_yyyy
-    
-    try:
-        result = dt_obj.strftime(strftime_format)
-        if capitalize:
-            result = result.upper()
-        return result
-    except ValueError as e:
-        print(f"{VERMELHO}Erro: formato de data inválida '{date_format}'. Usando formato padrão.{RESET}")
-        return dd_mm_yyyy  # Return original format as fallback
+    result = "".join(part if isinstance(part, str) else part(dt_obj) for part in compile_date_format(date_format))
+    return result.upper() if capitalize else result
 
 def create_overlay_yaml(output_file, shows, config_sections, no_date_needed=False, category_key="TSSK_overlay"):
-    import yaml
-    from copy import deepcopy
-    from datetime import datetime
 
     if not shows:
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write("#Nenhum seriado com correspondência encontrados")
+        save_category_output("overlays", output_file, None, lambda: "#Nenhum seriado com correspondência encontrados")
         return
     
     # Group shows by date if available
@@ -986,16 +2359,11 @@ def create_overlay_yaml(output_file, shows, config_sections, no_date_needed=Fals
     
     final_output = {"overlays": overlays_dict}
     
-    with open(output_file, "w", encoding="utf-8") as f:
-        yaml.dump(final_output, f, sort_keys=False, allow_unicode=True)
+    save_category_output("overlays", output_file, final_output, lambda: dump_yaml(final_output))
 
 #################################PLEX BASED CONFIG#################################
 
 def filter_plex_config_yml(filter_config_section,recent_days=7):
-    import yaml
-    from copy import deepcopy
-    from datetime import datetime
-
 
     if filter_config_section == "new_episode_added":
         filter_config = {
@@ -1101,9 +2469,6 @@ def filter_plex_config_yml(filter_config_section,recent_days=7):
     return filter_config
 
 def create_plex_overlay_yaml(output_file, config_sections,filter_config=""):
-    import yaml
-    from copy import deepcopy
-    from datetime import datetime
     
     overlays_dict = {}
     # -- Backdrop Block --
@@ -1139,88 +2504,64 @@ def create_plex_overlay_yaml(output_file, config_sections,filter_config=""):
 
     final_output = {"overlays": overlays_dict}
     
-    with open(output_file, "w", encoding="utf-8") as f:
-        yaml.dump(final_output, f, sort_keys=False, allow_unicode=True)
+    save_category_output("overlays", output_file, final_output, lambda: dump_yaml(final_output))
     
 ################################# END PLEX BASED CONFIG#################################
 
+def _remove_category_files(directory, file_names, label):
+    """Apaga arquivos por categoria que ficaram de execuções anteriores (os arquivos únicos os substituem)."""
+    existing = [file_name for file_name in file_names if os.path.exists(os.path.join(directory, file_name))]
+    if not existing:
+        return
+    print(f"{AZUL}Deletando os arquivos de {label} originais...{RESET}")
+    for file_name in existing:
+        try:
+            os.remove(os.path.join(directory, file_name))
+            print(f"{VERDE}Arquivo {file_name} deletado com sucesso.{RESET}")
+        except OSError as e:
+            print(f"{VERMELHO}Erro ao tentar deletar o arquivo {file_name}: {e}{RESET}")
+
 def concatenate_overlays(is_docker, overlay_path="",delete_overlay_after_all_in_one=False,generate_all_in_one_overlays=False):
     """
-    Combina arquivos YML de overlays em um único arquivo chamado TSSK_TV_ALL_OVERLAYS_TOGETHER.yml.
+    Combina os overlays de todas as categorias em um único arquivo chamado TSSK_TV_ALL_OVERLAYS_TOGETHER.yml,
+    montado em memória a partir dos documentos gerados (sem reler os arquivos). As chaves de cada
+    categoria recebem o número do arquivo na ordem dos nomes (backdrop -> backdrop1, TSSK_x -> TSSK1_x).
     """
     print(f"\n{AZUL}Iniciando a concatenação dos arquivos de overlays...{RESET}")
     output_file_name = "TSSK_TV_ALL_OVERLAYS_TOGETHER.yml" #Não pode terminar com OVERLAY.yml para evitar loop infito das informações.
 
-    # Encontra todos os arquivos .yml de overlays e os ordena numericamente
-    overlay_files = sorted([f for f in os.listdir(overlay_path) if f.endswith('_OVERLAYS.yml')])
+    # Ordena os arquivos numericamente, como os nomes dos arquivos por categoria
+    overlay_files = sorted(_category_documents["overlays"])
     
     if not overlay_files:
         print(f"{LARANJA}Nenhum arquivo de overlay encontrado para concatenar.{RESET}")
         return
 
-    line_count = 1
-    with open(os.path.join(overlay_path, output_file_name), "w", encoding="utf-8") as outfile:
-        # Escreve a linha de cabeçalho 'overlays:'
-        outfile.write("overlays:\n")
-        
-        for file_name in overlay_files:
-            file_path = os.path.join(overlay_path, file_name)
-            try:
-                print(f"{VERDE}Processando {file_path} ...{RESET}")
-                with open(file_path, "r", encoding="utf-8") as infile:
-                    # Lê todas as linhas do arquivo de entrada
-                    lines = infile.readlines()
-                 
-                    # Ignora a primeira linha ('overlays:') e processa o restante
-                    for i, line in enumerate(lines):
-                        if i == 0:
-                            continue  # Pula a primeira linha
-                        
-                        # Substitui 'backdrop:' por 'backdropX:'
-                        if "backdrop:" in line:
-                            backdrop_line = line.replace("backdrop:", f"backdrop{line_count}:")
-                            outfile.write(backdrop_line)
-                        elif "TSSK" in line:
-                            TSSK_line = line.replace("TSSK", f"TSSK{line_count}")
-                            outfile.write(TSSK_line)
-                        
-                        else:
-                            outfile.write(line)
-                            
-            except FileNotFoundError:
-                print(f"{VERMELHO}Erro: O arquivo {file_path} não foi encontrado. Pulando este arquivo.{RESET}")
-                continue
-            except Exception as e:
-                print(f"{VERMELHO}Erro ao processar o arquivo {file_path}: {e}{RESET}")
-                continue
-            
-            line_count += 1    
-    set_permissions(os.path.join(overlay_path, output_file_name))
+    merged_overlays = {}
+    for file_number, file_name in enumerate(overlay_files, start=1):
+        print(f"{VERDE}Processando {file_name} ...{RESET}")
+        document = _category_documents["overlays"][file_name]
+        for key, value in (document or {}).get("overlays", {}).items():
+            if key == "backdrop":
+                new_key = f"backdrop{file_number}"
+            else:
+                new_key = key.replace("TSSK", f"TSSK{file_number}")
+            if new_key in merged_overlays:
+                new_key = f"{new_key}_{file_number}"
+            merged_overlays[new_key] = value
+
+    output_file = os.path.join(overlay_path, output_file_name)
+    content = dump_yaml({"overlays": merged_overlays}) if merged_overlays else "overlays:\n"
+    write_output_file(output_file, content)
+    set_permissions(output_file)
                 
     print(f"Todos os arquivos foram combinados em {output_file_name} com sucesso!{RESET}\n")
     
-    #Deleta os arquivos originais se true no arquivo de configuração
+    #Deleta os arquivos originais se true no arquivo de configuração (eles não são mais gravados)
     if delete_overlay_after_all_in_one and generate_all_in_one_overlays:
-        print(f"{AZUL}Deletando os arquivos de overlay originais...{RESET}")
-        for file_name in overlay_files:
-            file_path = os.path.join(overlay_path, file_name)
-            try:
-                os.remove(file_path)
-                print(f"{VERDE}Arquivo {file_name} deletado com sucesso.{RESET}")
-            except OSError as e:
-                print(f"{VERMELHO}Erro ao tentar deletar o arquivo {file_name}: {e}{RESET}")
+        _remove_category_files(overlay_path, overlay_files, "overlay")
 
 def create_collection_yaml(output_file, shows, config, config_key, summary):
-    import yaml
-    from yaml.representer import SafeRepresenter
-    from copy import deepcopy
-    from collections import OrderedDict
-
-    # Add representer for OrderedDict
-    def represent_ordereddict(dumper, data):
-        return dumper.represent_mapping('tag:yaml.org,2002:map', data.items())
-    
-    yaml.add_representer(OrderedDict, represent_ordereddict, Dumper=yaml.SafeDumper)
 
     # Determine collection type and get the appropriate config section
     collection_config = {}
@@ -1233,14 +2574,6 @@ def create_collection_yaml(output_file, shows, config, config_key, summary):
         # Extract the collection name and remove it from the config
         collection_name = collection_config.pop("collection_name", "TV Collection")
     
-    class QuotedString(str):
-        pass
-
-    def quoted_str_presenter(dumper, data):
-        return dumper.represent_scalar('tag:yaml.org,2002:str', data, style='"')
-
-    yaml.add_representer(QuotedString, quoted_str_presenter, Dumper=yaml.SafeDumper)
-
     # Handle the case when no shows are found
     if not shows:
         # Create the template for empty collections
@@ -1259,8 +2592,7 @@ def create_collection_yaml(output_file, shows, config, config_key, summary):
             }
         }
         
-        with open(output_file, "w", encoding="utf-8") as f:
-            yaml.dump(data, f, Dumper=yaml.SafeDumper, sort_keys=False, allow_unicode=True)
+        save_category_output("collections", output_file, data, lambda: dump_yaml(data))
         return
     
     tvdb_ids = [s['tvdbId'] for s in shows if s.get('tvdbId')]
@@ -1280,8 +2612,7 @@ def create_collection_yaml(output_file, shows, config, config_key, summary):
             }
         }
         
-        with open(output_file, "w", encoding="utf-8") as f:
-            yaml.dump(data, f, Dumper=yaml.SafeDumper, sort_keys=False, allow_unicode=True)
+        save_category_output("collections", output_file, data, lambda: dump_yaml(data))
         return
 
     # Convert to comma-separated
@@ -1328,62 +2659,39 @@ def create_collection_yaml(output_file, shows, config, config_key, summary):
         }
     }
 
-    with open(output_file, "w", encoding="utf-8") as f:
-        # Use SafeDumper so our custom representer is used
-        yaml.dump(data, f, Dumper=yaml.SafeDumper, sort_keys=False, allow_unicode=True)
+    save_category_output("collections", output_file, data, lambda: dump_yaml(data))
 
 def concatenate_collections(is_docker, collection_path="",delete_collections_after_all_in_one=False,generate_all_in_one_collections=False):
     """ 
-    Combina arquivos YML de coleção em um único arquivo chamado TSSK_ALL_COLLECTIONS_TOGETHER.yml.
+    Combina as coleções de todas as categorias em um único arquivo chamado TSSK_ALL_COLLECTIONS_TOGETHER.yml,
+    montado em memória a partir dos documentos gerados (sem reler os arquivos).
     """
     print(f"\n{AZUL}Iniciando a concatenação dos arquivos de coleção...{RESET}")
     output_file_name = "TSSK_ALL_COLLECTIONS_TOGETHER.yml" #Não pode terminar com collection.yml para evitar loop infito das informações.
-    # Encontra todos os arquivos .yml de overlays e os ordena numericamente
-    collection_files = sorted([f for f in os.listdir(collection_path) if f.endswith('_COLLECTION.yml')])
+    collection_files = sorted(_category_documents["collections"])
     
     if not collection_files:
         print(f"{LARANJA}Nenhum arquivo de coleção encontrado para concatenar.{RESET}")
         return
 
-    with open(os.path.join(collection_path, output_file_name), "w", encoding="utf-8") as outfile:
-        # Escreve a linha de cabeçalho 'collections:'
-        outfile.write("collections:\n")
-        
-        for file_name in collection_files:
-            file_path = os.path.join(collection_path, file_name)
-            try:
-                print(f"{VERDE}Processando {file_path} ...{RESET}")
-                with open(file_path, "r", encoding="utf-8") as infile:
-                    # Lê todas as linhas do arquivo de entrada
-                    lines = infile.readlines()
-                 
-                    # Ignora a primeira linha ('overlays:') e processa o restante
-                    for i, line in enumerate(lines):
-                        if i == 0:
-                            continue  # Pula a primeira linha
-                        else:
-                            outfile.write(line) # Copia linhas seguintes para o arquivo. 
-                            
-            except FileNotFoundError:
-                print(f"{VERMELHO}Erro: O arquivo {file_path} não foi encontrado. Pulando este arquivo.{RESET}")
-                continue
-            except Exception as e:
-                print(f"{VERMELHO}Erro ao processar o arquivo {file_path}: {e}{RESET}")
-                continue
-    set_permissions(os.path.join(collection_path, output_file_name))
+    merged_collections = {}
+    for file_name in collection_files:
+        print(f"{VERDE}Processando {file_name} ...{RESET}")
+        for collection_name, collection in _category_documents["collections"][file_name]["collections"].items():
+            if collection_name in merged_collections:
+                # Duas categorias com o mesmo collection_name: a última prevalece, como no Kometa
+                print(f"{LARANJA}A coleção '{collection_name}' aparece em mais de uma categoria; usando a de {file_name}.{RESET}")
+            merged_collections[collection_name] = collection
+
+    output_file = os.path.join(collection_path, output_file_name)
+    write_output_file(output_file, dump_yaml({"collections": merged_collections}))
+    set_permissions(output_file)
            
     print(f"Todos os arquivos foram combinados em {output_file_name} com sucesso!{RESET}\n")
     
-    #Deleta os arquivos originais se true no arquivo de configuração
+    #Deleta os arquivos originais se true no arquivo de configuração (eles não são mais gravados)
     if delete_collections_after_all_in_one and generate_all_in_one_collections:
-        print(f"{AZUL}Deletando os arquivos de overlay originais...{RESET}")
-        for file_name in collection_files:
-            file_path = os.path.join(overlay_path, file_name)
-            try:
-                os.remove(file_path)
-                print(f"{VERDE}Arquivo {file_name} deletado com sucesso.{RESET}")
-            except OSError as e:
-                print(f"{VERMELHO}Erro ao tentar deletar o arquivo {file_name}: {e}{RESET}")
+        _remove_category_files(collection_path, collection_files, "coleção")
 
 def process_plex_overlays(config):
     print(f"\n{AZUL}--- Iniciando geração de Overlays baseadas no Plex ---{RESET}")
@@ -1498,31 +2806,345 @@ def process_plex_overlays(config):
     set_permissions(output_file)
     print(f"\n{VERDE}Nova Overlay para Episódio adicionado nos últimos {recent_days_new_episode_released} days{RESET}")
 
+# Última lista de seriados gravada em cada arquivo de overlay (usada pelas atualizações incrementais)
+_written_category_shows = {}
+
+def write_category_yamls(overlay_file, collection_file, shows, config, config_sections, config_key, summary,
+                         only_changed=False, no_date_needed=False, category_key="TSSK_overlay"):
+    """
+    Grava o overlay e a coleção de uma categoria. Com only_changed=True, os arquivos não são
+    regravados se a lista de seriados é a mesma da última gravação. Retorna True se gravou.
+    """
+    if only_changed and _written_category_shows.get(overlay_file) == shows:
+        return False
+    with measure_phase("yaml_write"):
+        create_overlay_yaml(overlay_file, shows, config_sections, no_date_needed=no_date_needed, category_key=category_key)
+        create_collection_yaml(collection_file, shows, config, config_key=config_key, summary=summary)
+        set_permissions(overlay_file)
+        set_permissions(collection_file)
+    _written_category_shows[overlay_file] = shows
+    return True
+
+def generate_sonarr_outputs(all_series_with_episodes, config, cache, run_now, only_changed=False, classified=None):
+    """
+    Classifica os seriados e grava os overlays e coleções de todas as categorias do Sonarr,
+    aplicando as regras de prioridade e exclusão entre elas. Com only_changed=True (atualizações
+    via webhook), apenas os arquivos das categorias cuja lista mudou são regravados.
+    classified é o resultado já pronto de classify_while_fetching; sem ele, os seriados (com
+    os episódios) são classificados aqui.
+    Retorna True se algum arquivo foi gravado.
+    """
+    tmdb_api_key = config["tmdb_api_key"]
+
+    # Get category-specific future_days values, with fallback to main future_days
+    future_days = config.get('future_days', 14)
+    future_days_new_season = int(config.get('future_days_new_season', future_days))
+    future_days_upcoming_episode = int(config.get('future_days_upcoming_episode', future_days))
+    future_days_upcoming_finale = int(config.get('future_days_upcoming_finale', future_days))
+
+    recent_days_season_finale = config.get('recent_days_season_finale', 14)
+    recent_days_final_episode = config.get('recent_days_final_episode', 14)
+    recent_days_new_season_started = config.get('recent_days_new_season_started', 7)
+
+    utc_offset = float(config.get('utc_offset', 0))
+    skip_unmonitored = str(config.get("skip_unmonitored", "false")).lower() == "true"
+    max_concurrent_requests = int(config.get("max_concurrent_requests", 5))
+    tmdb_cache_ttl_days = float(config.get("tmdb_cache_ttl_days", 7))
+    tmdb_requests_per_second = float(config.get("tmdb_requests_per_second", 40))
+
+    written = False
+    if classified is None:
+        # Classifica todas as categorias em uma única passada pelos episódios de cada seriado
+        with profile_stage("classify"):
+            classified = classify_library(all_series_with_episodes, get_category_days(config),
+                                          utc_offset, skip_unmonitored, run_now)
+
+    # Track all tvdbIds to exclude from other categories
+    all_skipped_shows = []
+    all_excluded_tvdb_ids = set()
+    
+    # ---- Recent Season Finales ----
+    season_finale_shows = classified["season_finale"]
+     
+    # Add to excluded IDs
+    for show in season_finale_shows:
+        if show.get('tvdbId'):
+            all_excluded_tvdb_ids.add(show['tvdbId'])
+    
+    if season_finale_shows:
+        print(f"{VERDE}Seriados com um final de temporada que foi ao ar nos últimos {recent_days_season_finale} dias:{RESET}")
+        for show in season_finale_shows:
+            print(f"- {show['title']} (S{show['seasonNumber']}E{show['episodeNumber']}) foi ao ar em {show['airDate']}")
+    
+    overlay_file = overlay_path + "11_TSSK_TV_FIM_TEMPORADA_OVERLAYS.yml"
+    collection_file = collection_path + "TSSK_TV_FIM_TEMPORADA_COLLECTION.yml"
+    written |= write_category_yamls(overlay_file, collection_file, season_finale_shows, config,
+                                    {"backdrop": config.get("backdrop_season_finale", {}), "text": config.get("text_season_finale", {})},
+                                    "collection_season_finale",
+                                    f"Seriados com um final de temporada que foi ao ar nós últimos {recent_days_season_finale} dias",
+                                    only_changed, no_date_needed=True, category_key="TSSK_final_de_temporada")
+
+    # ---- Recent Final Episodes ----
+    final_episode_shows = classified["final_episode"]
+    
+    # Add to excluded IDs
+    for show in final_episode_shows:
+        if show.get('tvdbId'):
+            all_excluded_tvdb_ids.add(show['tvdbId'])
+    
+    if final_episode_shows:
+        print(f"\n{VERDE}Seriados com um episódio final que foi ao ar nos últimos {recent_days_final_episode} dias:{RESET}")
+        for show in final_episode_shows:
+            print(f"- {show['title']} (S{show['seasonNumber']}E{show['episodeNumber']}) foi ao ar em {show['airDate']}")
+    
+    overlay_file = overlay_path + "12_TSSK_TV_EPISODIO_FINAL_OVERLAYS.yml"
+    collection_file = collection_path + "TSSK_TV_EPISODIO_FINAL_COLLECTION.yml"
+    written |= write_category_yamls(overlay_file, collection_file, final_episode_shows, config,
+                                    {"backdrop": config.get("backdrop_final_episode", {}), "text": config.get("text_final_episode", {})},
+                                    "collection_final_episode",
+                                    f"Seriados com um episódio final que foi ao ar nós últimos {recent_days_final_episode} dias",
+                                    only_changed, no_date_needed=True, category_key="TSSK_episódio_final")
+
+    # Track all tvdbIds to exclude from the "returning" category
+    all_included_tvdb_ids = set()
+
+    # ---- New Season Shows ----
+    matched_shows, skipped_shows = classified["new_season"], classified["new_season_skipped"]
+    all_skipped_shows.extend(skipped_shows)
+    
+    # Filter out shows that are in the season finale or final episode categories
+    matched_shows = [show for show in matched_shows if show.get('tvdbId') not in all_excluded_tvdb_ids]
+    
+    # Add to excluded IDs for returning category
+    for show in matched_shows:
+        if show.get('tvdbId'):
+            all_included_tvdb_ids.add(show['tvdbId'])
+    
+    if matched_shows:
+        print(f"\n{VERDE}Seriados com uma nova temporada começando dentro de  {future_days_new_season} dias:{RESET}")
+        for show in matched_shows:
+            print(f"- {show['title']} (Temporada {show['seasonNumber']}) vai ao ar em {show['airDate']}")
+    else:
+        print(f"\n{VERMELHO}Nenhum show com novas estações começando dentro de {future_days_new_season} dias.{RESET}")
+    
+    # Create YAMLs for new seasons
+    overlay_file = overlay_path + "08_TSSK_TV_NOVA_TEMPORADA_OVERLAYS.yml"
+    collection_file = collection_path + "TSSK_TV_NOVA_TEMPORADA_COLLECTION.yml"
+    written |= write_category_yamls(overlay_file, collection_file, matched_shows, config,
+                                    {"backdrop": config.get("backdrop_new_season", {}), "text": config.get("text_new_season", {})},
+                                    "collection_new_season",
+                                    f"Seriados com uma nova temporada começando dentro de {future_days_new_season} dias",
+                                    only_changed)
+
+    # ---- New Season Started ----
+    new_season_started_shows = classified["new_season_started"]
+    
+    # Add to excluded IDs
+    for show in new_season_started_shows:
+        if show.get('tvdbId'):
+            all_excluded_tvdb_ids.add(show['tvdbId'])
+    
+    if new_season_started_shows:
+        print(f"\n{VERDE}Seriados com uma nova temporada que começou no passado {recent_days_new_season_started} dias:{RESET}")
+        for show in new_season_started_shows:
+            print(f"- {show['title']} (Temporada {show['seasonNumber']}) started on {show['airDate']}")
+    
+    overlay_file = overlay_path + "07_TSSK_TV_NOVA_TEMPORADA_INICIADA_OVERLAYS.yml"
+    collection_file = collection_path + "TSSK_TV_NOVA_TEMPORADA_INICIADA_COLLECTION.yml"
+    written |= write_category_yamls(overlay_file, collection_file, new_season_started_shows, config,
+                                    {"backdrop": config.get("backdrop_new_season_started", {}), "text": config.get("text_new_season_started", {})},
+                                    "collection_new_season_started",
+                                    f"Seriados com uma nova temporada que começou nos últimos {recent_days_new_season_started} dias",
+                                    only_changed, no_date_needed=True, category_key="TSSK_nova_temporada_iniciada")
+
+    # ---- Upcoming Non-Finale Episodes ----
+    upcoming_eps, skipped_eps = classified["upcoming_episode"], classified["upcoming_episode_skipped"]
+    all_skipped_shows.extend(skipped_eps)
+    
+    # Filter out shows that are in the season finale or final episode categories
+    upcoming_eps = [show for show in upcoming_eps if show.get('tvdbId') not in all_excluded_tvdb_ids]
+    
+    # Add to excluded IDs for returning category
+    for show in upcoming_eps:
+        if show.get('tvdbId'):
+            all_included_tvdb_ids.add(show['tvdbId'])
+    
+    if upcoming_eps:
+        print(f"\n{VERDE}Seriados com os próximos episódios não finas em  até {future_days_upcoming_episode} dias:{RESET}")
+        for show in upcoming_eps:
+            print(f"- {show['title']} (S{show['seasonNumber']}E{show['episodeNumber']}) vai ao ar em {show['airDate']}")
+    else:
+        print(f"\n{VERMELHO}Nenhum seriado com episódios regulares futuros nos próximos {future_days_upcoming_episode} dias.{RESET}")
+    
+    overlay_file = overlay_path + "09_TSSK_TV_PROXIMOS_EPISODIOS_OVERLAYS.yml"
+    collection_file = collection_path + "TSSK_TV_PROXIMOS_EPISODIOS_COLLECTION.yml"
+    written |= write_category_yamls(overlay_file, collection_file, upcoming_eps, config,
+                                    {"backdrop": config.get("backdrop_upcoming_episode", {}), "text": config.get("text_upcoming_episode", {})},
+                                    "collection_upcoming_episode",
+                                    f"Seriados com um próximo episódio dentro de {future_days_upcoming_episode} dias",
+                                    only_changed)
+    
+    # ---- Upcoming Finale Episodes ----
+    finale_eps, skipped_finales = classified["upcoming_finale"], classified["upcoming_finale_skipped"]
+    all_skipped_shows.extend(skipped_finales)
+    
+    # Filtrar os programas que estão no final da temporada ou em categorias de episódios finais
+    finale_eps = [show for show in finale_eps if show.get('tvdbId') not in all_excluded_tvdb_ids]
+    
+    # Adicionar aos IDs excluídos para a categoria de retorno
+    for show in finale_eps:
+        if show.get('tvdbId'):
+            all_included_tvdb_ids.add(show['tvdbId'])
+    
+    if finale_eps:
+        print(f"\n{VERDE}Seriados com as próximas finais da temporada dentro de {future_days_upcoming_finale} dias:{RESET}")
+        for show in finale_eps:
+            print(f"- {show['title']} (S{show['seasonNumber']}E{show['episodeNumber']}) vai ao ar em {show['airDate']}")
+    else:
+        print(f"\n{VERMELHO}Nenhum seriado com finais de temporada futuros nos próximos {future_days_upcoming_finale} dias.{RESET}")
+    
+    overlay_file = overlay_path + "10_TSSK_TV_PROXIMOS_FINAIS_OVERLAYS.yml"
+    collection_file = collection_path + "TSSK_TV_PROXIMOS_FINAIS_COLLECTION.yml"
+    written |= write_category_yamls(overlay_file, collection_file, finale_eps, config,
+                                    {"backdrop": config.get("backdrop_upcoming_finale", {}), "text": config.get("text_upcoming_finale", {})},
+                                    "collection_upcoming_finale",
+                                    f"Seriados com um final de temporada dentro de {future_days_upcoming_finale} dias",
+                                    only_changed)
+
+    # ---- skipped Shows ----
+    if all_skipped_shows:
+        print(f"\n{LARANJA}Seriados ignorados (não monitorados, novos shows, etc.):{RESET}")
+        for show in all_skipped_shows:
+            print(f"- {show.get('title', 'Título desconhecido')} (Motivo: {show.get('reason', 'Não especificado')})")
+    
+    # ---- Ended Shows ----
+    # A categoria de finalizados não possui um parâmetro skip_unmonitored
+    # como é baseado no status do show, em vez de monitorar o status
+    with measure_phase("tmdb_checks"):
+        ended_shows, cancelled_shows = check_ended_shows_on_tmdb(
+            classified["ended"], tmdb_api_key, cache, tmdb_cache_ttl_days,
+            max_concurrent_requests, tmdb_requests_per_second
+        )
+    # Filtrar os programas que estão no final da temporada ou em categorias de episódios finais
+    ended_shows = [
+        show
+        for show in ended_shows
+        if show.get("tvdbId") not in all_excluded_tvdb_ids
+    ]
+    cancelled_shows = [
+        show
+        for show in cancelled_shows
+        if show.get("tvdbId") not in all_excluded_tvdb_ids
+    ]
+
+    # Add to excluded IDs for returning category
+    for show in ended_shows:
+        if show.get("tvdbId"):
+            all_included_tvdb_ids.add(show["tvdbId"])
+
+    for show in cancelled_shows:
+        if show.get("tvdbId"):
+            all_included_tvdb_ids.add(show["tvdbId"])
+
+    # ---- Cancelled Shows ----
+    #if cancelled_shows:
+    #            print(f"\n{VERDE}Seriados que foram Cancelados:{RESET}")
+    #            for show in cancelled_shows:
+    #                print(f"- {show['title']}")
+                    
+    overlay_file = overlay_path + "00_TSSK_TV_CANCELADOS_OVERLAYS.yml"
+    collection_file = collection_path + "TSSK_TV_CANCELADOS_COLLECTION.yml"
+    written |= write_category_yamls(overlay_file, collection_file, cancelled_shows, config,
+                                    {"backdrop": config.get("backdrop_cancelled", {}), "text": config.get("text_cancelled", {})},
+                                    "collection_cancelled",
+                                    "Seriados que foram cancelados.",
+                                    only_changed, no_date_needed=True, category_key="TSSK_cancelados")
+
+    # ---- Ended Shows ----
+    #if ended_shows:
+    #            print(f"\n{VERDE}Seriados já Finalizados:{RESET}")
+    #            for show in ended_shows:
+    #                print(f"- {show['title']}")
+    overlay_file = overlay_path + "01_TSSK_TV_FINALIZADOS_OVERLAYS.yml"
+    collection_file = collection_path + "TSSK_TV_FINALIZADOS_COLLECTION.yml"
+    written |= write_category_yamls(overlay_file, collection_file, ended_shows, config,
+                                    {"backdrop": config.get("backdrop_ended", {}), "text": config.get("text_ended", {})},
+                                    "collection_ended",
+                                    "Seriados que já foram Finalizados.",
+                                    only_changed, no_date_needed=True, category_key="TSSK_finalizados")
+    
+    # ---- Returning Shows ----
+    returning_shows = find_returning_shows(all_series_with_episodes, all_included_tvdb_ids)
+    
+    # Filter out shows that are in the season finale or final episode categories
+    returning_shows = [show for show in returning_shows if show.get('tvdbId') not in all_excluded_tvdb_ids]
+    
+    #if returning_shows:
+    #    print(f"\n{VERDE}Seriados que não foram cancelados, mas não tem data de retorno:{RESET}")
+    #    for show in returning_shows:
+    #        print(f"- {show['title']}")
+    overlay_file = overlay_path + "02_TSSK_TV_RETORNANDO_OVERLAYS.yml"
+    collection_file = collection_path + "TSSK_TV_RETORNANDO_COLLECTION.yml"
+    written |= write_category_yamls(overlay_file, collection_file, returning_shows, config,
+                                    {"backdrop": config.get("backdrop_returning", {}), "text": config.get("text_returning", {})},
+                                    "collection_returning",
+                                    "Seriados que tiveram seu retorno confirmado",
+                                    only_changed, no_date_needed=True, category_key="TSSK_retornando")
+
+    return written
+
+def concatenate_all_in_one(config):
+    """Gera os arquivos únicos (all-in-one) de overlays e coleções, se habilitados."""
+    #Concatenar todos os arquivos overlay em um único arquivo, para serem aplicados de uma só vez.
+    generate_all_in_one_overlays = str(config.get("generate_all_in_one_overlays", "false")).lower() == "true"
+    delete_overlay_after_all_in_one = str(config.get("delete_overlay_after_all_in_one", "false")).lower() == "true"
+    if generate_all_in_one_overlays:
+        concatenate_overlays(IS_DOCKER, overlay_path,delete_overlay_after_all_in_one,generate_all_in_one_overlays)
+        
+    #Concatenar todos os arquivos coleção em um único arquivo, para serem aplicados de uma só vez.
+    generate_all_in_one_collections = str(config.get("generate_all_in_one_collections", "false")).lower() == "true"
+    delete_collections_after_all_in_one = str(config.get("delete_collections_after_all_in_one", "false")).lower() == "true"
+    if generate_all_in_one_collections:
+        concatenate_collections(IS_DOCKER, collection_path,delete_collections_after_all_in_one,generate_all_in_one_collections)
+
 #PROCEDIMENTO PRINCIPAL
-def main():
+def main(full_refresh=False, cache=None, check_updates=True, state=None, profile=None):
+    """
+    Executa o processo completo. O modo daemon passa o seu próprio cache (mantido aberto e
+    aquecido entre as execuções) e verifica atualizações apenas uma vez. Se state for
+    informado, recebe a configuração e os seriados da execução (usados pelo webhook).
+    Com profile (--profile ou TSSK_PROFILE=true), cada etapa é perfilada e os relatórios
+    são gravados em config/logs/.
+    """
+    global _stage_profiler
     start_time = datetime.now(user_tz) if IS_DOCKER else datetime.now()
     
     print(f"\n{AZUL}{'*' * 40}\n{'*' * 14} {VERMELHO}TSSK {VERSION}{AZUL} {'*' * 14}\n{'*' * 40}{RESET}")
     print(f"\n{AZUL}Inicio do Processo: {start_time.strftime('%H:%M:%S')}\n")
-    check_for_updates()
+    _run_metrics.reset()
+    if is_profiling_requested(profile):
+        print(f"{LARANJA}Perfil ativado: cada etapa será medida com cProfile e tracemalloc (execução mais lenta).{RESET}")
+        _stage_profiler = StageProfiler()
+    update_check = start_update_check() if check_updates else None
 
     config = load_config('config/config.yml')
+    owns_cache = cache is None
+    success = False
+    reset_output_changes()
+    configure_category_files(config)
     
     try:
+        if owns_cache:
+            cache = TSSKCache()
+        cache.stats.clear()
+        configure_http_pool(config.get("max_concurrent_requests", 5))
+        configure_sonarr_retries(config.get("sonarr_max_retries", 3))
+
         # Process and validate Sonarr URL
-        sonarr_url = process_sonarr_url(config['sonarr_url'], config['sonarr_api_key'])
-        sonarr_api_key = config['sonarr_api_key']
-        tmdb_api_key = config["tmdb_api_key"]
-        
-        # Get category-specific future_days values, with fallback to main future_days
-        future_days = config.get('future_days', 14)
-        future_days_new_season = int(config.get('future_days_new_season', future_days))
-        future_days_upcoming_episode = int(config.get('future_days_upcoming_episode', future_days))
-        future_days_upcoming_finale = int(config.get('future_days_upcoming_finale', future_days))
-
-        recent_days_season_finale = config.get('recent_days_season_finale', 14)
-        recent_days_final_episode = config.get('recent_days_final_episode', 14)
-        recent_days_new_season_started = config.get('recent_days_new_season_started', 7)
+        sonarr_instances = get_sonarr_instances(config)
+        with measure_phase("sonarr_url_discovery"):
+            for instance in sonarr_instances:
+                instance["api_url"] = process_sonarr_url(instance["url"], instance["api_key"], cache)
         recent_days_new_show = config.get('recent_days_new_show', 7)
         recent_days_new_episode_added = config.get('recent_days_new_episode_added', 7)
         recent_days_fresh_espisode_added = config.get('recent_days_fresh_espisode_added', 7)
@@ -1535,294 +3157,65 @@ def main():
         recent_days_new_episode_released = config.get('recent_days_new_episode_released', 7)
 
         utc_offset = float(config.get('utc_offset', 0))
+        # Um único "agora" para toda a execução
+        run_now = get_reference_now()
         skip_unmonitored = str(config.get("skip_unmonitored", "false")).lower() == "true"
+        max_concurrent_requests = int(config.get("max_concurrent_requests", 5))
+        use_sonarr_calendar = str(config.get("use_sonarr_calendar", "false")).lower() == "true"
+        calendar_window = get_calendar_window(config, utc_offset, run_now) if use_sonarr_calendar else None
+        plan_window = None
+        if str(config.get("plan_episode_fetch", "false")).lower() == "true":
+            if skip_unmonitored:
+                plan_window = get_calendar_window(config, utc_offset, run_now)
+            else:
+                print(f"{LARANJA}plan_episode_fetch só é usado com skip_unmonitored: true; buscando os episódios de todos os seriados.{RESET}")
+        use_episode_cache = str(config.get("use_episode_cache", "true")).lower() == "true"
+        failure_budget_percent = float(config.get("sonarr_failure_budget_percent", 5))
 
         # ---- Plex Based Overlays ----
-        process_plex_overlays(config)
+        with measure_phase("plex_overlays"):
+            process_plex_overlays(config)
 
         # ---- Sonarr Based Overlays and Collections ----
-        all_series_with_episodes = get_all_data_from_sonarr(sonarr_url, sonarr_api_key) # This function now prints its own headers
-        print(f"\n{AZUL}--- Iniciando Geração de Overlays e Coleções ---{RESET}")
-
-        # Track all tvdbIds to exclude from other categories
-        all_skipped_shows = []
-        all_excluded_tvdb_ids = set()
-        
-        # ---- Recent Season Finales ----
-        season_finale_shows = find_recent_season_finales(
-            all_series_with_episodes, recent_days_season_finale, utc_offset, skip_unmonitored
-        )
-         
-        # Add to excluded IDs
-        for show in season_finale_shows:
-            if show.get('tvdbId'):
-                all_excluded_tvdb_ids.add(show['tvdbId'])
-        
-        if season_finale_shows:
-            print(f"{VERDE}Seriados com um final de temporada que foi ao ar nos últimos {recent_days_season_finale} dias:{RESET}")
-            for show in season_finale_shows:
-                print(f"- {show['title']} (S{show['seasonNumber']}E{show['episodeNumber']}) foi ao ar em {show['airDate']}")
-        
-        overlay_file = overlay_path + "11_TSSK_TV_FIM_TEMPORADA_OVERLAYS.yml"
-        collection_file = collection_path + "TSSK_TV_FIM_TEMPORADA_COLLECTION.yml"
-        create_overlay_yaml(overlay_file, season_finale_shows,
-                           {"backdrop": config.get("backdrop_season_finale", {}), "text": config.get("text_season_finale", {})},
-                           no_date_needed=True, category_key="TSSK_final_de_temporada")
-        create_collection_yaml(collection_file, season_finale_shows, config,
-                               config_key="collection_season_finale",
-                               summary=f"Seriados com um final de temporada que foi ao ar nós últimos {recent_days_season_finale} dias")
-        set_permissions(overlay_file)
-        set_permissions(collection_file)
-
-        # ---- Recent Final Episodes ----
-        final_episode_shows = find_recent_final_episodes(
-            all_series_with_episodes, recent_days_final_episode, utc_offset, skip_unmonitored
-        )
-        
-        # Add to excluded IDs
-        for show in final_episode_shows:
-            if show.get('tvdbId'):
-                all_excluded_tvdb_ids.add(show['tvdbId'])
-        
-        if final_episode_shows:
-            print(f"\n{VERDE}Seriados com um episódio final que foi ao ar nos últimos {recent_days_final_episode} dias:{RESET}")
-            for show in final_episode_shows:
-                print(f"- {show['title']} (S{show['seasonNumber']}E{show['episodeNumber']}) foi ao ar em {show['airDate']}")
-        
-        overlay_file = overlay_path + "12_TSSK_TV_EPISODIO_FINAL_OVERLAYS.yml"
-        collection_file = collection_path + "TSSK_TV_EPISODIO_FINAL_COLLECTION.yml"
-        create_overlay_yaml(overlay_file, final_episode_shows,
-                           {"backdrop": config.get("backdrop_final_episode", {}), "text": config.get("text_final_episode", {})},
-                           no_date_needed=True, category_key="TSSK_episódio_final")
-        create_collection_yaml(collection_file, final_episode_shows, config,
-                               config_key="collection_final_episode",
-                               summary=f"Seriados com um episódio final que foi ao ar nós últimos {recent_days_final_episode} dias")
-        set_permissions(overlay_file)
-        set_permissions(collection_file)
-
-        # Track all tvdbIds to exclude from the "returning" category
-        all_included_tvdb_ids = set()
-
-        # ---- New Season Shows ----
-        matched_shows, skipped_shows = find_new_season_shows(
-            all_series_with_episodes, future_days_new_season, utc_offset, skip_unmonitored
-        )
-        all_skipped_shows.extend(skipped_shows)
-        
-        # Filter out shows that are in the season finale or final episode categories
-        matched_shows = [show for show in matched_shows if show.get('tvdbId') not in all_excluded_tvdb_ids]
-        
-        # Add to excluded IDs for returning category
-        for show in matched_shows:
-            if show.get('tvdbId'):
-                all_included_tvdb_ids.add(show['tvdbId'])
-        
-        if matched_shows:
-            print(f"\n{VERDE}Seriados com uma nova temporada começando dentro de  {future_days_new_season} dias:{RESET}")
-            for show in matched_shows:
-                print(f"- {show['title']} (Temporada {show['seasonNumber']}) vai ao ar em {show['airDate']}")
-        else:
-            print(f"\n{VERMELHO}Nenhum show com novas estações começando dentro de {future_days_new_season} dias.{RESET}")
-        
-        # Create YAMLs for new seasons
-        overlay_file = overlay_path + "08_TSSK_TV_NOVA_TEMPORADA_OVERLAYS.yml"
-        collection_file = collection_path + "TSSK_TV_NOVA_TEMPORADA_COLLECTION.yml"
-        create_overlay_yaml(overlay_file, matched_shows,
-                           {"backdrop": config.get("backdrop_new_season", {}), "text": config.get("text_new_season", {})})
-        create_collection_yaml(collection_file, matched_shows, config,
-                               config_key="collection_new_season",
-                               summary=f"Seriados com uma nova temporada começando dentro de {future_days_new_season} dias")
-        set_permissions(overlay_file)
-        set_permissions(collection_file)
-
-        # ---- New Season Started ----
-        new_season_started_shows = find_new_season_started(
-            all_series_with_episodes, recent_days_new_season_started, utc_offset, skip_unmonitored
-        )
-        
-        # Add to excluded IDs
-        for show in new_season_started_shows:
-            if show.get('tvdbId'):
-                all_excluded_tvdb_ids.add(show['tvdbId'])
-        
-        if new_season_started_shows:
-            print(f"\n{VERDE}Seriados com uma nova temporada que começou no passado {recent_days_new_season_started} dias:{RESET}")
-            for show in new_season_started_shows:
-                print(f"- {show['title']} (Temporada {show['seasonNumber']}) started on {show['airDate']}")
-        
-        overlay_file = overlay_path + "07_TSSK_TV_NOVA_TEMPORADA_INICIADA_OVERLAYS.yml"
-        collection_file = collection_path + "TSSK_TV_NOVA_TEMPORADA_INICIADA_COLLECTION.yml"
-        create_overlay_yaml(overlay_file, new_season_started_shows,
-                           {"backdrop": config.get("backdrop_new_season_started", {}), "text": config.get("text_new_season_started", {})},
-                           no_date_needed=True, category_key="TSSK_nova_temporada_iniciada")
-        create_collection_yaml(collection_file, new_season_started_shows, config,
-                               config_key="collection_new_season_started",
-                               summary=f"Seriados com uma nova temporada que começou nos últimos {recent_days_new_season_started} dias")
-        set_permissions(overlay_file)
-        set_permissions(collection_file)
-
-        # ---- Upcoming Non-Finale Episodes ----
-        upcoming_eps, skipped_eps = find_upcoming_regular_episodes(
-            all_series_with_episodes, future_days_upcoming_episode, utc_offset, skip_unmonitored
-        )
-        all_skipped_shows.extend(skipped_eps)
-        
-        # Filter out shows that are in the season finale or final episode categories
-        upcoming_eps = [show for show in upcoming_eps if show.get('tvdbId') not in all_excluded_tvdb_ids]
-        
-        # Add to excluded IDs for returning category
-        for show in upcoming_eps:
-            if show.get('tvdbId'):
-                all_included_tvdb_ids.add(show['tvdbId'])
-        
-        if upcoming_eps:
-            print(f"\n{VERDE}Seriados com os próximos episódios não finas em  até {future_days_upcoming_episode} dias:{RESET}")
-            for show in upcoming_eps:
-                print(f"- {show['title']} (S{show['seasonNumber']}E{show['episodeNumber']}) vai ao ar em {show['airDate']}")
-        else:
-            print(f"\n{VERMELHO}Nenhum seriado com episódios regulares futuros nos próximos {future_days_upcoming_episode} dias.{RESET}")
-        
-        overlay_file = overlay_path + "09_TSSK_TV_PROXIMOS_EPISODIOS_OVERLAYS.yml"
-        collection_file = collection_path + "TSSK_TV_PROXIMOS_EPISODIOS_COLLECTION.yml"
-        create_overlay_yaml(overlay_file, upcoming_eps,
-                           {"backdrop": config.get("backdrop_upcoming_episode", {}), "text": config.get("text_upcoming_episode", {})})
-        create_collection_yaml(collection_file, upcoming_eps, config,
-                               config_key="collection_upcoming_episode",
-                               summary=f"Seriados com um próximo episódio dentro de {future_days_upcoming_episode} dias")
-        set_permissions(overlay_file)
-        set_permissions(collection_file)
-        
-        # ---- Upcoming Finale Episodes ----
-        finale_eps, skipped_finales = find_upcoming_finales(
-            all_series_with_episodes, future_days_upcoming_finale, utc_offset, skip_unmonitored
-        )
-        all_skipped_shows.extend(skipped_finales)
-        
-        # Filtrar os programas que estão no final da temporada ou em categorias de episódios finais
-        finale_eps = [show for show in finale_eps if show.get('tvdbId') not in all_excluded_tvdb_ids]
-        
-        # Adicionar aos IDs excluídos para a categoria de retorno
-        for show in finale_eps:
-            if show.get('tvdbId'):
-                all_included_tvdb_ids.add(show['tvdbId'])
-        
-        if finale_eps:
-            print(f"\n{VERDE}Seriados com as próximas finais da temporada dentro de {future_days_upcoming_finale} dias:{RESET}")
-            for show in finale_eps:
-                print(f"- {show['title']} (S{show['seasonNumber']}E{show['episodeNumber']}) vai ao ar em {show['airDate']}")
+        classified = None
+        if len(sonarr_instances) == 1:
+            # Pipeline: cada seriado é classificado assim que os episódios chegam, e os episódios são
+            # liberados em seguida. O receptor de webhooks, quando iniciado, precisa deles para reclassificar.
+            keep_episodes = state is not None and state.get("webhook_active", False)
+            instance = sonarr_instances[0]
+            all_series_with_episodes, classified = classify_while_fetching(
+                iter_sonarr_series(instance["api_url"], instance["api_key"], max_concurrent_requests, calendar_window,
+                                   cache if use_episode_cache else None, full_refresh, plan_window=plan_window,
+                                   checkpoint=cache, failure_budget_percent=failure_budget_percent),
+                get_category_days(config), utc_offset, skip_unmonitored, run_now, keep_episodes
+            )
         else:
-            print(f"\n{VERMELHO}Nenhum seriado com finais de temporada futuros nos próximos {future_days_upcoming_finale} dias.{RESET}")
-        
-        overlay_file = overlay_path + "10_TSSK_TV_PROXIMOS_FINAIS_OVERLAYS.yml"
-        collection_file = collection_path + "TSSK_TV_PROXIMOS_FINAIS_COLLECTION.yml"
-        create_overlay_yaml(overlay_file, finale_eps,
-                           {"backdrop": config.get("backdrop_upcoming_finale", {}), "text": config.get("text_upcoming_finale", {})})
-        create_collection_yaml(collection_file, finale_eps, config,
-                               config_key="collection_upcoming_finale",
-                               summary=f"Seriados com um final de temporada dentro de {future_days_upcoming_finale} dias")
-        set_permissions(overlay_file)
-        set_permissions(collection_file)
+            # Com várias instâncias, os seriados são juntados pelo tvdbId antes de serem classificados
+            all_series_with_episodes = get_all_data_from_sonarr_instances(
+                sonarr_instances, max_concurrent_requests, calendar_window,
+                cache if use_episode_cache else None, full_refresh, plan_window,
+                checkpoint=cache, failure_budget_percent=failure_budget_percent
+            ) # This function now prints its own headers
+            with measure_phase("air_date_normalization"):
+                normalize_air_dates(all_series_with_episodes, utc_offset)
+        if state is not None:
+            # Com várias instâncias, os IDs do webhook não dizem de qual Sonarr vieram: sem sonarr_url,
+            # o webhook dispara uma execução completa (rápida, com o cache de episódios aquecido)
+            instance = sonarr_instances[0]
+            sonarr_url = current_sonarr_url(instance["url"], instance["api_url"]) if len(sonarr_instances) == 1 else None
+            state.update(config=config, sonarr_url=sonarr_url, sonarr_api_key=instance["api_key"],
+                         all_series=all_series_with_episodes)
+        print(f"\n{AZUL}--- Iniciando Geração de Overlays e Coleções ---{RESET}")
 
-        # ---- skipped Shows ----
-        if all_skipped_shows:
-            print(f"\n{LARANJA}Seriados ignorados (não monitorados, novos shows, etc.):{RESET}")
-            for show in all_skipped_shows:
-                print(f"- {show.get('title', 'Título desconhecido')} (Motivo: {show.get('reason', 'Não especificado')})")
-        
-        # ---- Ended Shows ----
-        # A função find_end_shows não possui um parâmetro skip_unmonitored
-        # como é baseado no status do show, em vez de monitorar o status
-        ended_shows, cancelled_shows = find_ended_shows(
-            all_series_with_episodes, tmdb_api_key
-        )
-        # Filtrar os programas que estão no final da temporada ou em categorias de episódios finais
-        ended_shows = [
-            show
-            for show in ended_shows
-            if show.get("tvdbId") not in all_excluded_tvdb_ids
-        ]
-        cancelled_shows = [
-            show
-            for show in cancelled_shows
-            if show.get("tvdbId") not in all_excluded_tvdb_ids
-        ]
+        generate_sonarr_outputs(all_series_with_episodes, config, cache, run_now, classified=classified)
 
-        # Add to excluded IDs for returning category
-        for show in ended_shows:
-            if show.get("tvdbId"):
-                all_included_tvdb_ids.add(show["tvdbId"])
-
-        for show in cancelled_shows:
-            if show.get("tvdbId"):
-                all_included_tvdb_ids.add(show["tvdbId"])
-
-        # ---- Cancelled Shows ----
-        #if cancelled_shows:
-        #            print(f"\n{VERDE}Seriados que foram Cancelados:{RESET}")
-        #            for show in cancelled_shows:
-        #                print(f"- {show['title']}")
-                        
-        overlay_file = overlay_path + "00_TSSK_TV_CANCELADOS_OVERLAYS.yml"
-        collection_file = collection_path + "TSSK_TV_CANCELADOS_COLLECTION.yml"
-        create_overlay_yaml(overlay_file, cancelled_shows,
-                           {"backdrop": config.get("backdrop_cancelled", {}), "text": config.get("text_cancelled", {})},
-                           no_date_needed=True, category_key="TSSK_cancelados")
-        create_collection_yaml(collection_file, cancelled_shows, config,
-                               config_key="collection_cancelled",
-                               summary="Seriados que foram cancelados.")
-        set_permissions(overlay_file)
-        set_permissions(collection_file)
+        with measure_phase("all_in_one_concatenation"):
+            concatenate_all_in_one(config)
 
-        # ---- Ended Shows ----
-        #if ended_shows:
-        #            print(f"\n{VERDE}Seriados já Finalizados:{RESET}")
-        #            for show in ended_shows:
-        #                print(f"- {show['title']}")
-        overlay_file = overlay_path + "01_TSSK_TV_FINALIZADOS_OVERLAYS.yml"
-        collection_file = collection_path + "TSSK_TV_FINALIZADOS_COLLECTION.yml"
-        create_overlay_yaml(overlay_file, ended_shows,
-                           {"backdrop": config.get("backdrop_ended", {}), "text": config.get("text_ended", {})},
-                           no_date_needed=True, category_key="TSSK_finalizados")
-        create_collection_yaml(collection_file, ended_shows, config,
-                               config_key="collection_ended",
-                               summary="Seriados que já foram Finalizados.")
-        set_permissions(overlay_file)
-        set_permissions(collection_file)
-        
-        # ---- Returning Shows ----
-        returning_shows = find_returning_shows(all_series_with_episodes, all_included_tvdb_ids)
-        
-        # Filter out shows that are in the season finale or final episode categories
-        returning_shows = [show for show in returning_shows if show.get('tvdbId') not in all_excluded_tvdb_ids]
-        
-        #if returning_shows:
-        #    print(f"\n{VERDE}Seriados que não foram cancelados, mas não tem data de retorno:{RESET}")
-        #    for show in returning_shows:
-        #        print(f"- {show['title']}")
-        overlay_file = overlay_path + "02_TSSK_TV_RETORNANDO_OVERLAYS.yml"
-        collection_file = collection_path + "TSSK_TV_RETORNANDO_COLLECTION.yml"
-        create_overlay_yaml(overlay_file, returning_shows,
-                           {"backdrop": config.get("backdrop_returning", {}), "text": config.get("text_returning", {})},
-                           no_date_needed=True, category_key="TSSK_retornando")
-        create_collection_yaml(collection_file, returning_shows, config,
-                               config_key="collection_returning",
-                               summary="Seriados que tiveram seu retorno confirmado")
-        set_permissions(overlay_file)
-        set_permissions(collection_file)
-        
-        #Concatenar todos os arquivos overlay em um único arquivo, para serem aplicados de uma só vez.
-        generate_all_in_one_overlays = str(config.get("generate_all_in_one_overlays", "false")).lower() == "true"
-        delete_overlay_after_all_in_one = str(config.get("delete_overlay_after_all_in_one", "false")).lower() == "true"
-        if generate_all_in_one_overlays:
-            concatenate_overlays(IS_DOCKER, overlay_path,delete_overlay_after_all_in_one,generate_all_in_one_overlays)
-            
-        #Concatenar todos os arquivos coleção em um único arquivo, para serem aplicados de uma só vez.
-        generate_all_in_one_collections = str(config.get("generate_all_in_one_collections", "false")).lower() == "true"
-        delete_collections_after_all_in_one = str(config.get("delete_collections_after_all_in_one", "false")).lower() == "true"
-        if generate_all_in_one_collections:
-            concatenate_collections(IS_DOCKER, collection_path,delete_collections_after_all_in_one,generate_all_in_one_collections)
-            
         print(f"\nTodos os arquivos YAML criados com sucesso\n")
+        report_output_changes()
+        success = True
+        print_phase_timings()
 
         # Calcular e mostrar o tempo de execução - Considerando se docker a varialvel configurada.
         if IS_DOCKER:
@@ -1836,6 +3229,9 @@ def main():
         runtime_formatted = f"{int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}"
         
         print(f"{AZUL}{AZUL}{'*' * 110}\n{'*' * 3}{' ' * 5}Inicio do Processo: {start_time.strftime('%H:%M:%S')}{' ' * 4}Fim do Processo: {end_time.strftime('%H:%M:%S')}{' ' * 4}Tempo Total de Execução: {runtime_formatted}{' ' * 5}{'*' * 3}\n{'*' * 110}{RESET}")
+        peak_memory = get_peak_memory_mb()
+        if peak_memory is not None:
+            print(f"{AZUL}Pico de memória do processo: {peak_memory:.1f} MB{RESET}")
         print("")
         
     except ConnectionError as e:
@@ -1844,6 +3240,433 @@ def main():
     except Exception as e:
         print(f"{VERMELHO}Unexpected error: {str(e)}{RESET}")
         sys.exit(1)
+    finally:
+        if update_check:
+            # O resultado da verificação em segundo plano aparece no fim, sem ter atrasado a execução
+            with measure_phase("update_check"):
+                finish_update_check(update_check)
+        write_run_metrics(config, success)
+        if _stage_profiler is not None:
+            profiler, _stage_profiler = _stage_profiler, None
+            profiler.write_reports()
+        if owns_cache and cache:
+            cache.close()
+
+#MODO DAEMON
+# Impede que duas execuções rodem ao mesmo tempo dentro do mesmo processo
+_run_lock = threading.Lock()
+
+# Quanto o encerramento espera uma atualização via webhook em andamento (o docker stop espera 10 s)
+DAEMON_SHUTDOWN_WAIT_SECONDS = 8
+
+class DaemonShutdown(SystemExit):
+    """Levantada pelo SIGTERM (docker stop): encerra o daemon, mesmo no meio de uma execução."""
+
+def request_daemon_shutdown(signum, frame):
+    raise DaemonShutdown(0)
+
+class CronSchedule:
+    """
+    Expressão CRON de 5 campos (minuto hora dia mês dia-da-semana), avaliada na hora local,
+    como no cron do container. Aceita *, listas (1,15), intervalos (1-5), passos (*/10, 8-18/2)
+    e os atalhos @hourly, @daily, @midnight, @weekly, @monthly e @yearly.
+    """
+
+    ALIASES = {
+        "@hourly": "0 * * * *",
+        "@daily": "0 0 * * *",
+        "@midnight": "0 0 * * *",
+        "@weekly": "0 0 * * 0",
+        "@monthly": "0 0 1 * *",
+        "@yearly": "0 0 1 1 *",
+        "@annually": "0 0 1 1 *",
+    }
+    FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression):
+        self.expression = expression.strip()
+        fields = self.ALIASES.get(self.expression.lower(), self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Expressão CRON inválida '{expression}': são esperados 5 campos")
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse_field(field, low, high) for field, (low, high) in zip(fields, self.FIELD_RANGES)
+        )
+        # No cron, 0 e 7 representam domingo
+        self.weekdays = {day % 7 for day in weekdays}
+        # Com dia e dia da semana restritos, o cron executa quando qualquer um deles corresponde
+        self.day_restricted = not fields[2].startswith("*")
+        self.weekday_restricted = not fields[4].startswith("*")
+
+    @staticmethod
+    def _parse_field(field, low, high):
+        values = set()
+        for part in field.split(","):
+            value_range, _, step = part.partition("/")
+            if value_range == "*":
+                start, end = low, high
+            elif "-" in value_range:
+                start, end = (int(value) for value in value_range.split("-", 1))
+            else:
+                start = int(value_range)
+                end = high if step else start
+            step = int(step) if step else 1
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError(f"Valor fora do intervalo {low}-{high} no campo CRON '{field}'")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment):
+        day_match = moment.day in self.days
+        # datetime.weekday() começa na segunda-feira; no cron, 0 é domingo
+        weekday_match = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.day_restricted and self.weekday_restricted:
+            return day_match or weekday_match
+        return day_match and weekday_match
+
+    def next_run(self, after):
+        """Próximo horário (minuto cheio) estritamente posterior a after."""
+        moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 5)
+        while moment < limit:
+            if moment.month not in self.months or not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"A expressão CRON '{self.expression}' nunca é executada")
+
+def parse_run_times(run_times):
+    """
+    Converte HORARIOS_DE_EXECUCAO (ex: 08:00,20:00) em agendamentos diários, com as mesmas
+    regras do docker-entrypoint.sh: aspas nas pontas são removidas e horários inválidos ignorados.
+    """
+    schedules = []
+    for time_str in run_times.strip().strip("'\"").split(","):
+        time_str = time_str.strip()
+        try:
+            hour, minute = (int(value) for value in time_str.split(":"))
+            if not (0 <= hour <= 23 and 0 <= minute <= 59):
+                raise ValueError
+        except ValueError:
+            print(f"{LARANJA}  - Aviso: Formato de hora inválido '{time_str}' em HORARIOS_DE_EXECUCAO. Esperado HH:MM. Ignorando.{RESET}")
+            continue
+        schedules.append(CronSchedule(f"{minute} {hour} * * *"))
+    return schedules
+
+def get_daemon_schedules():
+    """Lê o agendamento das variáveis CRON ou HORARIOS_DE_EXECUCAO (CRON tem prioridade)."""
+    cron_expression = os.getenv("CRON", "").strip().strip("'\"")
+    if cron_expression:
+        print(f"{AZUL}Configurando agendamento a partir de CRON: {cron_expression}{RESET}")
+        return [CronSchedule(cron_expression)]
+    run_times = os.getenv("HORARIOS_DE_EXECUCAO", "").strip()
+    if run_times:
+        print(f"{AZUL}Configurando agendamentos diários a partir de HORARIOS_DE_EXECUCAO: {run_times}{RESET}")
+        return parse_run_times(run_times)
+    return []
+
+# Arquivo de log aberto por rotate_log_file (o único que ela pode fechar na próxima rotação) e a
+# saída do console que ele substituiu, mantida referenciada para que o coletor de lixo não feche
+# o buffer do stdout real junto com o TextIOWrapper
+_log_file_handle = None
+_console_stdout = None
+
+def rotate_log_file(log_file, max_logs=5):
+    """
+    Rotaciona o log como a função rotate_logs do docker-entrypoint.sh e passa a gravar a saída
+    (sys.stdout) nele. sys.stderr não é redirecionado: tracebacks continuam no console.
+    """
+    global _log_file_handle, _console_stdout
+    directory = os.path.dirname(log_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if os.path.exists(log_file):
+        base, extension = os.path.splitext(log_file)
+        for i in range(max_logs - 1, 0, -1):
+            if os.path.exists(f"{base}-{i}{extension}"):
+                os.replace(f"{base}-{i}{extension}", f"{base}-{i + 1}{extension}")
+        os.replace(log_file, f"{base}-1{extension}")
+    previous_handle = _log_file_handle
+    if previous_handle is None:
+        _console_stdout = sys.stdout
+    _log_file_handle = sys.stdout = open(log_file, "a", encoding="utf-8")
+    if previous_handle is not None:
+        previous_handle.close()
+
+def run_scheduled(cache, full_refresh=False, check_updates=False, log_file=None, state=None, profile=None):
+    """
+    Executa main() com o cache aquecido do daemon. Se outra execução (ou atualização via
+    webhook) estiver em andamento, aguarda ela terminar antes de começar.
+    """
+    if not _run_lock.acquire(blocking=False):
+        print(f"{LARANJA}Uma execução ainda está em andamento; aguardando ela terminar.{RESET}")
+        _run_lock.acquire()
+    try:
+        if log_file:
+            rotate_log_file(log_file)
+        main(full_refresh=full_refresh, cache=cache, check_updates=check_updates, state=state, profile=profile)
+    except DaemonShutdown:
+        # docker stop durante a execução: o daemon encerra em vez de esperar o próximo horário
+        raise
+    except SystemExit:
+        # main() encerra com sys.exit em caso de erro; o daemon continua para a próxima execução
+        print(f"{VERMELHO}A execução terminou com erro; aguardando o próximo horário.{RESET}")
+    except Exception as e:
+        print(f"{VERMELHO}Unexpected error: {str(e)}{RESET}")
+    finally:
+        _run_lock.release()
+
+# Eventos do Sonarr (Connect -> Webhook) que alteram as categorias de um seriado
+SONARR_WEBHOOK_EVENTS = {"Download", "SeriesAdd", "SeriesDelete", "EpisodeFileDelete"}
+# Maior corpo aceito pelo receptor de webhooks (os eventos do Sonarr têm poucos KB)
+SONARR_WEBHOOK_MAX_BODY = 256 * 1024
+
+def apply_sonarr_updates(state, cache, series_ids, deleted_series_ids):
+    """
+    Atualização incremental disparada pelo webhook: busca novamente no Sonarr apenas os
+    seriados afetados, substitui-os nos dados da última execução, reclassifica e regrava
+    somente os arquivos das categorias que mudaram. Seriados cuja busca falha mantêm os dados
+    da última execução e são atualizados na próxima execução agendada.
+    """
+    config = state["config"]
+    sonarr_url = state["sonarr_url"]
+    api_key = state["sonarr_api_key"]
+    utc_offset = float(config.get('utc_offset', 0))
+    use_episode_cache = str(config.get("use_episode_cache", "true")).lower() == "true"
+    all_series = [series for series in state["all_series"] if series.id not in deleted_series_ids]
+
+    updated_series = []
+    failed_ids = []
+    for series_id in sorted(series_ids - deleted_series_ids):
+        try:
+            series = get_sonarr_series_by_id(sonarr_url, api_key, series_id)
+            if series is None:
+                # O seriado foi removido do Sonarr depois do evento
+                all_series = [s for s in all_series if s.id != series_id]
+                continue
+            episodes = get_sonarr_episodes(sonarr_url, api_key, series_id)
+        except requests.exceptions.RequestException as e:
+            print(f"{LARANJA}Falha ao buscar o seriado {series_id} no Sonarr: {str(e)}{RESET}")
+            failed_ids.append(series_id)
+            continue
+        if use_episode_cache:
+            cache.put_episodes(sonarr_url, series_id, series_fingerprint(series), episodes)
+        series = Series.from_sonarr(series, episodes)
+        positions = [i for i, s in enumerate(all_series) if s.id == series_id]
+        if positions:
+            all_series[positions[0]] = series
+        else:
+            all_series.append(series)
+        updated_series.append(series)
+    cache.commit()
+
+    normalize_air_dates(updated_series, utc_offset)
+    state["all_series"] = all_series
+    reset_output_changes()
+    configure_category_files(config)
+    print(f"\n{AZUL}--- Atualização via webhook: {len(updated_series)} seriados atualizados, {len(deleted_series_ids)} removidos ---{RESET}")
+    if failed_ids:
+        print(f"{LARANJA}{len(failed_ids)} seriados não puderam ser buscados e serão atualizados na próxima execução: "
+              f"{', '.join(str(series_id) for series_id in failed_ids)}{RESET}")
+    if generate_sonarr_outputs(all_series, config, cache, get_reference_now(), only_changed=True):
+        concatenate_all_in_one(config)
+    report_output_changes()
+
+class SonarrWebhookReceiver:
+    """
+    Recebe os eventos de webhook do Sonarr e agrupa rajadas de eventos (debounce): a atualização
+    só é aplicada depois de debounce_seconds sem novos eventos (ou, em rajadas contínuas, no
+    máximo 4x esse tempo após o primeiro evento). Só aceita requisições com o usuário e a
+    senha (autenticação básica) configurados no Webhook do Sonarr.
+    """
+
+    def __init__(self, port, debounce_seconds, cache, state, username, password, bind_address=""):
+        self.port = port
+        self.bind_address = bind_address
+        self._credentials = base64.b64encode(f"{username}:{password}".encode("utf-8")).decode("ascii")
+        self.debounce_seconds = debounce_seconds
+        self.cache = cache
+        self.state = state
+        self._lock = threading.Lock()
+        self._series_ids = set()
+        self._deleted_series_ids = set()
+        self._timer = None
+        self._first_event_at = None
+        self._server = None
+
+    def start(self):
+        receiver = self
+
+        # Importado só aqui: apenas o modo daemon com webhook precisa do servidor HTTP
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def reply(self, status, headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                auth = self.headers.get("Authorization", "")
+                if not hmac.compare_digest(auth.encode("utf-8"), f"Basic {receiver._credentials}".encode("utf-8")):
+                    self.close_connection = True
+                    self.reply(401, {"WWW-Authenticate": 'Basic realm="TSSK"'})
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                except ValueError:
+                    length = -1
+                if length < 0 or length > SONARR_WEBHOOK_MAX_BODY:
+                    # O corpo não é lido: a conexão é fechada depois da resposta
+                    self.close_connection = True
+                    self.reply(413 if length > 0 else 400)
+                    return
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    payload = None
+                if not isinstance(payload, dict) or not isinstance(payload.get("series", {}), dict):
+                    self.reply(400)
+                    return
+                receiver.handle_event(payload)
+                self.reply(200)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.bind_address, self.port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        # Avisa main() para manter os episódios em memória entre as execuções
+        self.state["webhook_active"] = True
+        print(f"{AZUL}Recebendo webhooks do Sonarr em {self.bind_address or '*'}:{self.port}.{RESET}")
+
+    def handle_event(self, payload):
+        """Registra o seriado afetado pelo evento e (re)agenda a atualização."""
+        event_type = payload.get("eventType")
+        series_id = (payload.get("series") or {}).get("id")
+        if event_type not in SONARR_WEBHOOK_EVENTS or series_id is None:
+            if event_type == "Test":
+                print(f"{VERDE}Webhook de teste do Sonarr recebido.{RESET}")
+            return False
+        print(f"{AZUL}Webhook do Sonarr: {event_type} - {(payload.get('series') or {}).get('title', series_id)}{RESET}")
+        with self._lock:
+            if event_type == "SeriesDelete":
+                self._deleted_series_ids.add(series_id)
+                self._series_ids.discard(series_id)
+            else:
+                self._series_ids.add(series_id)
+                self._deleted_series_ids.discard(series_id)
+            now = time.monotonic()
+            if self._first_event_at is None:
+                self._first_event_at = now
+            delay = min(self.debounce_seconds, max(0, self._first_event_at + 4 * self.debounce_seconds - now))
+            if self._timer:
+                self._timer.cancel()
+            self._timer = threading.Timer(delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+        return True
+
+    def flush(self):
+        """Aplica os eventos acumulados, aguardando a execução em andamento terminar."""
+        with self._lock:
+            series_ids, self._series_ids = self._series_ids, set()
+            deleted_series_ids, self._deleted_series_ids = self._deleted_series_ids, set()
+            self._timer = self._first_event_at = None
+        if not series_ids and not deleted_series_ids:
+            return
+        if not self.state.get("all_series") or not self.state.get("sonarr_url"):
+            # Sem dados da última execução (ou com várias instâncias do Sonarr), faz uma execução completa
+            run_scheduled(self.cache, state=self.state)
+            return
+        with _run_lock:
+            try:
+                apply_sonarr_updates(self.state, self.cache, series_ids, deleted_series_ids)
+            except SystemExit:
+                print(f"{VERMELHO}A atualização via webhook terminou com erro; os seriados serão atualizados na próxima execução.{RESET}")
+            except Exception as e:
+                print(f"{VERMELHO}Unexpected error: {str(e)}{RESET}")
+
+def run_daemon(full_refresh=False, log_file=None, profile=None):
+    """
+    Modo daemon: permanece em execução e roda nos horários de CRON ou HORARIOS_DE_EXECUCAO,
+    mantendo entre as execuções as conexões HTTP, a URL do Sonarr já validada e os episódios
+    em memória. Uma execução nunca começa enquanto a anterior não terminar; horários perdidos
+    durante uma execução longa são ignorados. EXECUTAR_AO_INICIAR=true executa logo ao iniciar.
+    Com sonarr_webhook_port configurado, também recebe os webhooks do Sonarr entre as execuções.
+    """
+    if log_file:
+        rotate_log_file(log_file)
+    schedules = get_daemon_schedules()
+    if not schedules:
+        print(f"{VERMELHO}Nenhuma variável de ambiente HORARIOS_DE_EXECUCAO ou CRON foi definida. O modo daemon não tem o que agendar.{RESET}")
+        sys.exit(1)
+
+    # SIGTERM (docker stop) encerra pelo caminho normal, fechando o cache
+    signal.signal(signal.SIGTERM, request_daemon_shutdown)
+    cache = TSSKCache(keep_in_memory=True)
+    state = {}
+    check_updates = True
+    try:
+        config = load_config('config/config.yml')
+        webhook_port = int(config.get("sonarr_webhook_port", 0) or 0)
+        if webhook_port:
+            webhook_username = str(config.get("sonarr_webhook_username", "") or "")
+            webhook_password = str(config.get("sonarr_webhook_password", "") or "")
+            if webhook_username and webhook_password:
+                # No Docker o endereço padrão é o da rede do contêiner; fora dele, apenas localhost
+                bind_address = config.get("sonarr_webhook_bind_address") or ("0.0.0.0" if IS_DOCKER else "127.0.0.1")
+                SonarrWebhookReceiver(
+                    webhook_port, float(config.get("sonarr_webhook_debounce_seconds", 30)), cache, state,
+                    webhook_username, webhook_password, bind_address,
+                ).start()
+            else:
+                print(f"{VERMELHO}sonarr_webhook_port está configurado, mas sonarr_webhook_username e sonarr_webhook_password não: o receptor de webhooks não foi iniciado.{RESET}")
+
+        if os.getenv("EXECUTAR_AO_INICIAR", "false").lower() == "true":
+            print(f"{AZUL}Executando o script imediatamente na inicialização (EXECUTAR_AO_INICIAR=true)...{RESET}")
+            run_scheduled(cache, full_refresh, check_updates, state=state, profile=profile)
+            full_refresh = check_updates = False
+
+        while True:
+            now = datetime.now()
+            next_run = min(schedule.next_run(now) for schedule in schedules)
+            print(f"{AZUL}Próxima execução agendada para {next_run.strftime('%d/%m/%Y %H:%M')}.{RESET}")
+            # Dorme em intervalos curtos para acompanhar ajustes no relógio do sistema
+            while datetime.now() < next_run:
+                time.sleep(min(60, max(1, (next_run - datetime.now()).total_seconds())))
+            run_scheduled(cache, full_refresh, check_updates, log_file, state, profile)
+            full_refresh = check_updates = False
+    except DaemonShutdown:
+        print(f"{AZUL}SIGTERM recebido; encerrando o modo daemon.{RESET}")
+        raise
+    finally:
+        # Uma atualização via webhook em andamento termina antes de o cache ser fechado
+        if _run_lock.acquire(timeout=DAEMON_SHUTDOWN_WAIT_SECONDS):
+            _run_lock.release()
+        cache.close()
 
 if __name__ == "__main__":
-    main()
+    import argparse
+
+    parser = argparse.ArgumentParser(description=f"TSSK {VERSION} - Status dos Seriados para Kometa")
+    parser.add_argument("--full-refresh", action="store_true",
+                        help="Ignora o cache de episódios e busca todos os episódios novamente no Sonarr")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Permanece em execução e roda nos horários de CRON ou HORARIOS_DE_EXECUCAO")
+    parser.add_argument("--log-file",
+                        help="No modo daemon, grava a saída neste arquivo, rotacionando-o a cada execução")
+    parser.add_argument("--profile", action="store_true", default=None,
+                        help="Perfila cada etapa com cProfile e tracemalloc e grava os relatórios em config/logs/ "
+                             "(o mesmo que TSSK_PROFILE=true)")
+    # parse_known_args mantém compatíveis atalhos antigos que passam argumentos extras (ex: -r)
+    args, _ = parser.parse_known_args()
+    if args.daemon:
+        run_daemon(full_refresh=args.full_refresh, log_file=args.log_file, profile=args.profile)
+    else:
+        main(full_refresh=args.full_refresh, profile=args.profile)
@@ -0,0 +1,152 @@
+"""
+Benchmark de ponta a ponta: sobe o servidor falso do Sonarr/TMDB (fake_server.py) e executa o
+TSSK completo (main()) contra ele, medindo o tempo total, as requisições por endpoint, os 429
+e erros recebidos e o máximo de requisições simultâneas, sem depender da rede.
+
+Cada limite de concorrência (--concurrency) usa um diretório de trabalho novo: a primeira
+execução começa com o cache vazio e as seguintes (--runs) reaproveitam o cache.
+
+Exemplos:
+    python benchmarks/e2e_benchmark.py --series 2000 --latency-ms 20 --jitter-ms 10
+    python benchmarks/e2e_benchmark.py --concurrency 1,5,10 --tmdb-rate-limit 40 --output e2e.json
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import yaml
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+from fake_server import build_parser as build_server_parser  # noqa: E402
+
+# Executa main() sem a verificação de atualizações no GitHub, que dependeria da rede
+RUN_TSSK = "import sys; sys.path.insert(0, sys.argv[1]); import TSSK; TSSK.main(check_updates=False)"
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def server_request(port, path, method="GET"):
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", method=method, data=b"" if method == "POST" else None)
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+def start_server(port, server_args):
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "fake_server.py"), "--port", str(port)] + server_args,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    print(process.stdout.readline().strip())
+    for _ in range(100):
+        try:
+            server_request(port, "/_stats")
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("O servidor falso não respondeu")
+
+def write_config(work_dir, port, args, concurrency):
+    with open(os.path.join(ROOT, "files", "config.example.yml"), encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    config.update({
+        "sonarr_url": f"http://127.0.0.1:{port}",
+        "sonarr_api_key": "benchmark",
+        "tmdb_api_key": "benchmark",
+        "max_concurrent_requests": concurrency,
+        "tmdb_requests_per_second": args.tmdb_rps,
+        "use_sonarr_calendar": args.use_calendar,
+        "use_episode_cache": True,
+    })
+    os.makedirs(os.path.join(work_dir, "config"), exist_ok=True)
+    os.makedirs(os.path.join(work_dir, "kometa"), exist_ok=True)
+    with open(os.path.join(work_dir, "config", "config.yml"), "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, sort_keys=False, allow_unicode=True)
+
+def run_tssk(work_dir, port, now, log_file):
+    env = dict(os.environ, TSSK_NOW=now, TSSK_TMDB_API_URL=f"http://127.0.0.1:{port}/3")
+    start = time.perf_counter()
+    with open(log_file, "w", encoding="utf-8") as log:
+        result = subprocess.run([sys.executable, "-c", RUN_TSSK, ROOT], cwd=work_dir, env=env,
+                                stdout=log, stderr=subprocess.STDOUT)
+    return time.perf_counter() - start, result.returncode
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Executa o TSSK contra o servidor falso do Sonarr/TMDB.",
+        parents=[build_server_parser()], conflict_handler="resolve",
+    )
+    parser.add_argument("--port", type=int, default=0, help="Porta do servidor falso (padrão: uma porta livre)")
+    parser.add_argument("--concurrency", default="5", help="Valores de max_concurrent_requests, separados por vírgula (padrão: 5)")
+    parser.add_argument("--runs", type=int, default=2, help="Execuções por valor de concorrência; a primeira sem cache (padrão: 2)")
+    parser.add_argument("--tmdb-rps", type=float, default=40, help="tmdb_requests_per_second do TSSK (padrão: 40)")
+    parser.add_argument("--use-calendar", action="store_true", help="Ativa use_sonarr_calendar no TSSK")
+    parser.add_argument("--output", default="e2e_report.json", help="Arquivo do relatório JSON (padrão: e2e_report.json)")
+    parser.add_argument("--keep-work-dir", action="store_true", help="Mantém os diretórios de trabalho (logs e YAMLs gerados)")
+    args = parser.parse_args()
+
+    port = args.port or free_port()
+    server_args = ["--series", str(args.series), "--seed", str(args.seed), "--now", args.now,
+                   "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+                   "--error-rate", str(args.error_rate), "--error-scope", args.error_scope,
+                   "--sonarr-rate-limit", str(args.sonarr_rate_limit), "--tmdb-rate-limit", str(args.tmdb_rate_limit)]
+    if args.library:
+        server_args += ["--library", args.library]
+    if not args.padding:
+        server_args.append("--no-padding")
+
+    report = {"parameters": {key: value for key, value in vars(args).items() if key != "output"}, "runs": []}
+    work_root = tempfile.mkdtemp(prefix="tssk-e2e-")
+    server = start_server(port, server_args)
+    try:
+        for concurrency in (int(value) for value in args.concurrency.split(",")):
+            work_dir = os.path.join(work_root, f"concurrency-{concurrency}")
+            write_config(work_dir, port, args, concurrency)
+            for run in range(1, args.runs + 1):
+                server_request(port, "/_stats/reset", "POST")
+                log_file = os.path.join(work_dir, f"run-{run}.log")
+                seconds, exit_code = run_tssk(work_dir, port, args.now, log_file)
+                stats = server_request(port, "/_stats")
+                result = {
+                    "concurrency": concurrency,
+                    "run": run,
+                    "cache": "cold" if run == 1 else "warm",
+                    "seconds": seconds,
+                    "exit_code": exit_code,
+                    "requests": stats["requests"],
+                    "total_requests": stats["total_requests"],
+                    "statuses": stats["statuses"],
+                    "bytes_received": stats["bytes_sent"],
+                    "max_in_flight": stats["max_in_flight"],
+                }
+                report["runs"].append(result)
+                print(f"concorrência {concurrency:>3}  execução {run} ({result['cache']:<4})  {seconds:7.2f} s  "
+                      f"{stats['total_requests']:6d} requisições  máx. simultâneas {stats['max_in_flight']:3d}  "
+                      f"429: {stats['statuses'].get('429', 0):4d}  5xx: {stats['statuses'].get('500', 0):4d}  "
+                      f"saída {exit_code}")
+                if exit_code:
+                    print(f"  O TSSK terminou com erro; veja {log_file}")
+    finally:
+        server.terminate()
+        server.wait()
+        if args.keep_work_dir:
+            print(f"Diretórios de trabalho mantidos em {work_root}")
+        else:
+            shutil.rmtree(work_root, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Relatório gravado em {args.output}")
+
+if __name__ == "__main__":
+    main()
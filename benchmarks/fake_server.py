@@ -0,0 +1,319 @@
+"""
+Servidor local que imita os endpoints do Sonarr e do TMDB usados pelo TSSK, para testes de
+carga de ponta a ponta sem rede:
+
+    Sonarr: /api/v3/health, /api/v3/series, /api/v3/series/{id}, /api/v3/episode?seriesId=,
+            /api/v3/calendar?start=&end=
+    TMDB:   /3/find/{tvdb_id}?external_source=tvdb_id, /3/tv/{tmdb_id}
+
+A biblioteca vem do gerador sintético (synthetic_library.py) ou de um arquivo gravado: uma lista
+de seriados com a chave "episodes" ou {"series": [...], "episodes": {"<seriesId>": [...]}}.
+Latência, variação (jitter), taxa de erros e limite de requisições (429 com Retry-After) são
+configuráveis. GET /_stats devolve as contagens por endpoint e POST /_stats/reset as zera.
+
+Exemplo:
+    python benchmarks/fake_server.py --series 2000 --port 8989 --latency-ms 20 --jitter-ms 10 --tmdb-rate-limit 40
+    TSSK_TMDB_API_URL=http://127.0.0.1:8989/3 python TSSK.py   # com sonarr_url: http://127.0.0.1:8989
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_library import DEFAULT_NOW, iter_library, parse_now  # noqa: E402
+
+OVERVIEW = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore. " * 3
+TMDB_ID_OFFSET = 500000
+
+def load_library(path):
+    """Lê uma biblioteca gravada e devolve a lista de seriados com a chave "episodes"."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        return data
+    episodes = {int(series_id): value for series_id, value in data.get("episodes", {}).items()}
+    return [dict(series, episodes=episodes.get(series["id"], [])) for series in data["series"]]
+
+def encode(payload):
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+class FakeLibrary:
+    """Respostas pré-serializadas, para que o servidor não seja o gargalo das medições."""
+
+    def __init__(self, series_with_episodes, now, padding=True):
+        self.series = {}
+        self.episodes = {}
+        self.tvdb_status = {}
+        calendar = []
+        for data in series_with_episodes:
+            series = {key: value for key, value in data.items() if key != "episodes"}
+            episodes = [dict(ep) for ep in data.get("episodes", [])]
+            if padding:
+                # Campos que o Sonarr real devolve e que o TSSK descarta
+                series.setdefault("overview", OVERVIEW)
+                series.setdefault("images", [{"coverType": "poster", "url": f"/MediaCover/{series['id']}/poster.jpg",
+                                              "remoteUrl": "https://artworks.thetvdb.com/banners/posters/poster.jpg"}])
+                for ep in episodes:
+                    ep.setdefault("overview", OVERVIEW)
+                    ep.setdefault("runtime", 45)
+            self._add_statistics(series, episodes, now)
+            self.series[series["id"]] = encode(series)
+            self.episodes[series["id"]] = encode(episodes)
+            if series.get("tvdbId"):
+                self.tvdb_status[series["tvdbId"]] = series.get("status")
+            calendar.extend(ep for ep in episodes if ep.get("airDateUtc"))
+        self.series_list = b"[" + b",".join(self.series.values()) + b"]"
+        calendar.sort(key=lambda ep: ep["airDateUtc"])
+        self.calendar = [(ep["airDateUtc"], ep) for ep in calendar]
+
+    @staticmethod
+    def _add_statistics(series, episodes, now):
+        """
+        Estatísticas de /series, das quais o TSSK calcula a impressão digital de cada seriado.
+        Seguem as regras do Sonarr: episodeCount conta os episódios monitorados já exibidos e os
+        baixados, e previousAiring/nextAiring consideram apenas episódios monitorados.
+        """
+        now_str = now.strftime("%Y-%m-%dT%H:%M:%SZ")
+        seasons = defaultdict(lambda: {"episodeCount": 0, "episodeFileCount": 0, "totalEpisodeCount": 0})
+        previous_airing = next_airing = None
+        for ep in episodes:
+            stats = seasons[ep.get("seasonNumber", 0)]
+            stats["totalEpisodeCount"] += 1
+            stats["episodeFileCount"] += bool(ep.get("hasFile"))
+            air_date = ep.get("airDateUtc")
+            aired = bool(air_date) and air_date <= now_str
+            monitored = ep.get("monitored", True)
+            if (aired and monitored) or ep.get("hasFile"):
+                stats["episodeCount"] += 1
+            if aired and monitored:
+                previous_airing = max(previous_airing or air_date, air_date)
+            elif air_date and monitored:
+                next_airing = min(next_airing or air_date, air_date)
+        for season in series.get("seasons", []):
+            season["statistics"] = dict(seasons[season.get("seasonNumber")])
+        series["statistics"] = {key: sum(stats[key] for stats in seasons.values())
+                                for key in ("episodeCount", "episodeFileCount", "totalEpisodeCount")}
+        if previous_airing:
+            series["previousAiring"] = previous_airing
+        if next_airing:
+            series["nextAiring"] = next_airing
+
+    def calendar_payload(self, start, end):
+        return encode([ep for air_date, ep in self.calendar if start <= air_date < end])
+
+    def tmdb_find(self, tvdb_id):
+        # Alguns seriados não existem no TMDB, como acontece na prática
+        if tvdb_id not in self.tvdb_status or tvdb_id % 50 == 0:
+            return encode({"tv_results": []})
+        return encode({"tv_results": [{"id": tvdb_id + TMDB_ID_OFFSET}]})
+
+    def tmdb_details(self, tmdb_id):
+        sonarr_status = self.tvdb_status.get(tmdb_id - TMDB_ID_OFFSET)
+        if sonarr_status is None:
+            return None
+        if sonarr_status == "ended":
+            status = "Canceled" if tmdb_id % 3 == 0 else "Ended"
+        else:
+            status = "Returning Series"
+        return encode({"id": tmdb_id, "status": status})
+
+class RateLimit:
+    """Janela de um segundo: acima de rate requisições, responde 429."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._window = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        if not self.rate:
+            return True
+        with self._lock:
+            window = int(time.monotonic())
+            if window != self._window:
+                self._window, self._count = window, 0
+            self._count += 1
+            return self._count <= self.rate
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)
+            self.statuses = defaultdict(int)
+            self.bytes_sent = 0
+            self.in_flight = 0
+            self.max_in_flight = 0
+            self.started = time.time()
+
+    def begin(self, endpoint):
+        with self._lock:
+            self.requests[endpoint] += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def end(self, status, size):
+        with self._lock:
+            self.in_flight -= 1
+            self.statuses[str(status)] += 1
+            self.bytes_sent += size
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": dict(self.requests),
+                "total_requests": sum(self.requests.values()),
+                "statuses": dict(self.statuses),
+                "bytes_sent": self.bytes_sent,
+                "max_in_flight": self.max_in_flight,
+                "seconds": time.time() - self.started,
+            }
+
+ROUTES = (
+    (re.compile(r"^/(?:sonarr/)?api/v3/health$"), "sonarr:/health"),
+    (re.compile(r"^/(?:sonarr/)?api/v3/series$"), "sonarr:/series"),
+    (re.compile(r"^/(?:sonarr/)?api/v3/series/(\d+)$"), "sonarr:/series/{id}"),
+    (re.compile(r"^/(?:sonarr/)?api/v3/episode$"), "sonarr:/episode"),
+    (re.compile(r"^/(?:sonarr/)?api/v3/calendar$"), "sonarr:/calendar"),
+    (re.compile(r"^/3/find/(\d+)$"), "tmdb:/find"),
+    (re.compile(r"^/3/tv/(\d+)$"), "tmdb:/tv"),
+)
+
+def make_handler(library, options, stats):
+    rnd = random.Random(options.seed)
+    rnd_lock = threading.Lock()
+    limits = {"sonarr": RateLimit(options.sonarr_rate_limit), "tmdb": RateLimit(options.tmdb_rate_limit)}
+    error_scopes = {"sonarr", "tmdb"} if options.error_scope == "all" else {options.error_scope}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Cabeçalhos e corpo saem em envios separados; sem isso o Nagle atrasa cada resposta em ~40 ms
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body=b"", headers=None):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+            return len(body)
+
+        def do_POST(self):
+            if urlsplit(self.path).path == "/_stats/reset":
+                stats.reset()
+                self._send(200, b"{}")
+            else:
+                self._send(404)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == "/_stats":
+                self._send(200, encode(stats.snapshot()))
+                return
+            for pattern, endpoint in ROUTES:
+                match = pattern.match(url.path)
+                if match:
+                    break
+            else:
+                self._send(404)
+                return
+
+            stats.begin(endpoint)
+            status, size = 500, 0
+            try:
+                status, body, headers = self._route(endpoint, match, parse_qs(url.query))
+                size = self._send(status, body, headers)
+            finally:
+                stats.end(status, size)
+
+        def _route(self, endpoint, match, query):
+            service = endpoint.split(":", 1)[0]
+            with rnd_lock:
+                delay = max(0.0, options.latency_ms + rnd.uniform(-options.jitter_ms, options.jitter_ms)) / 1000
+                fail = rnd.random() < options.error_rate and service in error_scopes
+            time.sleep(delay)
+            if not limits[service].allow():
+                return 429, encode({"status_code": 25, "status_message": "Too many requests"}), {"Retry-After": "1"}
+            if fail:
+                return 500, encode({"message": "Erro simulado"}), None
+
+            if endpoint == "sonarr:/health":
+                return 200, b"[]", None
+            if endpoint == "sonarr:/series":
+                return 200, library.series_list, None
+            if endpoint == "sonarr:/series/{id}":
+                body = library.series.get(int(match.group(1)))
+                return (200, body, None) if body else (404, b"{}", None)
+            if endpoint == "sonarr:/episode":
+                body = library.episodes.get(int(query.get("seriesId", ["0"])[0]))
+                return (200, body, None) if body else (404, b"[]", None)
+            if endpoint == "sonarr:/calendar":
+                return 200, library.calendar_payload(query.get("start", [""])[0], query.get("end", ["~"])[0]), None
+            if endpoint == "tmdb:/find":
+                return 200, library.tmdb_find(int(match.group(1))), None
+            body = library.tmdb_details(int(match.group(1)))
+            return (200, body, None) if body else (404, encode({"status_code": 34}), None)
+
+    return Handler
+
+class FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Fila maior que o padrão (5) para testes com muitas conexões simultâneas
+    request_queue_size = 128
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Servidor falso do Sonarr e do TMDB para testes de carga do TSSK.")
+    parser.add_argument("--port", type=int, default=8989, help="Porta (padrão: 8989)")
+    parser.add_argument("--host", default="127.0.0.1", help="Endereço (padrão: 127.0.0.1)")
+    parser.add_argument("--library", help="Biblioteca gravada (JSON); sem ela uma biblioteca sintética é gerada")
+    parser.add_argument("--series", type=int, default=1000, help="Seriados da biblioteca sintética (padrão: 1000)")
+    parser.add_argument("--seed", type=int, default=1, help="Semente da biblioteca e das falhas simuladas (padrão: 1)")
+    parser.add_argument("--now", default=DEFAULT_NOW, help=f"Data de referência da biblioteca (padrão: {DEFAULT_NOW})")
+    parser.add_argument("--no-padding", dest="padding", action="store_false",
+                        help="Não adiciona sinopses e imagens às respostas")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Latência de cada resposta em ms (padrão: 0)")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Variação aleatória da latência em ms (padrão: 0)")
+    parser.add_argument("--error-rate", type=float, default=0, help="Fração das requisições respondidas com 500 (padrão: 0)")
+    parser.add_argument("--error-scope", choices=("all", "sonarr", "tmdb"), default="all",
+                        help="Serviço afetado por --error-rate (padrão: all)")
+    parser.add_argument("--sonarr-rate-limit", type=int, default=0, help="Requisições por segundo ao Sonarr antes de 429 (padrão: sem limite)")
+    parser.add_argument("--tmdb-rate-limit", type=int, default=0, help="Requisições por segundo ao TMDB antes de 429 (padrão: sem limite)")
+    return parser
+
+def serve(options):
+    now = parse_now(options.now)
+    if options.library:
+        series_with_episodes = load_library(options.library)
+    else:
+        series_with_episodes = iter_library(options.series, seed=options.seed, now=now)
+    library = FakeLibrary(series_with_episodes, now, options.padding)
+    stats = Stats()
+    server = FakeServer((options.host, options.port), make_handler(library, options, stats))
+    print(f"Servidor falso com {len(library.series)} seriados em http://{options.host}:{server.server_port} "
+          f"(TMDB em http://{options.host}:{server.server_port}/3)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    serve(build_parser().parse_args())
@@ -0,0 +1,208 @@
+"""
+Benchmarks do TSSK sem um Sonarr: gera bibliotecas sintéticas (synthetic_library.py) e mede
+as funções find_*, format_date, create_overlay_yaml, create_collection_yaml e a concatenação
+dos arquivos únicos, gravando um relatório JSON para comparar versões.
+
+Exemplos:
+    python benchmarks/run_benchmarks.py                                  # 100, 1k, 10k e 50k seriados
+    python benchmarks/run_benchmarks.py --sizes 100,1000 --output antes.json
+    python benchmarks/run_benchmarks.py --sizes 100,1000 --output depois.json --compare antes.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import yaml
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import TSSK  # noqa: E402
+from synthetic_library import DEFAULT_NOW, iter_library  # noqa: E402
+
+DEFAULT_SIZES = "100,1000,10000,50000"
+DATE_FORMATS = ("ddd dd/mm", "yyyy-mm-dd", "dd/mm", "mmm d, yyyy")
+
+# (categoria, sufixo das chaves do config, no_date_needed)
+CATEGORIES = (
+    ("new_season", "new_season", False),
+    ("upcoming_episode", "upcoming_episode", False),
+    ("upcoming_finale", "upcoming_finale", False),
+    ("season_finale", "season_finale", True),
+    ("final_episode", "final_episode", True),
+    ("new_season_started", "new_season_started", True),
+    ("ended", "ended", True),
+    ("returning", "returning", True),
+)
+
+def timed(function, repeat):
+    """Executa function repeat vezes sem a saída no terminal; devolve (tempos, último resultado)."""
+    runs = []
+    result = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = function()
+            runs.append(time.perf_counter() - start)
+    return runs, result
+
+def benchmark_size(series_count, args, config, work_dir):
+    print(f"\n== {series_count} seriados ==")
+    timings = {}
+
+    def record(name, runs, operations=None):
+        timings[name] = {"seconds": min(runs), "runs": runs}
+        if operations is not None:
+            timings[name]["operations"] = operations
+        print(f"  {name:<32} {min(runs) * 1000:10.1f} ms")
+
+    start = time.perf_counter()
+    library = [TSSK.Series.from_sonarr(series) for series in iter_library(
+        series_count, seed=args.seed, now=args.now, max_seasons=args.max_seasons,
+        episodes_per_season=(args.min_episodes, args.max_episodes), date_spread_days=args.date_spread_days,
+        ended_ratio=args.ended_ratio, has_file_ratio=args.has_file_ratio)]
+    episode_count = sum(len(series.episodes) for series in library)
+    print(f"  biblioteca gerada: {episode_count} episódios em {time.perf_counter() - start:.1f} s")
+
+    runs, _ = timed(lambda: TSSK.normalize_air_dates(library, args.utc_offset), 1)
+    record("normalize_air_dates", runs)
+
+    find_calls = {
+        "find_new_season_shows": lambda: TSSK.find_new_season_shows(library, args.future_days, args.utc_offset),
+        "find_upcoming_regular_episodes": lambda: TSSK.find_upcoming_regular_episodes(library, args.future_days, args.utc_offset),
+        "find_upcoming_finales": lambda: TSSK.find_upcoming_finales(library, args.future_days, args.utc_offset),
+        "find_recent_season_finales": lambda: TSSK.find_recent_season_finales(library, args.recent_days, args.utc_offset),
+        "find_recent_final_episodes": lambda: TSSK.find_recent_final_episodes(library, args.recent_days, args.utc_offset),
+        "find_new_season_started": lambda: TSSK.find_new_season_started(library, args.recent_days, args.utc_offset),
+        # Sem chave do TMDB, todos os candidatos ficam como finalizados (sem rede)
+        "find_ended_shows": lambda: TSSK.find_ended_shows(library),
+    }
+    shows = {}
+    for name, call in find_calls.items():
+        runs, result = timed(call, args.repeat)
+        record(name, runs)
+        shows[name] = result
+    runs, shows["find_returning_shows"] = timed(lambda: TSSK.find_returning_shows(library, set()), args.repeat)
+    record("find_returning_shows", runs)
+
+    category_shows = {
+        "new_season": shows["find_new_season_shows"][0],
+        "upcoming_episode": shows["find_upcoming_regular_episodes"][0],
+        "upcoming_finale": shows["find_upcoming_finales"][0],
+        "season_finale": shows["find_recent_season_finales"],
+        "final_episode": shows["find_recent_final_episodes"],
+        "new_season_started": shows["find_new_season_started"],
+        "ended": shows["find_ended_shows"][0],
+        "returning": shows["find_returning_shows"],
+    }
+
+    dates = [show["airDate"] for matched in category_shows.values() for show in matched if show.get("airDate")]
+    format_calls = [(date, date_format) for date in dates for date_format in DATE_FORMATS]
+    runs, _ = timed(lambda: [TSSK.format_date(date, date_format, True) for date, date_format in format_calls], args.repeat)
+    record("format_date", runs, len(format_calls))
+
+    overlay_dir = os.path.join(work_dir, f"{series_count}") + os.sep
+    os.makedirs(overlay_dir, exist_ok=True)
+    TSSK._category_documents["overlays"].clear()
+    TSSK._category_documents["collections"].clear()
+    TSSK.configure_category_files({})
+
+    def write_overlays():
+        for number, (category, key, no_date_needed) in enumerate(CATEGORIES, start=1):
+            TSSK.create_overlay_yaml(
+                f"{overlay_dir}{number:02d}_TSSK_{category.upper()}_OVERLAYS.yml", category_shows[category],
+                {"backdrop": config.get(f"backdrop_{key}", {}), "text": config.get(f"text_{key}", {})},
+                no_date_needed=no_date_needed, category_key=f"TSSK_{category}")
+
+    def write_collections():
+        for category, key, _ in CATEGORIES:
+            TSSK.create_collection_yaml(
+                f"{overlay_dir}TSSK_{category.upper()}_COLLECTION.yml", category_shows[category],
+                config, config_key=f"collection_{key}", summary=f"Benchmark {category}")
+
+    runs, _ = timed(write_overlays, args.repeat)
+    record("create_overlay_yaml", runs, len(CATEGORIES))
+    runs, _ = timed(write_collections, args.repeat)
+    record("create_collection_yaml", runs, len(CATEGORIES))
+    runs, _ = timed(lambda: (TSSK.concatenate_overlays(False, overlay_dir, False, True),
+                             TSSK.concatenate_collections(False, overlay_dir, False, True)), args.repeat)
+    record("concatenate_all_in_one", runs)
+
+    return {
+        "series": series_count,
+        "episodes": episode_count,
+        "matches": {category: len(matched) for category, matched in category_shows.items()},
+        "timings": timings,
+    }
+
+def print_comparison(report, baseline):
+    """Mostra a variação de cada medição em relação a um relatório anterior."""
+    previous = {result["series"]: result["timings"] for result in baseline.get("results", [])}
+    print("\n== Comparação com o relatório anterior ==")
+    for result in report["results"]:
+        old_timings = previous.get(result["series"])
+        if not old_timings:
+            continue
+        print(f"{result['series']} seriados:")
+        for name, timing in result["timings"].items():
+            if name not in old_timings or not old_timings[name]["seconds"]:
+                continue
+            change = (timing["seconds"] / old_timings[name]["seconds"] - 1) * 100
+            print(f"  {name:<32} {old_timings[name]['seconds'] * 1000:10.1f} ms -> {timing['seconds'] * 1000:10.1f} ms ({change:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do TSSK com bibliotecas sintéticas.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Quantidades de seriados, separadas por vírgula (padrão: {DEFAULT_SIZES})")
+    parser.add_argument("--seed", type=int, default=1, help="Semente do gerador (padrão: 1)")
+    parser.add_argument("--now", default=DEFAULT_NOW, help=f"Data de referência, também usada como TSSK_NOW (padrão: {DEFAULT_NOW})")
+    parser.add_argument("--max-seasons", type=int, default=5, help="Máximo de temporadas por seriado (padrão: 5)")
+    parser.add_argument("--min-episodes", type=int, default=6, help="Mínimo de episódios por temporada (padrão: 6)")
+    parser.add_argument("--max-episodes", type=int, default=12, help="Máximo de episódios por temporada (padrão: 12)")
+    parser.add_argument("--date-spread-days", type=int, default=60, help="Dispersão, em dias, do episódio mais recente em torno da data de referência (padrão: 60)")
+    parser.add_argument("--ended-ratio", type=float, default=0.35, help="Fração de seriados finalizados (padrão: 0.35)")
+    parser.add_argument("--has-file-ratio", type=float, default=0.85, help="Fração de episódios exibidos já baixados (padrão: 0.85)")
+    parser.add_argument("--future-days", type=int, default=14, help="Dias das categorias futuras (padrão: 14)")
+    parser.add_argument("--recent-days", type=int, default=14, help="Dias das categorias passadas (padrão: 14)")
+    parser.add_argument("--utc-offset", type=float, default=0, help="utc_offset usado nas categorias (padrão: 0)")
+    parser.add_argument("--repeat", type=int, default=3, help="Execuções por medição; vale a mais rápida (padrão: 3)")
+    parser.add_argument("--config", default=os.path.join(ROOT, "files", "config.example.yml"), help="config.yml com as seções de overlays e coleções")
+    parser.add_argument("--output", default="benchmark_report.json", help="Arquivo do relatório JSON (padrão: benchmark_report.json)")
+    parser.add_argument("--compare", help="Relatório JSON anterior para comparar")
+    args = parser.parse_args()
+
+    # As funções find_* usam o "agora" da execução; TSSK_NOW o fixa na data da biblioteca
+    os.environ["TSSK_NOW"] = args.now
+    with open(args.config, encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+
+    report = {
+        "tssk_version": TSSK.VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": [],
+    }
+    work_dir = tempfile.mkdtemp(prefix="tssk-bench-")
+    try:
+        for size in (int(value) for value in args.sizes.split(",")):
+            report["results"].append(benchmark_size(size, args, config, work_dir))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nRelatório gravado em {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
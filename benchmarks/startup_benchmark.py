@@ -0,0 +1,90 @@
+"""
+Benchmark de inicialização do TSSK: mede, em processos novos, o tempo até o TSSK estar pronto
+para executar (import do módulo e "--help") e lista os imports mais lentos de python -X importtime.
+
+Compara as formas de iniciar o TSSK:
+    import        python -c "import TSSK" (bytecode em __pycache__, como o import de um módulo)
+    script        python TSSK.py --help (o script é compilado novamente a cada execução)
+    module        python -m TSSK --help (usa o bytecode, como no Docker)
+
+Exemplos:
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --runs 20 --top 15 --output startup.json
+"""
+import argparse
+import json
+import os
+import py_compile
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = {
+    "import": ["-c", "import TSSK"],
+    "script": ["TSSK.py", "--help"],
+    "module": ["-m", "TSSK", "--help"],
+}
+
+def run_env():
+    # Fora do modo Docker e sem herdar opções que mudam o uso do bytecode
+    env = {key: value for key, value in os.environ.items()
+           if key not in ("DOCKER", "PYTHONDONTWRITEBYTECODE", "PYTHONPYCACHEPREFIX")}
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+def time_command(arguments, runs, env):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + arguments, cwd=ROOT, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def import_times(env, top):
+    """Imports de primeiro nível do TSSK (e o próprio TSSK) ordenados pelo tempo acumulado."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import TSSK"], cwd=ROOT, env=env,
+                            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_field, cumulative_us, name = line.split("|")
+        self_us = self_field.split(":")[1]
+        depth = (len(name) - len(name.lstrip())) // 2
+        # Nível 0 é o TSSK; nível 1 são os módulos importados diretamente por ele (e pelo site)
+        if depth <= 1:
+            entries.append({"module": name.strip(), "self_ms": int(self_us) / 1000,
+                            "cumulative_ms": int(cumulative_us) / 1000})
+    return sorted(entries, key=lambda entry: entry["cumulative_ms"], reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede o tempo de inicialização do TSSK.")
+    parser.add_argument("--runs", type=int, default=10, help="Execuções de cada forma de inicialização (padrão: 10)")
+    parser.add_argument("--top", type=int, default=10, help="Imports mais lentos listados (padrão: 10)")
+    parser.add_argument("--output", default="startup_report.json", help="Arquivo do relatório JSON (padrão: startup_report.json)")
+    args = parser.parse_args()
+
+    env = run_env()
+    # Garante o bytecode atualizado, como no "python -m compileall" da imagem Docker
+    py_compile.compile(os.path.join(ROOT, "TSSK.py"), doraise=True)
+    report = {"python": sys.version.split()[0], "runs": args.runs, "startup": {}}
+    for name, arguments in COMMANDS.items():
+        timings = time_command(arguments, args.runs, env)
+        report["startup"][name] = {"min_ms": min(timings) * 1000, "median_ms": statistics.median(timings) * 1000}
+        print(f"{name:<7} mínimo {min(timings) * 1000:7.1f} ms   mediana {statistics.median(timings) * 1000:7.1f} ms")
+
+    report["imports"] = import_times(env, args.top)
+    print("\nImports mais lentos (tempo acumulado):")
+    for entry in report["imports"]:
+        print(f"  {entry['module']:<30} {entry['cumulative_ms']:7.1f} ms")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nRelatório gravado em {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Gerador determinístico de bibliotecas sintéticas do Sonarr para os benchmarks do TSSK.
+
+Cada seriado tem o formato de /series da API v3 (id, title, tvdbId, status, monitored,
+seasons) mais a chave "episodes" com os episódios no formato de /episode, como em
+all_series_with_episodes. A mesma semente sempre gera a mesma biblioteca.
+"""
+import random
+from datetime import datetime, timedelta, timezone
+
+DEFAULT_NOW = "2025-01-15T12:00:00Z"
+
+def parse_now(now):
+    """Aceita datetime ou texto ISO (ex: 2025-01-15T12:00:00Z) e devolve um datetime UTC."""
+    if isinstance(now, datetime):
+        return now.astimezone(timezone.utc)
+    return datetime.fromisoformat(now.replace("Z", "")).replace(tzinfo=timezone.utc)
+
+def iter_library(series_count, seed=1, now=DEFAULT_NOW, max_seasons=5, episodes_per_season=(6, 12),
+                 date_spread_days=60, ended_ratio=0.35, upcoming_ratio=0.05, has_file_ratio=0.85,
+                 specials_ratio=0.3, unmonitored_ratio=0.05):
+    """
+    Gera os seriados um a um (sem manter a biblioteca inteira em memória).
+
+    series_count: quantidade de seriados
+    max_seasons: cada seriado tem de 1 a max_seasons temporadas regulares
+    episodes_per_season: (mínimo, máximo) de episódios por temporada
+    date_spread_days: o episódio mais recente de cada seriado cai a até esse número de dias
+        antes ou depois de now, então as categorias passadas e futuras têm correspondências
+    ended_ratio / upcoming_ratio: fração de seriados finalizados / a estrear (o resto está em andamento)
+    has_file_ratio: fração dos episódios já exibidos que estão baixados
+    specials_ratio: fração de seriados com especiais (temporada 0)
+    unmonitored_ratio: fração de seriados, temporadas e episódios não monitorados
+    """
+    rnd = random.Random(seed)
+    now = parse_now(now)
+    episode_id = 1
+    for series_id in range(1, series_count + 1):
+        roll = rnd.random()
+        if roll < ended_ratio:
+            status = "ended"
+        elif roll < ended_ratio + upcoming_ratio:
+            status = "upcoming"
+        else:
+            status = "continuing"
+
+        season_count = rnd.randint(1, max_seasons)
+        first_season = 0 if rnd.random() < specials_ratio else 1
+        season_lengths = {
+            season: 1 if season == 0 else rnd.randint(*episodes_per_season)
+            for season in range(first_season, season_count + 1)
+        }
+        # Distribui as temporadas para trás a partir do episódio mais recente
+        last_air = now + timedelta(days=rnd.uniform(-date_spread_days, date_spread_days),
+                                   hours=rnd.randint(-12, 12))
+        total_weeks = sum(season_lengths.values()) + 20 * season_count
+        air_date = last_air - timedelta(weeks=total_weeks)
+
+        seasons = []
+        episodes = []
+        for season, length in season_lengths.items():
+            seasons.append({"seasonNumber": season, "monitored": rnd.random() >= unmonitored_ratio})
+            for episode_number in range(1, length + 1):
+                air_date += timedelta(weeks=1)
+                aired = air_date <= now
+                episode = {
+                    "id": episode_id,
+                    "seriesId": series_id,
+                    "seasonNumber": season,
+                    "episodeNumber": episode_number,
+                    "title": f"Episode {episode_number}",
+                    "airDateUtc": air_date.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "hasFile": rnd.random() < (has_file_ratio if aired else 0.02),
+                    "monitored": rnd.random() >= unmonitored_ratio,
+                }
+                episodes.append(episode)
+                episode_id += 1
+            air_date += timedelta(weeks=20)
+
+        yield {
+            "id": series_id,
+            "title": f"Series {series_id}",
+            "tvdbId": 100000 + series_id,
+            "status": status,
+            "monitored": rnd.random() >= unmonitored_ratio,
+            "seasons": seasons,
+            "episodes": episodes,
+        }
+
+def generate_library(series_count, **options):
+    """Mesma biblioteca de iter_library, como lista."""
+    return list(iter_library(series_count, **options))
@@ -15,6 +15,10 @@ export DOCKER="$DOCKER"
 export PUID="$PUID"
 export PGID="$PGID"
 export TZ="$TZ"
+export CRON="$CRON"
+export HORARIOS_DE_EXECUCAO="$HORARIOS_DE_EXECUCAO"
+export EXECUTAR_AO_INICIAR="$EXECUTAR_AO_INICIAR"
+export TSSK_PROFILE="$TSSK_PROFILE"
 
 rotate_logs() {
     LOG_DIR="/app/config/logs"
@@ -46,9 +50,13 @@ chown "${PUID}:${PGID}" /app/.cron_env
 echo "SHELL=/bin/bash" >> /etc/cron.d/tssk-cron
 
 # Priorizar a variável HORARIOS_DE_EXECUCAO para horários em formato "normal"
-if [ -n "$CRON" ]; then
+if [[ "${MODO_DAEMON,,}" == "true" ]]; then
+    # No modo daemon o próprio TSSK lê CRON/HORARIOS_DE_EXECUCAO e agenda as execuções
+    echo "MODO_DAEMON=true: o agendamento será feito pelo TSSK, sem tarefas no cron."
+    echo "# Agendamento feito pelo TSSK em modo daemon." >> /etc/cron.d/tssk-cron
+elif [ -n "$CRON" ]; then
     echo "Configurando agendamento a partir de CRON: $CRON"
-    echo "$CRON appuser bash -c 'source /app/.cron_env && rotate_logs && cd /app && /usr/local/bin/python TSSK.py >> /app/config/logs/tssk.log 2>&1'" >> /etc/cron.d/tssk-cron
+    echo "$CRON appuser bash -c 'source /app/.cron_env && rotate_logs && cd /app && /usr/local/bin/python -m TSSK >> /app/config/logs/tssk.log 2>&1'" >> /etc/cron.d/tssk-cron
     
 elif [ -n "$HORARIOS_DE_EXECUCAO" ]; then
     echo "Configurando agendamentos diários a partir de HORARIOS_DE_EXECUCAO: $HORARIOS_DE_EXECUCAO"
@@ -61,7 +69,7 @@ elif [ -n "$HORARIOS_DE_EXECUCAO" ]; then
         if [[ "$time_str" =~ ^([0-1]?[0-9]|2[0-3]):([0-5]?[0-9])$ ]]; then
             HOUR=${BASH_REMATCH[1]}
             MINUTE=${BASH_REMATCH[2]}
-            echo "$MINUTE $HOUR * * * appuser bash -c 'source /app/.cron_env && rotate_logs && cd /app && /usr/local/bin/python TSSK.py >> /app/config/logs/tssk.log 2>&1'" >> /etc/cron.d/tssk-cron
+            echo "$MINUTE $HOUR * * * appuser bash -c 'source /app/.cron_env && rotate_logs && cd /app && /usr/local/bin/python -m TSSK >> /app/config/logs/tssk.log 2>&1'" >> /etc/cron.d/tssk-cron
             echo "  - Tarefa cron adicionada para: $time_str"
         else
             echo "  - Aviso: Formato de hora inválido '$time_str' em HORARIOS_DE_EXECUCAO. Esperado HH:MM. Ignorando."
@@ -79,10 +87,14 @@ mkdir -p /app/config/logs
 touch /app/config/logs/tssk.log
 chown -R "${PUID}:${PGID}" /app/config/logs
 
+if [[ "${MODO_DAEMON,,}" == "true" ]]; then
+    # O daemon rotaciona o log a cada execução e trata EXECUTAR_AO_INICIAR
+    echo "Iniciando o TSSK em modo daemon..."
+    su -s /bin/bash -c "source /app/.cron_env && cd /app && /usr/local/bin/python -m TSSK --daemon --log-file /app/config/logs/tssk.log" appuser &
 # Verifica se a variável EXECUTAR_AO_INICIAR está definida como "true" (ignora maiúsculas/minúsculas)
-if [[ "${EXECUTAR_AO_INICIAR,,}" == "true" ]]; then
+elif [[ "${EXECUTAR_AO_INICIAR,,}" == "true" ]]; then
     echo "Executando o script imediatamente na inicialização (EXECUTAR_AO_INICIAR=true)..."
-    su -s /bin/bash -c "source /app/.cron_env && rotate_logs && cd /app && /usr/local/bin/python TSSK.py >> /app/config/logs/tssk.log 2>&1" appuser &
+    su -s /bin/bash -c "source /app/.cron_env && rotate_logs && cd /app && /usr/local/bin/python -m TSSK >> /app/config/logs/tssk.log 2>&1" appuser &
 fi
 
 # --- Inicia o Cron e o Log --- #
@@ -0,0 +1,155 @@
+"""
+Compara a decodificação das respostas do Sonarr (/series e /episode): response.json() contra
+decode_json() do TSSK (orjson, quando instalado) seguido da redução aos campos usados.
+
+Com respostas gravadas de um Sonarr real:
+    python tools/bench_json_decode.py --record payloads --sonarr-url http://sonarr:8989 --api-key XXX
+    python tools/bench_json_decode.py payloads/*.json
+
+Sem um Sonarr, gera respostas sintéticas com o formato das da API v3:
+    python tools/bench_json_decode.py --synthetic-series 2000 --json-report bench_json.json
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import TSSK  # noqa: E402
+
+OVERVIEW = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt. " * 3
+
+def record_payloads(output_dir, sonarr_url, api_key, episode_series):
+    """Grava /series e /episode de alguns seriados, exatamente como o Sonarr os devolve."""
+    os.makedirs(output_dir, exist_ok=True)
+    base_url = sonarr_url.rstrip("/") + "/api/v3"
+    headers = {"X-Api-Key": api_key}
+    response = requests.get(f"{base_url}/series", headers=headers, timeout=60)
+    response.raise_for_status()
+    paths = [os.path.join(output_dir, "series.json")]
+    with open(paths[0], "wb") as f:
+        f.write(response.content)
+    for series in response.json()[:episode_series]:
+        episodes = requests.get(f"{base_url}/episode", headers=headers, params={"seriesId": series["id"]}, timeout=60)
+        episodes.raise_for_status()
+        paths.append(os.path.join(output_dir, f"episode_{series['id']}.json"))
+        with open(paths[-1], "wb") as f:
+            f.write(episodes.content)
+    print(f"{len(paths)} respostas gravadas em {output_dir}")
+    return paths
+
+def synthetic_payloads(series_count, episodes_per_series=40):
+    """Respostas com os campos e tamanhos típicos da API v3 do Sonarr."""
+    image = {"coverType": "poster", "url": "/MediaCover/1/poster.jpg",
+             "remoteUrl": "https://artworks.thetvdb.com/banners/posters/123456-1.jpg"}
+    statistics = {"episodeFileCount": 10, "episodeCount": 10, "totalEpisodeCount": 10,
+                  "sizeOnDisk": 12345678901, "percentOfEpisodes": 100.0}
+    series = [{
+        "id": i, "title": f"Series {i}", "sortTitle": f"series {i}", "status": "continuing",
+        "overview": OVERVIEW, "network": "Network", "airTime": "21:00", "images": [image] * 3,
+        "seasons": [{"seasonNumber": s, "monitored": True, "statistics": statistics} for s in range(5)],
+        "year": 2020, "path": f"/tv/Series {i}", "qualityProfileId": 1, "seasonFolder": True,
+        "monitored": True, "runtime": 45, "tvdbId": 100000 + i, "tvRageId": 0, "tvMazeId": i,
+        "firstAired": "2020-01-01T00:00:00Z", "lastInfoSync": "2025-01-01T00:00:00Z",
+        "seriesType": "standard", "cleanTitle": f"series{i}", "imdbId": f"tt{i:07d}",
+        "titleSlug": f"series-{i}", "genres": ["Drama", "Thriller"], "tags": [],
+        "added": "2021-01-01T00:00:00Z", "ratings": {"votes": 100, "value": 8.1},
+        "statistics": statistics, "nextAiring": "2025-02-01T02:00:00Z",
+    } for i in range(1, series_count + 1)]
+    episodes = [{
+        "seriesId": 1, "tvdbId": 200000 + e, "episodeFileId": e, "seasonNumber": 1 + e // 10,
+        "episodeNumber": 1 + e % 10, "title": f"Episode {e}", "airDate": "2024-01-01",
+        "airDateUtc": "2024-01-01T02:00:00Z", "runtime": 45, "overview": OVERVIEW, "hasFile": True,
+        "monitored": True, "absoluteEpisodeNumber": e + 1, "unverifiedSceneNumbering": False,
+        "images": [image], "id": e + 1,
+    } for e in range(episodes_per_series)]
+    return {
+        "series (sintético)": json.dumps(series).encode("utf-8"),
+        "episode (sintético)": json.dumps(episodes).encode("utf-8"),
+    }
+
+def fake_response(content):
+    response = requests.models.Response()
+    response._content = content
+    response.status_code = 200
+    response.encoding = "utf-8"
+    return response
+
+def project(data):
+    """O mesmo que o TSSK faz com cada resposta: reduz aos campos usados."""
+    if data and isinstance(data, list) and "seasons" in data[0]:
+        return [TSSK.project_series(series) for series in data]
+    if data and isinstance(data, list) and "episodeNumber" in data[0]:
+        return [TSSK.Episode.from_sonarr(ep) for ep in data]
+    return data
+
+def measure(function, content, repeat):
+    """Melhor tempo em repeat execuções, pico de memória e memória retida pelo resultado."""
+    best = float("inf")
+    for _ in range(repeat):
+        response = fake_response(content)
+        gc.collect()
+        start = time.perf_counter()
+        result = function(response)
+        best = min(best, time.perf_counter() - start)
+        del result
+    gc.collect()
+    response = fake_response(content)
+    tracemalloc.start()
+    result = function(response)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {"seconds": best, "peak_mb": peak / 2**20, "retained_mb": retained / 2**20}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da decodificação das respostas do Sonarr.")
+    parser.add_argument("payloads", nargs="*", help="Arquivos JSON gravados de /series ou /episode")
+    parser.add_argument("--record", metavar="DIR", help="Grava respostas de um Sonarr real em DIR antes de medir")
+    parser.add_argument("--sonarr-url", help="URL do Sonarr para --record (ex: http://sonarr:8989)")
+    parser.add_argument("--api-key", help="Chave da API do Sonarr para --record")
+    parser.add_argument("--episode-series", type=int, default=20, help="Quantos seriados têm /episode gravado (padrão: 20)")
+    parser.add_argument("--synthetic-series", type=int, default=2000, help="Seriados das respostas sintéticas, usadas sem arquivos (padrão: 2000)")
+    parser.add_argument("--repeat", type=int, default=5, help="Execuções por medição; vale a mais rápida (padrão: 5)")
+    parser.add_argument("--json-report", help="Grava os resultados neste arquivo JSON")
+    args = parser.parse_args()
+
+    paths = list(args.payloads)
+    if args.record:
+        if not args.sonarr_url or not args.api_key:
+            parser.error("--record precisa de --sonarr-url e --api-key")
+        paths += record_payloads(args.record, args.sonarr_url, args.api_key, args.episode_series)
+    if paths:
+        payloads = {}
+        for path in paths:
+            with open(path, "rb") as f:
+                payloads[os.path.basename(path)] = f.read()
+    else:
+        payloads = synthetic_payloads(args.synthetic_series)
+
+    backend = "orjson" if TSSK.orjson is not None else "json (orjson não instalado)"
+    methods = {
+        "response.json()": lambda response: response.json(),
+        f"decode_json [{backend}]": TSSK.decode_json,
+        "decode_json + projeção": lambda response: project(TSSK.decode_json(response)),
+    }
+    report = {"backend": backend, "python": sys.version.split()[0], "results": []}
+    for name, content in payloads.items():
+        print(f"\n{name} ({len(content) / 2**20:.2f} MB)")
+        for method, function in methods.items():
+            result = measure(function, content, args.repeat)
+            print(f"  {method:<40} {result['seconds'] * 1000:9.1f} ms   pico {result['peak_mb']:7.1f} MB   retido {result['retained_mb']:7.1f} MB")
+            report["results"].append({"payload": name, "bytes": len(content), "method": method, **result})
+
+    if args.json_report:
+        with open(args.json_report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nRelatório gravado em {args.json_report}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Envia eventos de webhook no formato do Sonarr (Connect -> Webhook) para o TSSK em modo daemon,
+para testar as atualizações incrementais sem um Sonarr real.
+
+Exemplos:
+    python tools/send_sonarr_webhook.py --series-id 12 --username tssk --password segredo
+    python tools/send_sonarr_webhook.py --event SeriesDelete --series-id 12 --username tssk --password segredo
+    python tools/send_sonarr_webhook.py --series-id 12 --series-id 40 --repeat 5 --username tssk --password segredo   # rajada
+
+Usuário e senha são os de sonarr_webhook_username e sonarr_webhook_password no config.yml.
+"""
+import argparse
+import base64
+import json
+import sys
+import time
+import urllib.request
+
+EVENTS = ("Download", "SeriesAdd", "SeriesDelete", "EpisodeFileDelete", "Test")
+
+def build_payload(event_type, series_id, tvdb_id=None, title=None, season=1, episode=1):
+    """Monta um payload com os campos que o Sonarr envia e que o TSSK lê."""
+    payload = {
+        "eventType": event_type,
+        "instanceName": "Sonarr",
+        "series": {
+            "id": series_id,
+            "title": title or f"Series {series_id}",
+            "tvdbId": tvdb_id or 0,
+        },
+    }
+    if event_type in ("Download", "EpisodeFileDelete"):
+        payload["episodes"] = [{"seasonNumber": season, "episodeNumber": episode}]
+    return payload
+
+def post(url, payload, username, password):
+    credentials = base64.b64encode(f"{username}:{password}".encode("utf-8")).decode("ascii")
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json", "User-Agent": "Sonarr", "Authorization": f"Basic {credentials}"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return response.status
+
+def main():
+    parser = argparse.ArgumentParser(description="Envia webhooks falsos do Sonarr para o TSSK")
+    parser.add_argument("--url", default="http://127.0.0.1:8787/", help="Endereço do receptor de webhooks do TSSK")
+    parser.add_argument("--username", required=True, help="sonarr_webhook_username do TSSK")
+    parser.add_argument("--password", required=True, help="sonarr_webhook_password do TSSK")
+    parser.add_argument("--event", choices=EVENTS, default="Download")
+    parser.add_argument("--series-id", type=int, action="append", required=True,
+                        help="ID do seriado no Sonarr (pode ser repetido)")
+    parser.add_argument("--season", type=int, default=1)
+    parser.add_argument("--episode", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=1, help="Quantas vezes enviar cada evento")
+    parser.add_argument("--interval", type=float, default=0.1, help="Intervalo entre os envios (segundos)")
+    args = parser.parse_args()
+
+    for _ in range(args.repeat):
+        for series_id in args.series_id:
+            payload = build_payload(args.event, series_id, season=args.season, episode=args.episode)
+            try:
+                status = post(args.url, payload, args.username, args.password)
+            except OSError as e:
+                print(f"Falha ao enviar {args.event} do seriado {series_id}: {e}")
+                sys.exit(1)
+            print(f"{args.event} do seriado {series_id}: HTTP {status}")
+            time.sleep(args.interval)
+
+if __name__ == "__main__":
+    main()